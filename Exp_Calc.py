@@ -15,8 +15,9 @@ The game floors after EVERY multiplication/division operation.
 
 import json
 import math
-from collections import defaultdict
-from typing import Dict, List, Tuple, Any, Optional
+from collections import OrderedDict, defaultdict
+from fractions import Fraction
+from typing import Dict, List, Set, Tuple, Any, Optional, Iterable, Iterator, TextIO, Callable
 
 # =============================================================================
 # GEN 3 BASE EXPERIENCE VALUES
@@ -230,6 +231,229 @@ BASE_EXP = {
     "SPECIES_JIRACHI": 215, "SPECIES_DEOXYS": 215,
 }
 
+# =============================================================================
+# GEN 3 EV YIELDS AND WILD HELD ITEMS
+# =============================================================================
+# EV yield per defeated Pokemon, in the order of the pret species data
+EV_STATS = ("hp", "attack", "defense", "speed", "sp_attack", "sp_defense")
+
+EV_YIELD = {
+    # Gen 1
+    "SPECIES_BULBASAUR": (0, 0, 0, 0, 1, 0), "SPECIES_IVYSAUR": (0, 0, 0, 0, 1, 1), "SPECIES_VENUSAUR": (0, 0, 0, 0, 2, 1),
+    "SPECIES_CHARMANDER": (0, 0, 0, 1, 0, 0), "SPECIES_CHARMELEON": (0, 0, 0, 1, 1, 0), "SPECIES_CHARIZARD": (0, 0, 0, 0, 3, 0),
+    "SPECIES_SQUIRTLE": (0, 0, 1, 0, 0, 0), "SPECIES_WARTORTLE": (0, 0, 1, 0, 0, 1), "SPECIES_BLASTOISE": (0, 0, 0, 0, 0, 3),
+    "SPECIES_CATERPIE": (1, 0, 0, 0, 0, 0), "SPECIES_METAPOD": (0, 0, 2, 0, 0, 0), "SPECIES_BUTTERFREE": (0, 0, 0, 0, 2, 1),
+    "SPECIES_WEEDLE": (0, 0, 0, 1, 0, 0), "SPECIES_KAKUNA": (0, 0, 2, 0, 0, 0), "SPECIES_BEEDRILL": (0, 2, 0, 0, 0, 1),
+    "SPECIES_PIDGEY": (0, 0, 0, 1, 0, 0), "SPECIES_PIDGEOTTO": (0, 0, 0, 2, 0, 0), "SPECIES_PIDGEOT": (0, 0, 0, 3, 0, 0),
+    "SPECIES_RATTATA": (0, 0, 0, 1, 0, 0), "SPECIES_RATICATE": (0, 0, 0, 2, 0, 0), "SPECIES_SPEAROW": (0, 0, 0, 1, 0, 0),
+    "SPECIES_FEAROW": (0, 0, 0, 2, 0, 0), "SPECIES_EKANS": (0, 1, 0, 0, 0, 0), "SPECIES_ARBOK": (0, 2, 0, 0, 0, 0),
+    "SPECIES_PIKACHU": (0, 0, 0, 2, 0, 0), "SPECIES_RAICHU": (0, 0, 0, 3, 0, 0), "SPECIES_SANDSHREW": (0, 0, 1, 0, 0, 0),
+    "SPECIES_SANDSLASH": (0, 0, 2, 0, 0, 0), "SPECIES_NIDORAN_F": (1, 0, 0, 0, 0, 0), "SPECIES_NIDORINA": (2, 0, 0, 0, 0, 0),
+    "SPECIES_NIDOQUEEN": (3, 0, 0, 0, 0, 0), "SPECIES_NIDORAN_M": (0, 1, 0, 0, 0, 0), "SPECIES_NIDORINO": (0, 2, 0, 0, 0, 0),
+    "SPECIES_NIDOKING": (0, 3, 0, 0, 0, 0), "SPECIES_CLEFAIRY": (2, 0, 0, 0, 0, 0), "SPECIES_CLEFABLE": (3, 0, 0, 0, 0, 0),
+    "SPECIES_VULPIX": (0, 0, 0, 1, 0, 0), "SPECIES_NINETALES": (0, 0, 0, 1, 0, 1), "SPECIES_JIGGLYPUFF": (2, 0, 0, 0, 0, 0),
+    "SPECIES_WIGGLYTUFF": (3, 0, 0, 0, 0, 0), "SPECIES_ZUBAT": (0, 0, 0, 1, 0, 0), "SPECIES_GOLBAT": (0, 0, 0, 2, 0, 0),
+    "SPECIES_ODDISH": (0, 0, 0, 0, 1, 0), "SPECIES_GLOOM": (0, 0, 0, 0, 2, 0), "SPECIES_VILEPLUME": (0, 0, 0, 0, 3, 0),
+    "SPECIES_PARAS": (0, 1, 0, 0, 0, 0), "SPECIES_PARASECT": (0, 2, 1, 0, 0, 0), "SPECIES_VENONAT": (0, 0, 0, 0, 0, 1),
+    "SPECIES_VENOMOTH": (0, 0, 0, 1, 1, 0), "SPECIES_DIGLETT": (0, 0, 0, 1, 0, 0), "SPECIES_DUGTRIO": (0, 0, 0, 2, 0, 0),
+    "SPECIES_MEOWTH": (0, 0, 0, 1, 0, 0), "SPECIES_PERSIAN": (0, 0, 0, 2, 0, 0), "SPECIES_PSYDUCK": (0, 0, 0, 0, 1, 0),
+    "SPECIES_GOLDUCK": (0, 0, 0, 0, 2, 0), "SPECIES_MANKEY": (0, 1, 0, 0, 0, 0), "SPECIES_PRIMEAPE": (0, 2, 0, 0, 0, 0),
+    "SPECIES_GROWLITHE": (0, 1, 0, 0, 0, 0), "SPECIES_ARCANINE": (0, 2, 0, 0, 0, 0), "SPECIES_POLIWAG": (0, 0, 0, 1, 0, 0),
+    "SPECIES_POLIWHIRL": (0, 0, 0, 2, 0, 0), "SPECIES_POLIWRATH": (0, 0, 3, 0, 0, 0), "SPECIES_ABRA": (0, 0, 0, 0, 1, 0),
+    "SPECIES_KADABRA": (0, 0, 0, 0, 2, 0), "SPECIES_ALAKAZAM": (0, 0, 0, 0, 3, 0), "SPECIES_MACHOP": (0, 1, 0, 0, 0, 0),
+    "SPECIES_MACHOKE": (0, 2, 0, 0, 0, 0), "SPECIES_MACHAMP": (0, 3, 0, 0, 0, 0), "SPECIES_BELLSPROUT": (0, 1, 0, 0, 0, 0),
+    "SPECIES_WEEPINBELL": (0, 2, 0, 0, 0, 0), "SPECIES_VICTREEBEL": (0, 3, 0, 0, 0, 0), "SPECIES_TENTACOOL": (0, 0, 0, 0, 0, 1),
+    "SPECIES_TENTACRUEL": (0, 0, 0, 0, 0, 2), "SPECIES_GEODUDE": (0, 0, 1, 0, 0, 0), "SPECIES_GRAVELER": (0, 0, 2, 0, 0, 0),
+    "SPECIES_GOLEM": (0, 0, 3, 0, 0, 0), "SPECIES_PONYTA": (0, 0, 0, 1, 0, 0), "SPECIES_RAPIDASH": (0, 0, 0, 2, 0, 0),
+    "SPECIES_SLOWPOKE": (1, 0, 0, 0, 0, 0), "SPECIES_SLOWBRO": (0, 0, 2, 0, 0, 0), "SPECIES_MAGNEMITE": (0, 0, 0, 0, 1, 0),
+    "SPECIES_MAGNETON": (0, 0, 0, 0, 2, 0), "SPECIES_FARFETCHD": (0, 1, 0, 0, 0, 0), "SPECIES_DODUO": (0, 1, 0, 0, 0, 0),
+    "SPECIES_DODRIO": (0, 2, 0, 0, 0, 0), "SPECIES_SEEL": (0, 0, 0, 0, 0, 1), "SPECIES_DEWGONG": (0, 0, 0, 0, 0, 2),
+    "SPECIES_GRIMER": (1, 0, 0, 0, 0, 0), "SPECIES_MUK": (1, 1, 0, 0, 0, 0), "SPECIES_SHELLDER": (0, 0, 1, 0, 0, 0),
+    "SPECIES_CLOYSTER": (0, 0, 2, 0, 0, 0), "SPECIES_GASTLY": (0, 0, 0, 0, 1, 0), "SPECIES_HAUNTER": (0, 0, 0, 0, 2, 0),
+    "SPECIES_GENGAR": (0, 0, 0, 0, 3, 0), "SPECIES_ONIX": (0, 0, 1, 0, 0, 0), "SPECIES_DROWZEE": (0, 0, 0, 0, 0, 1),
+    "SPECIES_HYPNO": (0, 0, 0, 0, 0, 2), "SPECIES_KRABBY": (0, 1, 0, 0, 0, 0), "SPECIES_KINGLER": (0, 2, 0, 0, 0, 0),
+    "SPECIES_VOLTORB": (0, 0, 0, 1, 0, 0), "SPECIES_ELECTRODE": (0, 0, 0, 2, 0, 0), "SPECIES_EXEGGCUTE": (0, 0, 1, 0, 0, 0),
+    "SPECIES_EXEGGUTOR": (0, 0, 0, 0, 2, 0), "SPECIES_CUBONE": (0, 0, 1, 0, 0, 0), "SPECIES_MAROWAK": (0, 0, 2, 0, 0, 0),
+    "SPECIES_HITMONLEE": (0, 2, 0, 0, 0, 0), "SPECIES_HITMONCHAN": (0, 0, 0, 0, 0, 2), "SPECIES_LICKITUNG": (2, 0, 0, 0, 0, 0),
+    "SPECIES_KOFFING": (0, 0, 1, 0, 0, 0), "SPECIES_WEEZING": (0, 0, 2, 0, 0, 0), "SPECIES_RHYHORN": (0, 0, 1, 0, 0, 0),
+    "SPECIES_RHYDON": (0, 2, 0, 0, 0, 0), "SPECIES_CHANSEY": (2, 0, 0, 0, 0, 0), "SPECIES_TANGELA": (0, 0, 1, 0, 0, 0),
+    "SPECIES_KANGASKHAN": (2, 0, 0, 0, 0, 0), "SPECIES_HORSEA": (0, 0, 0, 0, 1, 0), "SPECIES_SEADRA": (0, 0, 1, 0, 1, 0),
+    "SPECIES_GOLDEEN": (0, 1, 0, 0, 0, 0), "SPECIES_SEAKING": (0, 2, 0, 0, 0, 0), "SPECIES_STARYU": (0, 0, 0, 1, 0, 0),
+    "SPECIES_STARMIE": (0, 0, 0, 2, 0, 0), "SPECIES_MR_MIME": (0, 0, 0, 0, 0, 2), "SPECIES_SCYTHER": (0, 1, 0, 0, 0, 0),
+    "SPECIES_JYNX": (0, 0, 0, 0, 2, 0), "SPECIES_ELECTABUZZ": (0, 0, 0, 2, 0, 0), "SPECIES_MAGMAR": (0, 0, 0, 0, 2, 0),
+    "SPECIES_PINSIR": (0, 2, 0, 0, 0, 0), "SPECIES_TAUROS": (0, 1, 0, 1, 0, 0), "SPECIES_MAGIKARP": (0, 0, 0, 1, 0, 0),
+    "SPECIES_GYARADOS": (0, 2, 0, 0, 0, 0), "SPECIES_LAPRAS": (2, 0, 0, 0, 0, 0), "SPECIES_DITTO": (1, 0, 0, 0, 0, 0),
+    "SPECIES_EEVEE": (0, 0, 0, 0, 0, 1), "SPECIES_VAPOREON": (2, 0, 0, 0, 0, 0), "SPECIES_JOLTEON": (0, 0, 0, 2, 0, 0),
+    "SPECIES_FLAREON": (0, 2, 0, 0, 0, 0), "SPECIES_PORYGON": (0, 0, 0, 0, 1, 0), "SPECIES_OMANYTE": (0, 0, 1, 0, 0, 0),
+    "SPECIES_OMASTAR": (0, 0, 2, 0, 0, 0), "SPECIES_KABUTO": (0, 0, 1, 0, 0, 0), "SPECIES_KABUTOPS": (0, 2, 0, 0, 0, 0),
+    "SPECIES_AERODACTYL": (0, 0, 0, 2, 0, 0), "SPECIES_SNORLAX": (2, 0, 0, 0, 0, 0), "SPECIES_ARTICUNO": (0, 0, 0, 0, 0, 3),
+    "SPECIES_ZAPDOS": (0, 0, 0, 0, 3, 0), "SPECIES_MOLTRES": (0, 0, 0, 0, 3, 0), "SPECIES_DRATINI": (0, 1, 0, 0, 0, 0),
+    "SPECIES_DRAGONAIR": (0, 2, 0, 0, 0, 0), "SPECIES_DRAGONITE": (0, 3, 0, 0, 0, 0), "SPECIES_MEWTWO": (0, 0, 0, 0, 3, 0),
+    "SPECIES_MEW": (3, 0, 0, 0, 0, 0),
+    # Gen 2
+    "SPECIES_CHIKORITA": (0, 0, 0, 0, 0, 1), "SPECIES_BAYLEEF": (0, 0, 1, 0, 0, 1), "SPECIES_MEGANIUM": (0, 0, 1, 0, 0, 2),
+    "SPECIES_CYNDAQUIL": (0, 0, 0, 1, 0, 0), "SPECIES_QUILAVA": (0, 0, 0, 1, 1, 0), "SPECIES_TYPHLOSION": (0, 0, 0, 0, 3, 0),
+    "SPECIES_TOTODILE": (0, 1, 0, 0, 0, 0), "SPECIES_CROCONAW": (0, 1, 1, 0, 0, 0), "SPECIES_FERALIGATR": (0, 2, 1, 0, 0, 0),
+    "SPECIES_SENTRET": (0, 1, 0, 0, 0, 0), "SPECIES_FURRET": (0, 0, 0, 2, 0, 0), "SPECIES_HOOTHOOT": (1, 0, 0, 0, 0, 0),
+    "SPECIES_NOCTOWL": (2, 0, 0, 0, 0, 0), "SPECIES_LEDYBA": (0, 0, 0, 0, 0, 1), "SPECIES_LEDIAN": (0, 0, 0, 0, 0, 2),
+    "SPECIES_SPINARAK": (0, 1, 0, 0, 0, 0), "SPECIES_ARIADOS": (0, 2, 0, 0, 0, 0), "SPECIES_CROBAT": (0, 0, 0, 3, 0, 0),
+    "SPECIES_CHINCHOU": (1, 0, 0, 0, 0, 0), "SPECIES_LANTURN": (2, 0, 0, 0, 0, 0), "SPECIES_PICHU": (0, 0, 0, 1, 0, 0),
+    "SPECIES_CLEFFA": (0, 0, 0, 0, 0, 1), "SPECIES_IGGLYBUFF": (1, 0, 0, 0, 0, 0), "SPECIES_TOGEPI": (0, 0, 0, 0, 0, 1),
+    "SPECIES_TOGETIC": (0, 0, 0, 0, 0, 2), "SPECIES_NATU": (0, 0, 0, 0, 1, 0), "SPECIES_XATU": (0, 0, 0, 1, 1, 0),
+    "SPECIES_MAREEP": (0, 0, 0, 0, 1, 0), "SPECIES_FLAAFFY": (0, 0, 0, 0, 2, 0), "SPECIES_AMPHAROS": (0, 0, 0, 0, 3, 0),
+    "SPECIES_BELLOSSOM": (0, 0, 0, 0, 0, 3), "SPECIES_MARILL": (2, 0, 0, 0, 0, 0), "SPECIES_AZUMARILL": (3, 0, 0, 0, 0, 0),
+    "SPECIES_SUDOWOODO": (0, 0, 2, 0, 0, 0), "SPECIES_POLITOED": (0, 0, 0, 0, 0, 3), "SPECIES_HOPPIP": (0, 0, 0, 0, 0, 1),
+    "SPECIES_SKIPLOOM": (0, 0, 0, 2, 0, 0), "SPECIES_JUMPLUFF": (0, 0, 0, 3, 0, 0), "SPECIES_AIPOM": (0, 0, 0, 1, 0, 0),
+    "SPECIES_SUNKERN": (0, 0, 0, 0, 1, 0), "SPECIES_SUNFLORA": (0, 0, 0, 0, 2, 0), "SPECIES_YANMA": (0, 0, 0, 1, 0, 0),
+    "SPECIES_WOOPER": (1, 0, 0, 0, 0, 0), "SPECIES_QUAGSIRE": (2, 0, 0, 0, 0, 0), "SPECIES_ESPEON": (0, 0, 0, 0, 2, 0),
+    "SPECIES_UMBREON": (0, 0, 0, 0, 0, 2), "SPECIES_MURKROW": (0, 0, 0, 1, 0, 0), "SPECIES_SLOWKING": (0, 0, 0, 0, 0, 3),
+    "SPECIES_MISDREAVUS": (0, 0, 0, 0, 0, 1), "SPECIES_UNOWN": (0, 1, 0, 0, 1, 0), "SPECIES_WOBBUFFET": (2, 0, 0, 0, 0, 0),
+    "SPECIES_GIRAFARIG": (0, 0, 0, 0, 2, 0), "SPECIES_PINECO": (0, 0, 1, 0, 0, 0), "SPECIES_FORRETRESS": (0, 0, 2, 0, 0, 0),
+    "SPECIES_DUNSPARCE": (1, 0, 0, 0, 0, 0), "SPECIES_GLIGAR": (0, 0, 1, 0, 0, 0), "SPECIES_STEELIX": (0, 0, 2, 0, 0, 0),
+    "SPECIES_SNUBBULL": (0, 1, 0, 0, 0, 0), "SPECIES_GRANBULL": (0, 2, 0, 0, 0, 0), "SPECIES_QWILFISH": (0, 1, 0, 0, 0, 0),
+    "SPECIES_SCIZOR": (0, 2, 0, 0, 0, 0), "SPECIES_SHUCKLE": (0, 0, 1, 0, 0, 1), "SPECIES_HERACROSS": (0, 2, 0, 0, 0, 0),
+    "SPECIES_SNEASEL": (0, 0, 0, 1, 0, 0), "SPECIES_TEDDIURSA": (0, 1, 0, 0, 0, 0), "SPECIES_URSARING": (0, 2, 0, 0, 0, 0),
+    "SPECIES_SLUGMA": (0, 0, 0, 0, 1, 0), "SPECIES_MAGCARGO": (0, 0, 2, 0, 0, 0), "SPECIES_SWINUB": (0, 1, 0, 0, 0, 0),
+    "SPECIES_PILOSWINE": (1, 1, 0, 0, 0, 0), "SPECIES_CORSOLA": (0, 0, 1, 0, 0, 1), "SPECIES_REMORAID": (0, 0, 0, 0, 1, 0),
+    "SPECIES_OCTILLERY": (0, 1, 0, 0, 1, 0), "SPECIES_DELIBIRD": (0, 0, 0, 1, 0, 0), "SPECIES_MANTINE": (0, 0, 0, 0, 0, 2),
+    "SPECIES_SKARMORY": (0, 0, 2, 0, 0, 0), "SPECIES_HOUNDOUR": (0, 0, 0, 0, 1, 0), "SPECIES_HOUNDOOM": (0, 0, 0, 0, 2, 0),
+    "SPECIES_KINGDRA": (0, 1, 0, 0, 1, 1), "SPECIES_PHANPY": (1, 0, 0, 0, 0, 0), "SPECIES_DONPHAN": (0, 1, 1, 0, 0, 0),
+    "SPECIES_PORYGON2": (0, 0, 0, 0, 2, 0), "SPECIES_STANTLER": (0, 1, 0, 0, 0, 0), "SPECIES_SMEARGLE": (0, 0, 0, 1, 0, 0),
+    "SPECIES_TYROGUE": (0, 1, 0, 0, 0, 0), "SPECIES_HITMONTOP": (0, 0, 0, 0, 0, 2), "SPECIES_SMOOCHUM": (0, 0, 0, 0, 1, 0),
+    "SPECIES_ELEKID": (0, 0, 0, 1, 0, 0), "SPECIES_MAGBY": (0, 0, 0, 1, 0, 0), "SPECIES_MILTANK": (0, 0, 2, 0, 0, 0),
+    "SPECIES_BLISSEY": (3, 0, 0, 0, 0, 0), "SPECIES_RAIKOU": (0, 0, 0, 2, 1, 0), "SPECIES_ENTEI": (1, 2, 0, 0, 0, 0),
+    "SPECIES_SUICUNE": (0, 0, 1, 0, 0, 2), "SPECIES_LARVITAR": (0, 1, 0, 0, 0, 0), "SPECIES_PUPITAR": (0, 2, 0, 0, 0, 0),
+    "SPECIES_TYRANITAR": (0, 3, 0, 0, 0, 0), "SPECIES_LUGIA": (0, 0, 0, 0, 0, 3), "SPECIES_HO_OH": (0, 0, 0, 0, 0, 3),
+    "SPECIES_CELEBI": (3, 0, 0, 0, 0, 0),
+    # Gen 3
+    "SPECIES_TREECKO": (0, 0, 0, 1, 0, 0), "SPECIES_GROVYLE": (0, 0, 0, 2, 0, 0), "SPECIES_SCEPTILE": (0, 0, 0, 3, 0, 0),
+    "SPECIES_TORCHIC": (0, 0, 0, 0, 1, 0), "SPECIES_COMBUSKEN": (0, 1, 0, 0, 1, 0), "SPECIES_BLAZIKEN": (0, 3, 0, 0, 0, 0),
+    "SPECIES_MUDKIP": (0, 1, 0, 0, 0, 0), "SPECIES_MARSHTOMP": (0, 2, 0, 0, 0, 0), "SPECIES_SWAMPERT": (0, 3, 0, 0, 0, 0),
+    "SPECIES_POOCHYENA": (0, 1, 0, 0, 0, 0), "SPECIES_MIGHTYENA": (0, 2, 0, 0, 0, 0), "SPECIES_ZIGZAGOON": (0, 0, 0, 1, 0, 0),
+    "SPECIES_LINOONE": (0, 0, 0, 2, 0, 0), "SPECIES_WURMPLE": (1, 0, 0, 0, 0, 0), "SPECIES_SILCOON": (0, 0, 2, 0, 0, 0),
+    "SPECIES_BEAUTIFLY": (0, 0, 0, 0, 3, 0), "SPECIES_CASCOON": (0, 0, 2, 0, 0, 0), "SPECIES_DUSTOX": (0, 0, 0, 0, 0, 3),
+    "SPECIES_LOTAD": (0, 0, 0, 0, 0, 1), "SPECIES_LOMBRE": (0, 0, 0, 0, 0, 2), "SPECIES_LUDICOLO": (0, 0, 0, 0, 0, 3),
+    "SPECIES_SEEDOT": (0, 0, 1, 0, 0, 0), "SPECIES_NUZLEAF": (0, 2, 0, 0, 0, 0), "SPECIES_SHIFTRY": (0, 3, 0, 0, 0, 0),
+    "SPECIES_TAILLOW": (0, 0, 0, 1, 0, 0), "SPECIES_SWELLOW": (0, 0, 0, 2, 0, 0), "SPECIES_WINGULL": (0, 0, 0, 1, 0, 0),
+    "SPECIES_PELIPPER": (0, 0, 2, 0, 0, 0), "SPECIES_RALTS": (0, 0, 0, 0, 1, 0), "SPECIES_KIRLIA": (0, 0, 0, 0, 2, 0),
+    "SPECIES_GARDEVOIR": (0, 0, 0, 0, 3, 0), "SPECIES_SURSKIT": (0, 0, 0, 1, 0, 0), "SPECIES_MASQUERAIN": (0, 0, 0, 0, 1, 1),
+    "SPECIES_SHROOMISH": (1, 0, 0, 0, 0, 0), "SPECIES_BRELOOM": (0, 2, 0, 0, 0, 0), "SPECIES_SLAKOTH": (1, 0, 0, 0, 0, 0),
+    "SPECIES_VIGOROTH": (0, 0, 0, 2, 0, 0), "SPECIES_SLAKING": (3, 0, 0, 0, 0, 0), "SPECIES_NINCADA": (0, 0, 1, 0, 0, 0),
+    "SPECIES_NINJASK": (0, 0, 0, 2, 0, 0), "SPECIES_SHEDINJA": (2, 0, 0, 0, 0, 0), "SPECIES_WHISMUR": (1, 0, 0, 0, 0, 0),
+    "SPECIES_LOUDRED": (2, 0, 0, 0, 0, 0), "SPECIES_EXPLOUD": (3, 0, 0, 0, 0, 0), "SPECIES_MAKUHITA": (1, 0, 0, 0, 0, 0),
+    "SPECIES_HARIYAMA": (2, 0, 0, 0, 0, 0), "SPECIES_AZURILL": (1, 0, 0, 0, 0, 0), "SPECIES_NOSEPASS": (0, 0, 1, 0, 0, 0),
+    "SPECIES_SKITTY": (0, 0, 0, 1, 0, 0), "SPECIES_DELCATTY": (1, 0, 0, 1, 0, 0), "SPECIES_SABLEYE": (0, 1, 1, 0, 0, 0),
+    "SPECIES_MAWILE": (0, 1, 1, 0, 0, 0), "SPECIES_ARON": (0, 0, 1, 0, 0, 0), "SPECIES_LAIRON": (0, 0, 2, 0, 0, 0),
+    "SPECIES_AGGRON": (0, 0, 3, 0, 0, 0), "SPECIES_MEDITITE": (0, 0, 0, 1, 0, 0), "SPECIES_MEDICHAM": (0, 0, 0, 2, 0, 0),
+    "SPECIES_ELECTRIKE": (0, 0, 0, 1, 0, 0), "SPECIES_MANECTRIC": (0, 0, 0, 2, 0, 0), "SPECIES_PLUSLE": (0, 0, 0, 1, 0, 0),
+    "SPECIES_MINUN": (0, 0, 0, 1, 0, 0), "SPECIES_VOLBEAT": (0, 0, 0, 1, 0, 0), "SPECIES_ILLUMISE": (0, 0, 0, 1, 0, 0),
+    "SPECIES_ROSELIA": (0, 0, 0, 0, 2, 0), "SPECIES_GULPIN": (1, 0, 0, 0, 0, 0), "SPECIES_SWALOT": (2, 0, 0, 0, 0, 0),
+    "SPECIES_CARVANHA": (0, 1, 0, 0, 0, 0), "SPECIES_SHARPEDO": (0, 2, 0, 0, 0, 0), "SPECIES_WAILMER": (1, 0, 0, 0, 0, 0),
+    "SPECIES_WAILORD": (2, 0, 0, 0, 0, 0), "SPECIES_NUMEL": (0, 0, 0, 0, 1, 0), "SPECIES_CAMERUPT": (0, 1, 0, 0, 1, 0),
+    "SPECIES_TORKOAL": (0, 0, 2, 0, 0, 0), "SPECIES_SPOINK": (0, 0, 0, 0, 0, 1), "SPECIES_GRUMPIG": (0, 0, 0, 0, 0, 2),
+    "SPECIES_SPINDA": (0, 0, 0, 0, 1, 0), "SPECIES_TRAPINCH": (0, 1, 0, 0, 0, 0), "SPECIES_VIBRAVA": (0, 1, 0, 1, 0, 0),
+    "SPECIES_FLYGON": (0, 1, 0, 2, 0, 0), "SPECIES_CACNEA": (0, 0, 0, 0, 1, 0), "SPECIES_CACTURNE": (0, 1, 0, 0, 1, 0),
+    "SPECIES_SWABLU": (0, 0, 0, 0, 0, 1), "SPECIES_ALTARIA": (0, 0, 0, 0, 0, 2), "SPECIES_ZANGOOSE": (0, 2, 0, 0, 0, 0),
+    "SPECIES_SEVIPER": (0, 1, 0, 0, 1, 0), "SPECIES_LUNATONE": (0, 0, 0, 0, 2, 0), "SPECIES_SOLROCK": (0, 2, 0, 0, 0, 0),
+    "SPECIES_BARBOACH": (1, 0, 0, 0, 0, 0), "SPECIES_WHISCASH": (2, 0, 0, 0, 0, 0), "SPECIES_CORPHISH": (0, 1, 0, 0, 0, 0),
+    "SPECIES_CRAWDAUNT": (0, 2, 0, 0, 0, 0), "SPECIES_BALTOY": (0, 0, 0, 0, 0, 1), "SPECIES_CLAYDOL": (0, 0, 0, 0, 0, 2),
+    "SPECIES_LILEEP": (0, 0, 0, 0, 0, 1), "SPECIES_CRADILY": (0, 0, 0, 0, 0, 2), "SPECIES_ANORITH": (0, 1, 0, 0, 0, 0),
+    "SPECIES_ARMALDO": (0, 2, 0, 0, 0, 0), "SPECIES_FEEBAS": (0, 0, 0, 1, 0, 0), "SPECIES_MILOTIC": (0, 0, 0, 0, 0, 2),
+    "SPECIES_CASTFORM": (1, 0, 0, 0, 0, 0), "SPECIES_KECLEON": (0, 0, 0, 0, 0, 1), "SPECIES_SHUPPET": (0, 1, 0, 0, 0, 0),
+    "SPECIES_BANETTE": (0, 2, 0, 0, 0, 0), "SPECIES_DUSKULL": (0, 0, 0, 0, 0, 1), "SPECIES_DUSCLOPS": (0, 0, 1, 0, 0, 1),
+    "SPECIES_TROPIUS": (2, 0, 0, 0, 0, 0), "SPECIES_CHIMECHO": (0, 0, 0, 0, 1, 1), "SPECIES_ABSOL": (0, 2, 0, 0, 0, 0),
+    "SPECIES_WYNAUT": (1, 0, 0, 0, 0, 0), "SPECIES_SNORUNT": (1, 0, 0, 0, 0, 0), "SPECIES_GLALIE": (2, 0, 0, 0, 0, 0),
+    "SPECIES_SPHEAL": (1, 0, 0, 0, 0, 0), "SPECIES_SEALEO": (2, 0, 0, 0, 0, 0), "SPECIES_WALREIN": (3, 0, 0, 0, 0, 0),
+    "SPECIES_CLAMPERL": (0, 0, 1, 0, 0, 0), "SPECIES_HUNTAIL": (0, 1, 1, 0, 0, 0), "SPECIES_GOREBYSS": (0, 0, 0, 0, 2, 0),
+    "SPECIES_RELICANTH": (1, 0, 1, 0, 0, 0), "SPECIES_LUVDISC": (0, 0, 0, 1, 0, 0), "SPECIES_BAGON": (0, 1, 0, 0, 0, 0),
+    "SPECIES_SHELGON": (0, 0, 2, 0, 0, 0), "SPECIES_SALAMENCE": (0, 3, 0, 0, 0, 0), "SPECIES_BELDUM": (0, 0, 1, 0, 0, 0),
+    "SPECIES_METANG": (0, 0, 2, 0, 0, 0), "SPECIES_METAGROSS": (0, 0, 3, 0, 0, 0), "SPECIES_REGIROCK": (0, 0, 3, 0, 0, 0),
+    "SPECIES_REGICE": (0, 0, 0, 0, 0, 3), "SPECIES_REGISTEEL": (0, 0, 2, 0, 0, 1), "SPECIES_LATIAS": (0, 0, 0, 0, 0, 3),
+    "SPECIES_LATIOS": (0, 0, 0, 0, 3, 0), "SPECIES_KYOGRE": (0, 0, 0, 0, 3, 0), "SPECIES_GROUDON": (0, 3, 0, 0, 0, 0),
+    "SPECIES_RAYQUAZA": (0, 2, 0, 0, 1, 0), "SPECIES_JIRACHI": (3, 0, 0, 0, 0, 0), "SPECIES_DEOXYS": (0, 1, 0, 1, 1, 0),
+}
+
+# (common item, rare item) a wild Pokemon may hold: common 50%, rare 5%,
+# 100% when both are the same item. Every Gen 3 species that can hold an
+# item is listed (itemCommon/itemRare in pokeemerald's species data);
+# species not listed hold nothing.
+WILD_HELD_ITEMS = {
+    # Gen 1
+    "SPECIES_BUTTERFREE": (None, "ITEM_SILVER_POWDER"),
+    "SPECIES_BEEDRILL": (None, "ITEM_POISON_BARB"),
+    "SPECIES_SPEAROW": (None, "ITEM_SHARP_BEAK"), "SPECIES_FEAROW": (None, "ITEM_SHARP_BEAK"),
+    "SPECIES_PIKACHU": ("ITEM_ORAN_BERRY", "ITEM_LIGHT_BALL"), "SPECIES_RAICHU": ("ITEM_ORAN_BERRY", None),
+    "SPECIES_CLEFAIRY": ("ITEM_LEPPA_BERRY", "ITEM_MOON_STONE"),
+    "SPECIES_CLEFABLE": ("ITEM_LEPPA_BERRY", "ITEM_MOON_STONE"),
+    "SPECIES_VULPIX": ("ITEM_RAWST_BERRY", "ITEM_RAWST_BERRY"),
+    "SPECIES_NINETALES": ("ITEM_RAWST_BERRY", "ITEM_RAWST_BERRY"),
+    "SPECIES_PARAS": ("ITEM_TINY_MUSHROOM", "ITEM_BIG_MUSHROOM"),
+    "SPECIES_PARASECT": ("ITEM_TINY_MUSHROOM", "ITEM_BIG_MUSHROOM"),
+    "SPECIES_MEOWTH": (None, "ITEM_NUGGET"),
+    "SPECIES_GROWLITHE": ("ITEM_RAWST_BERRY", "ITEM_RAWST_BERRY"),
+    "SPECIES_ARCANINE": ("ITEM_RAWST_BERRY", "ITEM_RAWST_BERRY"),
+    "SPECIES_POLIWHIRL": (None, "ITEM_KINGS_ROCK"),
+    "SPECIES_KADABRA": (None, "ITEM_TWISTED_SPOON"), "SPECIES_ALAKAZAM": (None, "ITEM_TWISTED_SPOON"),
+    "SPECIES_GEODUDE": (None, "ITEM_EVERSTONE"), "SPECIES_GRAVELER": (None, "ITEM_EVERSTONE"),
+    "SPECIES_GOLEM": (None, "ITEM_EVERSTONE"),
+    "SPECIES_SLOWPOKE": (None, "ITEM_KINGS_ROCK"), "SPECIES_SLOWBRO": (None, "ITEM_KINGS_ROCK"),
+    "SPECIES_MAGNEMITE": (None, "ITEM_METAL_COAT"), "SPECIES_MAGNETON": (None, "ITEM_METAL_COAT"),
+    "SPECIES_FARFETCHD": (None, "ITEM_STICK"),
+    "SPECIES_DODUO": (None, "ITEM_SHARP_BEAK"), "SPECIES_DODRIO": (None, "ITEM_SHARP_BEAK"),
+    "SPECIES_GRIMER": (None, "ITEM_NUGGET"), "SPECIES_MUK": (None, "ITEM_NUGGET"),
+    "SPECIES_SHELLDER": ("ITEM_PEARL", "ITEM_BIG_PEARL"), "SPECIES_CLOYSTER": ("ITEM_PEARL", "ITEM_BIG_PEARL"),
+    "SPECIES_CUBONE": (None, "ITEM_THICK_CLUB"), "SPECIES_MAROWAK": (None, "ITEM_THICK_CLUB"),
+    "SPECIES_KOFFING": (None, "ITEM_SMOKE_BALL"), "SPECIES_WEEZING": (None, "ITEM_SMOKE_BALL"),
+    "SPECIES_CHANSEY": (None, "ITEM_LUCKY_EGG"),
+    "SPECIES_HORSEA": (None, "ITEM_DRAGON_SCALE"), "SPECIES_SEADRA": (None, "ITEM_DRAGON_SCALE"),
+    "SPECIES_STARYU": ("ITEM_STARDUST", "ITEM_STAR_PIECE"), "SPECIES_STARMIE": ("ITEM_STARDUST", "ITEM_STAR_PIECE"),
+    "SPECIES_JYNX": ("ITEM_ASPEAR_BERRY", "ITEM_ASPEAR_BERRY"),
+    "SPECIES_MAGMAR": (None, "ITEM_RAWST_BERRY"),
+    "SPECIES_DITTO": (None, "ITEM_METAL_POWDER"),
+    "SPECIES_SNORLAX": ("ITEM_CHESTO_BERRY", "ITEM_CHESTO_BERRY"),
+    "SPECIES_DRATINI": (None, "ITEM_DRAGON_SCALE"), "SPECIES_DRAGONAIR": (None, "ITEM_DRAGON_SCALE"),
+    "SPECIES_DRAGONITE": (None, "ITEM_DRAGON_SCALE"),
+    "SPECIES_MEW": ("ITEM_LUM_BERRY", "ITEM_LUM_BERRY"),
+    # Gen 2
+    "SPECIES_FURRET": ("ITEM_ORAN_BERRY", "ITEM_SITRUS_BERRY"),
+    "SPECIES_POLITOED": (None, "ITEM_KINGS_ROCK"),
+    "SPECIES_SLOWKING": (None, "ITEM_KINGS_ROCK"),
+    "SPECIES_MISDREAVUS": (None, "ITEM_SPELL_TAG"),
+    "SPECIES_GIRAFARIG": ("ITEM_PERSIM_BERRY", "ITEM_PERSIM_BERRY"),
+    "SPECIES_QWILFISH": (None, "ITEM_POISON_BARB"),
+    "SPECIES_SHUCKLE": ("ITEM_ORAN_BERRY", "ITEM_ORAN_BERRY"),
+    "SPECIES_SNEASEL": (None, "ITEM_QUICK_CLAW"),
+    "SPECIES_CORSOLA": (None, "ITEM_RED_SHARD"),
+    "SPECIES_KINGDRA": (None, "ITEM_DRAGON_SCALE"),
+    "SPECIES_MILTANK": ("ITEM_MOOMOO_MILK", "ITEM_MOOMOO_MILK"),
+    "SPECIES_BLISSEY": (None, "ITEM_LUCKY_EGG"),
+    "SPECIES_CELEBI": ("ITEM_LUM_BERRY", "ITEM_LUM_BERRY"),
+    # Gen 3
+    "SPECIES_POOCHYENA": (None, "ITEM_PECHA_BERRY"), "SPECIES_MIGHTYENA": (None, "ITEM_PECHA_BERRY"),
+    "SPECIES_ZIGZAGOON": ("ITEM_ORAN_BERRY", "ITEM_SITRUS_BERRY"),
+    "SPECIES_LINOONE": ("ITEM_ORAN_BERRY", "ITEM_SITRUS_BERRY"),
+    "SPECIES_BEAUTIFLY": (None, "ITEM_SILVER_POWDER"), "SPECIES_DUSTOX": (None, "ITEM_SILVER_POWDER"),
+    "SPECIES_MASQUERAIN": (None, "ITEM_SILVER_POWDER"),
+    "SPECIES_SKITTY": (None, "ITEM_LEPPA_BERRY"), "SPECIES_DELCATTY": (None, "ITEM_LEPPA_BERRY"),
+    "SPECIES_ARON": (None, "ITEM_HARD_STONE"), "SPECIES_LAIRON": (None, "ITEM_HARD_STONE"),
+    "SPECIES_AGGRON": (None, "ITEM_HARD_STONE"),
+    "SPECIES_ROSELIA": (None, "ITEM_POISON_BARB"),
+    "SPECIES_NUMEL": (None, "ITEM_RAWST_BERRY"), "SPECIES_CAMERUPT": (None, "ITEM_RAWST_BERRY"),
+    "SPECIES_TORKOAL": (None, "ITEM_CHARCOAL"),
+    "SPECIES_SPINDA": ("ITEM_CHESTO_BERRY", None),
+    "SPECIES_CACNEA": (None, "ITEM_POISON_BARB"), "SPECIES_CACTURNE": (None, "ITEM_POISON_BARB"),
+    "SPECIES_LUNATONE": (None, "ITEM_MOON_STONE"), "SPECIES_SOLROCK": (None, "ITEM_SUN_STONE"),
+    "SPECIES_CASTFORM": ("ITEM_MYSTIC_WATER", "ITEM_MYSTIC_WATER"),
+    "SPECIES_KECLEON": (None, "ITEM_PERSIM_BERRY"),
+    "SPECIES_SHUPPET": (None, "ITEM_SPELL_TAG"), "SPECIES_BANETTE": (None, "ITEM_SPELL_TAG"),
+    "SPECIES_DUSKULL": (None, "ITEM_SPELL_TAG"), "SPECIES_DUSCLOPS": (None, "ITEM_SPELL_TAG"),
+    "SPECIES_SNORUNT": (None, "ITEM_NEVER_MELT_ICE"), "SPECIES_GLALIE": (None, "ITEM_NEVER_MELT_ICE"),
+    "SPECIES_LUVDISC": ("ITEM_HEART_SCALE", None),
+    "SPECIES_BELDUM": (None, "ITEM_METAL_COAT"), "SPECIES_METANG": (None, "ITEM_METAL_COAT"),
+    "SPECIES_METAGROSS": (None, "ITEM_METAL_COAT"),
+    "SPECIES_JIRACHI": ("ITEM_STAR_PIECE", "ITEM_STAR_PIECE"),
+}
+
 # =============================================================================
 # GROWTH RATE DATA - Total EXP needed to reach each level
 # =============================================================================
@@ -512,12 +736,17 @@ FISHING_GROUPS = {
     "super_rod": [5, 6, 7, 8, 9]
 }
 
+# Result keys produced by process_encounters, in display order
+ENCOUNTER_TYPES = ["grass", "surfing", "rock_smash", "fishing_old_rod",
+                   "fishing_good_rod", "fishing_super_rod"]
+
 
 # =============================================================================
 # EXP CALCULATION FUNCTIONS (with proper integer math)
 # =============================================================================
 
-def calculate_exp_integer(base_exp: int, level: int, lucky_egg: bool = False) -> int:
+def calculate_exp_integer(base_exp: int, level: int, lucky_egg: bool = False, traded: bool = False,
+                          trainer: bool = False) -> int:
     """
     Calculate EXP gained from defeating a wild Pokemon in Gen 3.
     Uses proper integer math with floor after each operation.
@@ -526,6 +755,8 @@ def calculate_exp_integer(base_exp: int, level: int, lucky_egg: bool = False) ->
     With Lucky Egg: EXP = floor(floor(floor(base_exp * level) / 7) * 3 / 2)
     
     Gen 3 applies 1.5x as *3 then /2 with floor between.
+    A trainer's Pokemon gives another 1.5x, floored, after the Lucky Egg.
+    A traded Pokemon gets another 1.5x, floored, after the trainer bonus.
     """
     # Step 1: base_exp * level (already integers, no floor needed)
     exp = base_exp * level
@@ -538,6 +769,16 @@ def calculate_exp_integer(base_exp: int, level: int, lucky_egg: bool = False) ->
         exp = exp * 3
         exp = exp // 2
     
+    # Step 4: Trainer battle bonus (1.5x, floored separately)
+    if trainer:
+        exp = exp * 3
+        exp = exp // 2
+    
+    # Step 5: Traded Pokemon bonus (another 1.5x, floored separately)
+    if traded:
+        exp = exp * 3
+        exp = exp // 2
+    
     return exp
 
 
@@ -545,30 +786,46 @@ def calculate_expected_exp_for_slot(
     species: str, 
     min_level: int, 
     max_level: int, 
-    lucky_egg: bool = False
+    lucky_egg: bool = False,
+    traded: bool = False,
+    exp_formula=None,
+    species_table: Dict[str, Dict] = None,
+    unknown_species: Dict[str, int] = None
 ) -> float:
     """
     Calculate the expected EXP for a single encounter slot.
     
     For level ranges, we calculate EXP for each possible level
-    and average them (uniform distribution).
+    and average them (uniform distribution). exp_formula is the
+    generation engine's EXP kernel (Gen 3 when omitted); species_table
+    is an imported table (built-in data when omitted).
+    
+    Unknown species use a base EXP of 50. They are counted into
+    unknown_species when given, so callers can report them once.
     """
-    if species not in BASE_EXP:
-        print(f"Warning: Unknown species {species}, using default base_exp of 50")
-        base_exp = 50
-    else:
-        base_exp = BASE_EXP[species]
+    if exp_formula is None:
+        exp_formula = calculate_exp_integer
+    base_exp = _lookup_base_exp(species, species_table, unknown_species)
     
-    # Calculate EXP for each possible level and average
-    total_exp = 0
+    # EXP summed over every possible level, then averaged
+    total_exp = get_backend()["slot_exp_sum"](exp_formula, base_exp, min_level, max_level, lucky_egg, traded)
     num_levels = max_level - min_level + 1
     
-    for level in range(min_level, max_level + 1):
-        total_exp += calculate_exp_integer(base_exp, level, lucky_egg)
-    
     return total_exp / num_levels
 
 
+def _lookup_base_exp(species: str, species_table: Dict[str, Dict], unknown_species: Optional[Dict[str, int]]) -> int:
+    """Base EXP from the species table; unknown species count (or warn) and use 50."""
+    base_exp = (species_table or DEFAULT_SPECIES_TABLE)["base_exp"].get(species)
+    if base_exp is None:
+        if unknown_species is None:
+            print(f"Warning: Unknown species {species}, using default base_exp of 50")
+        else:
+            unknown_species[species] = unknown_species.get(species, 0) + 1
+        base_exp = 50
+    return base_exp
+
+
 def normalize_rates(rates: List[int], indices: List[int] = None) -> List[float]:
     """Normalize encounter rates to probabilities (sum to 1)."""
     if indices is not None:
@@ -580,11 +837,25 @@ def normalize_rates(rates: List[int], indices: List[int] = None) -> List[float]:
         return [r / total for r in rates]
 
 
+def held_item_odds(species: str, species_table: Dict[str, Dict] = None) -> List[Tuple[str, float]]:
+    """Chance that a wild Pokemon of this species holds each of its items."""
+    common, rare = (species_table or DEFAULT_SPECIES_TABLE)["held_items"].get(species, (None, None))
+    if common is not None and common == rare:
+        return [(common, 1.0)]
+    odds = []
+    if common:
+        odds.append((common, 0.5))
+    if rare:
+        odds.append((rare, 0.05))
+    return odds
+
+
 def calculate_encounter_type_expected_exp(
     mons: List[Dict],
     encounter_rates: List[int],
     indices: List[int] = None,
-    lucky_egg: bool = False
+    lucky_egg: bool = False,
+    traded: bool = False
 ) -> Tuple[float, List[Dict]]:
     """
     Calculate expected EXP for an encounter type.
@@ -592,6 +863,36 @@ def calculate_encounter_type_expected_exp(
     Returns:
         Tuple of (expected_exp, breakdown_list)
     """
+    exp, breakdown, _, _, _ = calculate_encounter_type_metrics(mons, encounter_rates, indices, lucky_egg, traded)
+    return exp, breakdown
+
+
+def calculate_encounter_type_metrics(
+    mons: List[Dict],
+    encounter_rates: List[int],
+    indices: List[int] = None,
+    lucky_egg: bool = False,
+    traded: bool = False,
+    exp_formula=None,
+    species_table: Dict[str, Dict] = None,
+    unknown_species: Dict[str, int] = None
+) -> Tuple[float, List[Dict], Dict[str, float], Dict[str, float], Fraction]:
+    """
+    Expected EXP, EVs and held-item odds per battle in one pass over the slots.
+    
+    Expected EXP is accumulated exactly: with R the rate sum and L the least
+    common multiple of the slots' level-range sizes, every slot's share
+    rate * level_sum / (R * size) becomes an integer over R * L. The float
+    expected_exp is that single fraction correctly rounded, so it carries no
+    summation noise and equal tables always produce equal floats.
+    
+    Returns:
+        Tuple of (expected_exp, breakdown_list, evs, items, exp_exact) where
+        each breakdown slot keeps its integer "rate" next to the normalized
+        probability, evs maps each of EV_STATS to expected EVs per battle, items maps
+        item to the chance a battle's Pokemon holds it and exp_exact is the
+        expected EXP as a Fraction.
+    """
     if indices is not None:
         working_mons = [mons[i] for i in indices]
         working_rates = [encounter_rates[i] for i in indices]
@@ -600,30 +901,76 @@ def calculate_encounter_type_expected_exp(
         working_rates = encounter_rates[:len(mons)]
     
     probabilities = normalize_rates(working_rates, None)
+    base_exp_table = (species_table or DEFAULT_SPECIES_TABLE)["base_exp"]
+    ev_yield = (species_table or DEFAULT_SPECIES_TABLE)["ev_yield"]
+    if exp_formula is None:
+        exp_formula = calculate_exp_integer
+    slot_exp_sum = get_backend()["slot_exp_sum"]
     
-    total_expected_exp = 0.0
+    numerator = 0
+    common_levels = 1
     breakdown = []
+    evs = [0.0] * len(EV_STATS)
+    items = {}
     
-    for i, (mon, prob) in enumerate(zip(working_mons, probabilities)):
+    for i, (mon, rate, prob) in enumerate(zip(working_mons, working_rates, probabilities)):
         species = mon["species"]
         min_level = mon["min_level"]
         max_level = mon["max_level"]
         
-        slot_exp = calculate_expected_exp_for_slot(species, min_level, max_level, lucky_egg)
-        contribution = slot_exp * prob
-        total_expected_exp += contribution
+        base_exp = base_exp_table.get(species)
+        if base_exp is None:
+            base_exp = _lookup_base_exp(species, species_table, unknown_species)
+        # The backend memoizes one prefix table per species kernel
+        exp_sum = slot_exp_sum(exp_formula, base_exp, min_level, max_level, lucky_egg, traded)
+        
+        # Grow the common denominator only when this level range needs it
+        num_levels = max_level - min_level + 1
+        if common_levels % num_levels:
+            scale = num_levels // math.gcd(common_levels, num_levels)
+            numerator *= scale
+            common_levels *= scale
+        numerator += rate * exp_sum * (common_levels // num_levels)
+        
+        # Per-slot floats are for display; each is one correctly rounded division
+        slot_exp = exp_sum / num_levels
+        
+        for stat, ev in enumerate(ev_yield.get(species, ())):
+            evs[stat] += ev * prob
+        for item, chance in held_item_odds(species, species_table):
+            items[item] = items.get(item, 0.0) + chance * prob
         
         breakdown.append({
             "slot": i,
             "species": species.replace("SPECIES_", ""),
             "min_level": min_level,
             "max_level": max_level,
+            "rate": rate,
             "probability": prob,
             "expected_exp": slot_exp,
-            "contribution": contribution
+            "contribution": slot_exp * prob
         })
     
-    return total_expected_exp, breakdown
+    denominator = sum(working_rates) * common_levels
+    return (numerator / denominator, breakdown, dict(zip(EV_STATS, evs)), items,
+            Fraction(numerator, denominator))
+
+
+def summarize_slot_metrics(
+    breakdown: List[Dict],
+    species_table: Dict[str, Dict] = None
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """EVs and held-item odds per battle for an already-weighted breakdown (e.g. a Repel view)."""
+    evs = [0.0] * len(EV_STATS)
+    items = {}
+    ev_yield = (species_table or DEFAULT_SPECIES_TABLE)["ev_yield"]
+    for slot in breakdown:
+        species, prob = f"SPECIES_{slot['species']}", slot["probability"]
+        for stat, ev in enumerate(ev_yield.get(species, ())):
+            evs[stat] += ev * prob
+        for item, chance in held_item_odds(species, species_table):
+            items[item] = items.get(item, 0.0) + chance * prob
+    return dict(zip(EV_STATS, evs)), items
 
 
 def calculate_efficiency_score(expected_exp: float, encounter_rate: int) -> float:
@@ -633,30 +980,87 @@ def calculate_efficiency_score(expected_exp: float, encounter_rate: int) -> floa
     Efficiency = Expected EXP × (Encounter Rate / 16)
     
     In Gen 3, encounter_rate is typically 0-16 where higher = more frequent.
-    This weighs high EXP with high encounter frequency.
+    This weighs high EXP with high encounter frequency. An exact (Fraction)
+    expected EXP gives the correctly rounded score.
     """
     if encounter_rate <= 0:
         return 0.0
+    if isinstance(expected_exp, Fraction):
+        # Integer true division rounds correctly
+        return expected_exp.numerator * encounter_rate / (expected_exp.denominator * 16)
     return expected_exp * (encounter_rate / 16.0)
 
 
+# Metrics a weighted objective can use: "exp", any of EV_STATS, "item"
+# (chance of holding anything) or "item:ITEM_X" (one specific item)
+def parse_objective(text: str) -> Dict[str, float]:
+    """
+    Parse weights like "exp=1, speed=100, item:ITEM_NUGGET=500".
+
+    Raises:
+        ValueError: on unknown metrics or malformed weights
+    """
+    weights = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        metric, _, weight = part.partition("=")
+        metric = metric.strip().lower()
+        if metric.startswith("item:"):
+            metric = "item:" + metric[5:].upper()
+        elif metric not in ("exp", "item") + EV_STATS:
+            raise ValueError(f"Unknown metric: {metric}")
+        weights[metric] = float(weight) if weight.strip() else 1.0
+    return weights
+
+
+def calculate_objective_value(edata: Dict[str, Any], weights: Dict[str, float]) -> float:
+    """Weighted per-battle value of one encounter table."""
+    evs, items = edata.get("evs", {}), edata.get("items", {})
+    value = 0.0
+    for metric, weight in weights.items():
+        if metric == "exp":
+            value += weight * edata["expected_exp"]
+        elif metric == "item":
+            value += weight * sum(items.values())
+        elif metric.startswith("item:"):
+            value += weight * items.get(metric[5:], 0.0)
+        else:
+            value += weight * evs.get(metric, 0.0)
+    return value
+
+
+def calculate_objective_score(edata: Dict[str, Any], weights: Dict[str, float] = None) -> float:
+    """
+    Ranking score: the efficiency score, or the weighted objective scaled the same way.
+
+    Views with a Repel or lead ability rank by their effective rate.
+    """
+    if not weights:
+        return edata.get("efficiency", 0)
+    rate = edata.get("effective_rate", edata.get("encounter_rate", 0))
+    return calculate_efficiency_score(calculate_objective_value(edata, weights), rate)
+
+
 # =============================================================================
 # GROWTH RATE / BATTLE COUNTING FUNCTIONS
 # =============================================================================
 
-def get_total_exp_for_level(species: str, level: int) -> int:
+def get_total_exp_for_level(species: str, level: int, species_table: Dict[str, Dict] = None) -> int:
     """Get total EXP needed to reach a given level for a species."""
-    if species not in SPECIES_GROWTH_RATE:
+    growth_rates = (species_table or DEFAULT_SPECIES_TABLE)["growth_rate"]
+    if species not in growth_rates:
         # Default to medium_fast if unknown
         growth_rate = "medium_fast"
     else:
-        growth_rate = SPECIES_GROWTH_RATE[species]
+        growth_rate = growth_rates[species]
     
     func = GROWTH_RATE_FUNCTIONS[growth_rate]
     return func(level)
 
 
-def get_exp_needed(species: str, current_level: int, current_exp: int, target_level: int) -> int:
+def get_exp_needed(species: str, current_level: int, current_exp: int, target_level: int,
+                   species_table: Dict[str, Dict] = None) -> int:
     """
     Calculate total EXP needed to go from current state to target level.
     
@@ -665,11 +1069,12 @@ def get_exp_needed(species: str, current_level: int, current_exp: int, target_le
         current_level: Current level
         current_exp: Current total EXP (what the game shows)
         target_level: Target level to reach
+        species_table: Imported species table (built-in data when omitted)
     
     Returns:
         EXP needed to reach target_level
     """
-    target_exp = get_total_exp_for_level(species, target_level)
+    target_exp = get_total_exp_for_level(species, target_level, species_table)
     return max(0, target_exp - current_exp)
 
 
@@ -695,309 +1100,5046 @@ def calculate_battles_needed(
 
 
 # =============================================================================
-# DATA PROCESSING
+# COMPUTE BACKENDS (stdlib arrays, optional NumPy)
 # =============================================================================
+# The hot paths go through the active backend:
+#   - per-slot EXP sums over a level range, read from prefix-sum tables;
+#   - top-N selection for the rankings;
+#   - the efficiency order and per-spot battle counts of the battle calculator;
+#   - the best-EXP frames of one chunk of an RNG frame search.
+# The stdlib backend keeps each prefix table in an array('q') buffer. The
+# buffer grows on demand up to the highest level asked for and is read
+# through a memoryview. The NumPy backend builds whole int64 tables with one
+# vectorized call of the EXP kernel, and sorts and divides whole columns at
+# once. Both give identical numbers: sums are exact integers, battle counts
+# are ceilings of the same IEEE divisions, and ties keep earlier rows first,
+# as heapq.nlargest does. NumPy is chosen automatically when it can be
+# imported.
 
-def format_map_name(map_name: str) -> str:
-    """Convert MAP_ROUTE101 to Route 101, etc."""
-    name = map_name.replace("MAP_", "")
-    if name.startswith("ROUTE"):
-        route_num = name.replace("ROUTE", "")
-        return f"Route {route_num}"
-    name = name.replace("_", " ").title()
-    return name
+# (exp_formula, base_exp, lucky_egg, traded) -> prefix table, per backend
+_STDLIB_PREFIX_TABLES = {}
+_NUMPY_PREFIX_TABLES = {}
 
 
-def detect_game_version(data: Dict) -> str:
-    """
-    Auto-detect which game the encounter data is from.
-    
-    Ruby/Sapphire JSON has base_labels like "Route101_Ruby", "Route101_Sapphire"
-    Emerald JSON has base_labels like "gRoute101"
-    FireRed/LeafGreen JSON has base_labels like "sRoute1_FireRed", "sRoute1_LeafGreen"
-    """
-    for group in data.get("wild_encounter_groups", []):
-        if not group.get("for_maps", False):
-            continue
-        for encounter in group.get("encounters", []):
-            base_label = encounter.get("base_label", "")
-            if "_Ruby" in base_label or "_Sapphire" in base_label:
-                return "RS"  # Ruby/Sapphire combined file
-            elif "_FireRed" in base_label or "_LeafGreen" in base_label:
-                return "FRLG"  # FireRed/LeafGreen combined file
-            elif base_label.startswith("g"):
-                return "Emerald"
-    return "Unknown"
+def _stdlib_slot_exp_sum(exp_formula, base_exp: int, min_level: int, max_level: int,
+                         lucky_egg: bool = False, traded: bool = False) -> int:
+    """EXP summed over min_level..max_level from a lazily grown array prefix table."""
+    from array import array
 
+    if min_level < 1:
+        return sum(exp_formula(base_exp, level, lucky_egg, traded) for level in range(min_level, max_level + 1))
+    key = (exp_formula, base_exp, lucky_egg, traded)
+    entry = _STDLIB_PREFIX_TABLES.get(key)
+    if entry is None or len(entry[0]) <= max_level:
+        if entry:
+            # An exported buffer cannot resize, so the old view is released first
+            table, view = entry
+            view.release()
+        else:
+            table = array("q", [0])
+        total = table[-1]
+        for level in range(len(table), max_level + 1):
+            total += exp_formula(base_exp, level, lucky_egg, traded)
+            table.append(total)
+        entry = (table, memoryview(table))
+        _STDLIB_PREFIX_TABLES[key] = entry
+    prefix = entry[1]
+    return prefix[max_level] - prefix[min_level - 1]
 
-def get_encounter_rates_from_json(data: Dict) -> Dict[str, List[int]]:
-    """
-    Extract encounter rates from the JSON header instead of hardcoding.
-    """
-    rates = {}
-    for group in data.get("wild_encounter_groups", []):
-        if not group.get("for_maps", False):
-            continue
-        for field in group.get("fields", []):
-            field_type = field.get("type", "")
-            enc_rates = field.get("encounter_rates", [])
-            if enc_rates:
-                rates[field_type] = enc_rates
-            # Also grab fishing groups if present
-            if "groups" in field:
-                rates["fishing_groups"] = field["groups"]
-    return rates
 
+def _stdlib_top_k(values: List[float], k: int) -> List[int]:
+    """Indices of the k largest values, earlier indices first on ties."""
+    import heapq
+
+    return heapq.nlargest(k, range(len(values)), key=values.__getitem__)
+
+
+def _stdlib_argsort_desc(values: List[float]) -> List[int]:
+    """Indices ordering values from largest to smallest, stable on ties."""
+    return sorted(range(len(values)), key=values.__getitem__, reverse=True)
+
+
+def _stdlib_battles_needed(exp_needed: List[int], exp_values: List[float]) -> List[float]:
+    """calculate_battles_needed for every (EXP needed, EXP per battle) row of two columns."""
+    return [math.ceil(need / exp) if exp > 0 else float('inf') for need, exp in zip(exp_needed, exp_values)]
+
+
+def _stdlib_best_frames(lookup: Tuple, total: int, state: int, start_frame: int, count: int,
+                        top_k: int) -> List[Tuple[int, int]]:
+    """Best (exp, -frame) hits of count frames from RNG state, in a tight loop with a heap."""
+    import heapq
+
+    slot_by_roll, level_ranges, exp_offsets, exp_values = lookup
+    hits = []
+    mult, inc, mask = LCG_MULTIPLIER, LCG_INCREMENT, LCG_MASK
+    next_state = (state * mult + inc) & mask
+    for i in range(count):
+        after = (next_state * mult + inc) & mask
+        slot = slot_by_roll[(next_state >> 16) % total]
+        exp = exp_values[exp_offsets[slot] + (after >> 16) % level_ranges[slot]]
+        item = (exp, -(start_frame + i))
+        if len(hits) < top_k:
+            heapq.heappush(hits, item)
+        elif item > hits[0]:
+            heapq.heapreplace(hits, item)
+        next_state = after
+    return hits
+
+
+def _stdlib_backend() -> Dict[str, Any]:
+    return {
+        "name": "stdlib",
+        "slot_exp_sum": _stdlib_slot_exp_sum,
+        "top_k": _stdlib_top_k,
+        "argsort_desc": _stdlib_argsort_desc,
+        "battles_needed": _stdlib_battles_needed,
+        "best_frames": _stdlib_best_frames,
+    }
+
+
+def _numpy_backend() -> Dict[str, Any]:
+    """NumPy versions of the backend operations (raises ImportError without NumPy)."""
+    import numpy as np
+
+    levels = np.arange(1, MAX_LEVEL + 1, dtype=np.int64)
+
+    def slot_exp_sum(exp_formula, base_exp, min_level, max_level, lucky_egg=False, traded=False):
+        if min_level < 1 or max_level > MAX_LEVEL:
+            return _stdlib_slot_exp_sum(exp_formula, base_exp, min_level, max_level, lucky_egg, traded)
+        key = (exp_formula, base_exp, lucky_egg, traded)
+        table = _NUMPY_PREFIX_TABLES.get(key)
+        if table is None:
+            # The integer kernels only use * and //, so they run elementwise
+            exp = exp_formula(np.int64(base_exp), levels, lucky_egg, traded)
+            table = np.concatenate(([0], np.cumsum(exp))).tolist()
+            _NUMPY_PREFIX_TABLES[key] = table
+        return table[max_level] - table[min_level - 1]
+
+    def argsort_desc(values):
+        # Negating is exact for floats, and the stable sort keeps ties in order
+        return np.argsort(-np.asarray(values, dtype=np.float64), kind="stable").tolist()
+
+    def top_k(values, k):
+        return argsort_desc(values)[:max(k, 0)]
 
-def process_encounters(data: Dict, lucky_egg: bool = False, game_filter: str = None) -> Dict[str, Dict]:
+    def battles_needed(exp_needed, exp_values):
+        need = np.asarray(exp_needed, dtype=np.float64)
+        exp = np.asarray(exp_values, dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            battles = np.where(exp > 0, np.ceil(need / np.where(exp > 0, exp, 1.0)), np.inf)
+        return [int(b) if b != np.inf else float('inf') for b in battles.tolist()]
+
+    def best_frames(lookup, total, state, start_frame, count, top_k):
+        slot_by_roll, level_ranges, exp_offsets, exp_values = lookup
+        # Jump coefficients for 0..count+1 steps, built by doubling blocks:
+        # step i + m = (step m) applied after (step i). uint64 products wrap
+        # mod 2**64, which leaves the low 32 bits exact.
+        size = count + 2
+        mults = np.ones(size, dtype=np.uint64)
+        adds = np.zeros(size, dtype=np.uint64)
+        filled = 1
+        while filled < size:
+            block = min(filled, size - filled)
+            block_mult, block_add = lcg_jump_coefficients(filled)
+            mults[filled:filled + block] = (mults[:block] * np.uint64(block_mult)) & np.uint64(LCG_MASK)
+            adds[filled:filled + block] = (adds[:block] * np.uint64(block_mult) + np.uint64(block_add)) & np.uint64(LCG_MASK)
+            filled += block
+        states = (mults * np.uint64(state) + adds) & np.uint64(LCG_MASK)
+        rolls = states >> np.uint64(16)
+        slots = np.asarray(slot_by_roll, dtype=np.int64)[(rolls[1:count + 1] % np.uint64(total)).astype(np.int64)]
+        offsets = (rolls[2:count + 2] % np.asarray(level_ranges, dtype=np.uint64)[slots]).astype(np.int64)
+        exps = np.asarray(exp_values, dtype=np.int64)[np.asarray(exp_offsets, dtype=np.int64)[slots] + offsets]
+        k = min(top_k, count)
+        # Stable sort by EXP descending keeps the earliest frames among ties
+        best = np.argsort(-exps, kind="stable")[:k]
+        return [(int(exps[i]), -(start_frame + int(i))) for i in best]
+
+    return {
+        "name": "numpy",
+        "slot_exp_sum": slot_exp_sum,
+        "top_k": top_k,
+        "argsort_desc": argsort_desc,
+        "battles_needed": battles_needed,
+        "best_frames": best_frames,
+    }
+
+
+COMPUTE_BACKENDS = {
+    "stdlib": _stdlib_backend,
+    "numpy": _numpy_backend,
+}
+
+_ACTIVE_BACKEND = {"backend": None}
+
+
+def set_backend(name: str = "auto") -> Dict[str, Any]:
     """
-    Process wild encounter data and calculate expected EXP for each location.
-    
-    Args:
-        data: The loaded JSON data
-        lucky_egg: Whether to apply Lucky Egg bonus
-        game_filter: Optional filter - "Ruby", "Sapphire", "Emerald", or None for all
+    Make a backend active: "stdlib", "numpy", or "auto" (NumPy when importable).
+
+    Raises:
+        ValueError: for an unknown name, or "numpy" without NumPy installed
     """
-    results = defaultdict(lambda: defaultdict(dict))
-    
-    # Detect game and get rates from JSON
-    detected_game = detect_game_version(data)
-    json_rates = get_encounter_rates_from_json(data)
-    
-    # Use rates from JSON if available, otherwise fall back to hardcoded
-    land_rates = json_rates.get("land_mons", LAND_ENCOUNTER_RATES)
-    water_rates = json_rates.get("water_mons", WATER_ENCOUNTER_RATES)
-    rock_rates = json_rates.get("rock_smash_mons", ROCK_SMASH_ENCOUNTER_RATES)
-    fish_rates = json_rates.get("fishing_mons", FISHING_ENCOUNTER_RATES)
-    fish_groups = json_rates.get("fishing_groups", FISHING_GROUPS)
-    
-    for group in data.get("wild_encounter_groups", []):
-        if not group.get("for_maps", False):
-            continue
-        
-        for encounter in group.get("encounters", []):
-            map_name = encounter.get("map", "Unknown")
-            base_label = encounter.get("base_label", "")
-            
-            # Determine version from base_label
-            if "_Ruby" in base_label:
-                version = "Ruby"
-            elif "_Sapphire" in base_label:
-                version = "Sapphire"
-            elif "_FireRed" in base_label:
-                version = "FireRed"
-            elif "_LeafGreen" in base_label:
-                version = "LeafGreen"
-            elif detected_game == "Emerald":
-                version = "Emerald"
-            else:
-                version = "Unknown"
-            
-            # Apply game filter if specified
-            if game_filter and version != game_filter:
-                continue
-            
-            location_key = f"{map_name}_{version}"
-            formatted_name = format_map_name(map_name)
-            
-            results[location_key]["map_name"] = map_name
-            results[location_key]["formatted_name"] = formatted_name
-            results[location_key]["version"] = version
-            
-            # Process each encounter type
-            encounter_types = [
-                ("land_mons", "grass", land_rates, None),
-                ("water_mons", "surfing", water_rates, None),
-                ("rock_smash_mons", "rock_smash", rock_rates, None),
-            ]
-            
-            for data_key, result_key, rates, indices in encounter_types:
-                if data_key in encounter:
-                    mon_data = encounter[data_key]
-                    mons = mon_data.get("mons", [])
-                    if mons:
-                        exp, breakdown = calculate_encounter_type_expected_exp(
-                            mons, rates, indices, lucky_egg
-                        )
-                        enc_rate = mon_data.get("encounter_rate", 0)
-                        efficiency = calculate_efficiency_score(exp, enc_rate)
-                        results[location_key][result_key] = {
-                            "expected_exp": exp,
-                            "breakdown": breakdown,
-                            "encounter_rate": enc_rate,
-                            "efficiency": efficiency
-                        }
-            
-            # Process fishing (separate by rod)
-            if "fishing_mons" in encounter:
-                fish_data = encounter["fishing_mons"]
-                mons = fish_data.get("mons", [])
-                enc_rate = fish_data.get("encounter_rate", 0)
-                
-                for rod_name, rod_indices in fish_groups.items():
-                    if len(mons) > max(rod_indices):
-                        exp, breakdown = calculate_encounter_type_expected_exp(
-                            mons, fish_rates, rod_indices, lucky_egg
-                        )
-                        efficiency = calculate_efficiency_score(exp, enc_rate)
-                        results[location_key][f"fishing_{rod_name}"] = {
-                            "expected_exp": exp,
-                            "breakdown": breakdown,
-                            "encounter_rate": enc_rate,
-                            "efficiency": efficiency
-                        }
-    
-    return dict(results)
+    if name == "auto":
+        try:
+            backend = _numpy_backend()
+        except ImportError:
+            backend = _stdlib_backend()
+    elif name in COMPUTE_BACKENDS:
+        try:
+            backend = COMPUTE_BACKENDS[name]()
+        except ImportError:
+            raise ValueError(f"The {name} backend needs {name} installed")
+    else:
+        raise ValueError(f"Unknown backend '{name}' (expected auto, {', '.join(COMPUTE_BACKENDS)})")
+    _ACTIVE_BACKEND["backend"] = backend
+    return backend
+
+
+def get_backend() -> Dict[str, Any]:
+    """The active backend, chosen automatically on first use."""
+    return _ACTIVE_BACKEND["backend"] or set_backend("auto")
 
 
 # =============================================================================
-# OUTPUT GENERATION
+# SPECIES DATA IMPORT (pret species_info.h, compiled cache)
 # =============================================================================
+# A species table holds the per-species data the calculator reads. The
+# built-in one is the hand-maintained Gen 3 data above; romhacks attach
+# their own by naming decomp sources in the encounter file:
+#   {"species_info": "../pokeemerald/src/data/pokemon/species_info.h", ...}
+# (a path or list of paths, relative to the JSON file). Imported entries
+# override built-in ones; species not in the sources keep the built-in data.
+DEFAULT_SPECIES_TABLE = {
+    "base_exp": BASE_EXP,
+    "growth_rate": SPECIES_GROWTH_RATE,
+    "ev_yield": EV_YIELD,
+    "held_items": WILD_HELD_ITEMS,
+}
 
-def generate_report(results: Dict[str, Dict], verbose: bool = False, lucky_egg: bool = False, game: str = None) -> str:
-    """Generate a formatted report of expected EXP by location."""
-    lines = []
-    egg_str = " (WITH LUCKY EGG)" if lucky_egg else ""
-    game_str = f" - {game}" if game else ""
-    lines.append("=" * 80)
-    lines.append(f"POKEMON GEN 3 EXPECTED EXP PER BATTLE BY LOCATION{egg_str}{game_str}")
-    lines.append("Using proper integer math (floor after each operation)")
-    lines.append("=" * 80)
-    lines.append("")
-    
-    by_version = defaultdict(list)
-    for key, data in results.items():
-        version = data.get("version", "Unknown")
-        by_version[version].append((key, data))
-    
-    for version in ["Ruby", "Sapphire", "Emerald", "FireRed", "LeafGreen", "Unknown"]:
-        if version not in by_version:
-            continue
-            
-        lines.append(f"\n{'='*40}")
-        lines.append(f"  {version.upper()} VERSION")
-        lines.append(f"{'='*40}\n")
-        
-        locations = sorted(by_version[version], key=lambda x: x[1].get("formatted_name", ""))
-        
-        for key, data in locations:
-            formatted_name = data.get("formatted_name", key)
-            
-            encounter_types = []
-            for etype in ["grass", "surfing", "rock_smash", "fishing_old_rod", 
-                          "fishing_good_rod", "fishing_super_rod"]:
-                if etype in data:
-                    encounter_types.append(etype)
-            
-            if not encounter_types:
-                continue
-            
-            lines.append(f"\n{formatted_name}")
-            lines.append("-" * len(formatted_name))
-            
-            for etype in encounter_types:
-                edata = data[etype]
-                exp = edata["expected_exp"]
-                eff = edata.get("efficiency", 0)
-                enc_rate = edata.get("encounter_rate", 0)
-                
-                etype_display = etype.replace("_", " ").title().replace("Fishing ", "Fishing: ")
-                
-                lines.append(f"  {etype_display:25s} | EXP: {exp:7.1f} | Rate: {enc_rate:2d}/16 | Eff: {eff:7.1f}")
-                
-                if verbose:
-                    lines.append(f"    {'Species':15s} | {'Lvl':9s} | {'Prob':6s} | {'EXP':6s} | {'Contrib':7s}")
-                    lines.append(f"    {'-'*55}")
-                    for slot in edata["breakdown"]:
-                        species = slot["species"]
-                        level_str = f"{slot['min_level']}-{slot['max_level']}"
-                        prob = f"{slot['probability']*100:.1f}%"
-                        exp_str = f"{slot['expected_exp']:.1f}"
-                        contrib = f"{slot['contribution']:.2f}"
-                        lines.append(f"    {species:15s} | {level_str:9s} | {prob:6s} | {exp_str:6s} | {contrib:7s}")
-                    lines.append("")
-    
-    return "\n".join(lines)
+# Parsed tables are cached here as JSON, one file per source hash
+SPECIES_CACHE_DIR = "Species_Cache"
 
+# Bump when the parser changes so older caches are ignored
+SPECIES_CACHE_FORMAT = 1
 
-def generate_csv(results: Dict[str, Dict]) -> str:
-    """Generate CSV output."""
-    lines = []
-    lines.append("Location,Version,Encounter Type,Expected EXP,Encounter Rate,Efficiency Score")
-    
-    for key, data in sorted(results.items()):
-        formatted_name = data.get("formatted_name", key)
-        version = data.get("version", "Unknown")
-        
-        for etype in ["grass", "surfing", "rock_smash", "fishing_old_rod", 
-                      "fishing_good_rod", "fishing_super_rod"]:
-            if etype in data:
-                edata = data[etype]
-                exp = edata["expected_exp"]
-                rate = edata.get("encounter_rate", 0)
-                eff = edata.get("efficiency", 0)
-                etype_display = etype.replace("_", " ").title()
-                lines.append(f'"{formatted_name}",{version},{etype_display},{exp:.2f},{rate},{eff:.2f}')
-    
-    return "\n".join(lines)
+SPECIES_EV_FIELDS = ("evYield_HP", "evYield_Attack", "evYield_Defense",
+                     "evYield_Speed", "evYield_SpAttack", "evYield_SpDefense")
 
+# pokeemerald names held items itemCommon/itemRare, pokeruby/pokefirered item1/item2
+SPECIES_ITEM_FIELDS = (("itemCommon", "itemRare"), ("item1", "item2"))
 
-def generate_efficiency_summary(results: Dict[str, Dict]) -> str:
-    """Generate summary sorted by efficiency score."""
-    lines = []
-    lines.append("\n" + "=" * 80)
-    lines.append("TOP GRINDING LOCATIONS BY EFFICIENCY SCORE")
-    lines.append("Efficiency = Expected EXP × (Encounter Rate / 16)")
-    lines.append("=" * 80)
-    
-    for etype in ["grass", "surfing", "rock_smash", "fishing_old_rod", 
-                  "fishing_good_rod", "fishing_super_rod"]:
-        
-        locations = []
-        for key, data in results.items():
-            if etype in data:
-                locations.append({
-                    "name": data.get("formatted_name", key),
-                    "version": data.get("version", "Unknown"),
-                    "exp": data[etype]["expected_exp"],
-                    "rate": data[etype].get("encounter_rate", 0),
-                    "efficiency": data[etype].get("efficiency", 0)
-                })
-        
-        if not locations:
-            continue
-        
-        # Sort by efficiency
-        locations.sort(key=lambda x: x["efficiency"], reverse=True)
-        
-        etype_display = etype.replace("_", " ").title()
-        lines.append(f"\n{etype_display}")
-        lines.append("-" * 60)
-        lines.append(f"  {'#':>2s}  {'Location':30s} {'Ver':8s} {'EXP':>7s} {'Rate':>4s} {'Eff':>8s}")
-        
-        for i, loc in enumerate(locations[:15], 1):
-            lines.append(f"  {i:2d}. {loc['name']:30s} {loc['version']:8s} {loc['exp']:7.1f} {loc['rate']:4d} {loc['efficiency']:8.1f}")
-    
-    return "\n".join(lines)
 
+def parse_species_info(text: str) -> Dict[str, Dict]:
+    """
+    Parse base EXP, growth rate, EV yield and held items out of a pret
+    species_info.h / base_stats.h source.
 
-def clear_screen():
-    """Clear terminal screen."""
+    Entries are the "[SPECIES_X] = { .field = value, ... }" initializers;
+    fields that are missing or not plain literals are skipped.
+
+    Returns:
+        Species table with "base_exp", "growth_rate", "ev_yield" and
+        "held_items" maps, keyed by SPECIES_ constant.
+    """
+    import re
+
+    text = re.sub(r"/\*.*?\*/|//[^\n]*", "", text, flags=re.DOTALL)
+    table = {"base_exp": {}, "growth_rate": {}, "ev_yield": {}, "held_items": {}}
+
+    for match in re.finditer(r"\[\s*(SPECIES_\w+)\s*\]\s*=\s*\{", text):
+        species = match.group(1)
+        # The initializer may nest braces (.abilities = {...})
+        depth, end = 1, match.end()
+        while depth and end < len(text):
+            depth += {"{": 1, "}": -1}.get(text[end], 0)
+            end += 1
+        fields = dict(re.findall(r"\.(\w+)\s*=\s*([\w()]+)", text[match.end():end]))
+
+        if fields.get("expYield", "").isdigit():
+            table["base_exp"][species] = int(fields["expYield"])
+        growth = fields.get("growthRate", "")
+        if growth.startswith("GROWTH_") and growth[7:].lower() in GROWTH_RATE_FUNCTIONS:
+            table["growth_rate"][species] = growth[7:].lower()
+        if all(fields.get(name, "").isdigit() for name in SPECIES_EV_FIELDS):
+            table["ev_yield"][species] = tuple(int(fields[name]) for name in SPECIES_EV_FIELDS)
+        for common_field, rare_field in SPECIES_ITEM_FIELDS:
+            if common_field in fields or rare_field in fields:
+                common, rare = (fields.get(f, "ITEM_NONE") for f in (common_field, rare_field))
+                if common != "ITEM_NONE" or rare != "ITEM_NONE":
+                    table["held_items"][species] = (None if common == "ITEM_NONE" else common,
+                                                    None if rare == "ITEM_NONE" else rare)
+                break
+    return table
+
+
+def import_species_table(source_paths: List[str], cache_dir: str = None) -> Dict[str, Any]:
+    """
+    Parse decomp species sources, reusing the compiled cache when the
+    sources are unchanged.
+
+    The cache is keyed by a SHA-256 over every source's bytes, so editing
+    a file invalidates it. An unwritable cache directory just skips caching.
+
+    Returns:
+        Species table merged over the built-in data, plus "sources",
+        "hash", "imported" (species found in the sources) and "cached".
+
+    Raises:
+        OSError: if a source cannot be read
+    """
+    import hashlib
     import os
-    os.system('cls' if os.name == 'nt' else 'clear')
 
+    digest = hashlib.sha256(f"format{SPECIES_CACHE_FORMAT}".encode())
+    for path in source_paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    digest = digest.hexdigest()
 
-def pause():
-    """Wait for user to press Enter."""
-    input("\nPress Enter to continue...")
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), SPECIES_CACHE_DIR)
+    cache_path = os.path.join(cache_dir, f"species_{digest[:16]}.json")
 
+    parsed, cached = None, False
+    try:
+        with open(cache_path, "r") as f:
+            compiled = json.load(f)
+        if compiled.get("hash") == digest:
+            parsed, cached = compiled["table"], True
+    except (OSError, ValueError, KeyError):
+        pass
 
-def select_json_file() -> str:
-    """Let user select or enter a JSON file path."""
+    if parsed is None:
+        parsed = {"base_exp": {}, "growth_rate": {}, "ev_yield": {}, "held_items": {}}
+        for path in source_paths:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for field, values in parse_species_info(f.read()).items():
+                    parsed[field].update(values)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump({"hash": digest, "sources": source_paths, "table": parsed}, f)
+        except OSError:
+            pass
+
+    table = {field: dict(DEFAULT_SPECIES_TABLE[field]) for field in DEFAULT_SPECIES_TABLE}
+    for field, values in parsed.items():
+        # JSON turns tuples into lists
+        table[field].update((k, tuple(v) if isinstance(v, list) else v) for k, v in values.items())
+    table.update(sources=list(source_paths), hash=digest, cached=cached,
+                 imported=sorted(set().union(*(parsed[field] for field in parsed))))
+    return table
+
+
+def attach_species_table(data: Dict, path: str = None, cache_dir: str = None) -> Dict:
+    """
+    Resolve the encounter file's "species_info" sources into data["species_table"].
+
+    Relative source paths are taken relative to the encounter file.
+    """
     import os
-    
-    # Look for JSON files in the Wild_Encounters folder structure
-    json_files = []
+
+    sources = data.get("species_info")
+    if not sources:
+        return data
+    if isinstance(sources, str):
+        sources = [sources]
+    base_dir = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    sources = [os.path.normpath(os.path.join(base_dir, source)) for source in sources]
+    return dict(data, species_table=import_species_table(sources, cache_dir))
+
+
+def format_unknown_species_report(unknown_species: Dict[str, int]) -> str:
+    """One warning for every species missing from the species table."""
+    names = ", ".join(f"{species.replace('SPECIES_', '')} ({count})"
+                      for species, count in sorted(unknown_species.items()))
+    return (f"Warning: {len(unknown_species)} unknown species used a default base EXP of 50 "
+            f"(slots per species): {names}")
+
+
+# =============================================================================
+# TRAINER BATTLE IMPORT (pret trainer_parties.h / trainers.h, compiled cache)
+# =============================================================================
+# One-off trainer fights are guaranteed EXP on the way to a target level.
+# An encounter file names the decomp sources, relative to the JSON file:
+#   {"trainer_data": {"parties": "../pokeemerald/src/data/trainer_parties.h",
+#                     "trainers": "../pokeemerald/src/data/trainers.h",
+#                     "maps": "../pokeemerald/data/maps"}, ...}
+# "maps" is the decomp's map folder (each map's map.json "id" plus the
+# trainerbattle lines of its scripts.inc) or an inline {map: [trainer, ...]}.
+# Every trainer Pokemon goes through calculate_exp_integer with the trainer
+# bonus, so the Lucky Egg, trainer and traded 1.5x steps are each floored in
+# the game's order. A one-Pokemon run gets the whole EXP of every foe.
+
+# Parsed trainer data is cached next to the species tables, one file per source hash
+TRAINER_CACHE_FORMAT = 1
+
+
+def parse_trainer_parties(text: str) -> Dict[str, List[Tuple[str, int]]]:
+    """
+    Parse party arrays out of a pret trainer_parties.h source.
+
+    Returns:
+        {party symbol: [(species, level), ...]} in party order
+    """
+    import re
+
+    text = re.sub(r"/\*.*?\*/|//[^\n]*", "", text, flags=re.DOTALL)
+    parties = {}
+    for match in re.finditer(r"struct\s+TrainerMon\w*\s+(\w+)\s*\[\s*\]\s*=\s*\{", text):
+        depth, end = 1, match.end()
+        while depth and end < len(text):
+            depth += {"{": 1, "}": -1}.get(text[end], 0)
+            end += 1
+        # Brace-valued fields (.moves = {...}) would split a Pokemon's initializer
+        body = re.sub(r"=\s*\{[^{}]*\}", "= 0", text[match.end():end - 1])
+        party = []
+        for mon in re.finditer(r"\{([^{}]*)\}", body):
+            fields = dict(re.findall(r"\.(\w+)\s*=\s*(\w+)", mon.group(1)))
+            if fields.get("lvl", "").isdigit() and fields.get("species", "").startswith("SPECIES_"):
+                party.append((fields["species"], int(fields["lvl"])))
+        parties[match.group(1)] = party
+    return parties
+
+
+def parse_trainers(text: str, parties: Dict[str, List[Tuple[str, int]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse trainers out of a pret trainers.h source and resolve their parties.
+
+    Both the ".party = {.NoItemDefaultMoves = sParty_X}" and the
+    "NO_ITEM_DEFAULT_MOVES(sParty_X)" spellings work: the first known
+    party symbol in the initializer is the trainer's party.
+
+    Returns:
+        {trainer constant: {"party": [(species, level), ...]}}
+    """
+    import re
+
+    text = re.sub(r"/\*.*?\*/|//[^\n]*", "", text, flags=re.DOTALL)
+    trainers = {}
+    for match in re.finditer(r"\[\s*(TRAINER_\w+)\s*\]\s*=\s*\{", text):
+        depth, end = 1, match.end()
+        while depth and end < len(text):
+            depth += {"{": 1, "}": -1}.get(text[end], 0)
+            end += 1
+        body = text[match.end():end]
+        party = next((parties[name] for name in re.findall(r"\w+", body) if name in parties), None)
+        if party:
+            trainers[match.group(1)] = {"party": party}
+    return trainers
+
+
+def parse_map_trainers(maps_dir: str) -> Dict[str, List[str]]:
+    """
+    Trainers fought on each map of a decomp data/maps folder.
+
+    Returns:
+        {MAP_ constant: [trainer constant, ...]}, each trainer once per map
+    """
+    import os
+    import re
+
+    map_trainers = {}
+    for name in sorted(os.listdir(maps_dir)):
+        map_json = os.path.join(maps_dir, name, "map.json")
+        scripts = os.path.join(maps_dir, name, "scripts.inc")
+        if not (os.path.isfile(map_json) and os.path.isfile(scripts)):
+            continue
+        with open(map_json, "r") as f:
+            map_id = json.load(f).get("id")
+        with open(scripts, "r", encoding="utf-8", errors="replace") as f:
+            found = re.findall(r"^\s*trainerbattle\w*\s+[^\n]*?\b(TRAINER_(?!BATTLE_)\w+)", f.read(), flags=re.M)
+        if map_id and found:
+            map_trainers[map_id] = sorted(set(found))
+    return map_trainers
+
+
+def _trainer_source_files(sources: Dict[str, Any]) -> List[str]:
+    """Every file the parsed trainer data depends on, in a stable order."""
+    import os
+
+    files = [sources["parties"], sources["trainers"]]
+    if isinstance(sources.get("maps"), str):
+        for name in sorted(os.listdir(sources["maps"])):
+            for leaf in ("map.json", "scripts.inc"):
+                path = os.path.join(sources["maps"], name, leaf)
+                if os.path.isfile(path):
+                    files.append(path)
+    return files
+
+
+def import_trainer_data(sources: Dict[str, Any], cache_dir: str = None) -> Dict[str, Any]:
+    """
+    Parse decomp trainer sources, reusing the compiled cache when the
+    sources are unchanged.
+
+    Like import_species_table, the cache is keyed by a SHA-256 over every
+    source's bytes (and an inline map list), and an unwritable cache
+    directory just skips caching.
+
+    Returns:
+        {"trainers": {...}, "maps": {map: [trainer, ...]}, "hash", "cached"}
+
+    Raises:
+        OSError: if a source cannot be read
+    """
+    import hashlib
+    import os
+
+    digest = hashlib.sha256(f"format{TRAINER_CACHE_FORMAT}".encode())
+    for path in _trainer_source_files(sources):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    if not isinstance(sources.get("maps"), str):
+        digest.update(json.dumps(sources.get("maps") or {}, sort_keys=True).encode())
+    digest = digest.hexdigest()
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), SPECIES_CACHE_DIR)
+    cache_path = os.path.join(cache_dir, f"trainers_{digest[:16]}.json")
+
+    try:
+        with open(cache_path, "r") as f:
+            compiled = json.load(f)
+        if compiled.get("hash") == digest:
+            trainers = {name: {"party": [tuple(mon) for mon in entry["party"]]}
+                        for name, entry in compiled["trainers"].items()}
+            return {"trainers": trainers, "maps": compiled["maps"], "hash": digest, "cached": True}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with open(sources["parties"], "r", encoding="utf-8", errors="replace") as f:
+        parties = parse_trainer_parties(f.read())
+    with open(sources["trainers"], "r", encoding="utf-8", errors="replace") as f:
+        trainers = parse_trainers(f.read(), parties)
+    maps = sources.get("maps") or {}
+    if isinstance(maps, str):
+        maps = parse_map_trainers(maps)
+    # Trainers the sources do not define give no EXP
+    maps = {map_name: [t for t in found if t in trainers] for map_name, found in maps.items()}
+    maps = {map_name: found for map_name, found in maps.items() if found}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump({"hash": digest, "trainers": trainers, "maps": maps}, f)
+    except OSError:
+        pass
+    return {"trainers": trainers, "maps": maps, "hash": digest, "cached": False}
+
+
+def attach_trainer_data(data: Dict, path: str = None, cache_dir: str = None) -> Dict:
+    """
+    Resolve the encounter file's "trainer_data" sources into data["trainer_data"].
+
+    Relative source paths are taken relative to the encounter file.
+    """
+    import os
+
+    sources = data.get("trainer_data")
+    # Already imported data carries its source hash
+    if not sources or "hash" in sources:
+        return data
+    base_dir = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    resolved = {key: os.path.normpath(os.path.join(base_dir, sources[key])) for key in ("parties", "trainers")}
+    maps = sources.get("maps")
+    resolved["maps"] = os.path.normpath(os.path.join(base_dir, maps)) if isinstance(maps, str) else maps
+    return dict(data, trainer_data=import_trainer_data(resolved, cache_dir))
+
+
+def calculate_trainer_exp(
+    party: List[Tuple[str, int]],
+    lucky_egg: bool = False,
+    traded: bool = False,
+    species_table: Dict[str, Dict] = None,
+    unknown_species: Dict[str, int] = None
+) -> int:
+    """EXP for beating every Pokemon of one trainer's party."""
+    return sum(calculate_exp_integer(_lookup_base_exp(species, species_table, unknown_species),
+                                     level, lucky_egg, traded, trainer=True)
+               for species, level in party)
+
+
+def calculate_map_trainer_exp(
+    trainer_data: Dict[str, Any],
+    map_name: str,
+    lucky_egg: bool = False,
+    traded: bool = False,
+    species_table: Dict[str, Dict] = None,
+    unknown_species: Dict[str, int] = None
+) -> int:
+    """Guaranteed EXP from every trainer on one map (0 when there are none)."""
+    trainers = trainer_data["trainers"]
+    return sum(calculate_trainer_exp(trainers[name]["party"], lucky_egg, traded, species_table, unknown_species)
+               for name in trainer_data["maps"].get(map_name, []))
+
+
+# =============================================================================
+# GENERATION ENGINES
+# =============================================================================
+# Everything generation-specific lives in one engine dict: the EXP kernel,
+# whether the generation has a Lucky Egg, and a parser that turns a source
+# file (with its generation's slot rate tables) into the pret Gen 3 JSON
+# layout. The growth curves are the same six formulas from Gen 1 through
+# Gen 4, so GROWTH_RATE_FUNCTIONS serves every engine. process_encounters, the scenario
+# cube and every menu downstream then run unchanged on any generation.
+#
+# Gen 3 files are the pret wild_encounters.json exports. Other generations
+# use a flat schema (see README):
+#   {"generation": 2, "game": "Crystal", "maps": [
+#       {"map": "MAP_ROUTE_29", "version": "Crystal",
+#        "grass_morning": {"encounter_rate": 10, "mons": [...]},
+#        "surfing": {...}, "old_rod": {...}, "good_rod": {...}, ...}]}
+# Any table may carry its own "slot_rates" to override the engine default.
+
+def calculate_exp_integer_gen1(base_exp: int, level: int, lucky_egg: bool = False, traded: bool = False) -> int:
+    """
+    Gen 1 wild battle EXP: floor(base_exp * level / 7), traded 1.5x floored.
+    There is no Lucky Egg in Gen 1, so the flag is ignored.
+    """
+    exp = base_exp * level // 7
+    if traded:
+        exp = exp * 3 // 2
+    return exp
+
+
+def calculate_exp_integer_gen2(base_exp: int, level: int, lucky_egg: bool = False, traded: bool = False) -> int:
+    """
+    Gen 2 wild battle EXP. Unlike Gen 3 the traded boost comes first and
+    the Lucky Egg second, each floored on its own.
+    """
+    exp = base_exp * level // 7
+    if traded:
+        exp = exp * 3 // 2
+    if lucky_egg:
+        exp = exp * 3 // 2
+    return exp
+
+
+# Slot rates per table type for the flat schema; None means every listed
+# mon is equally likely (Gen 1 Super Rod lists vary in length)
+GEN1_SLOT_RATES = {
+    "grass": [51, 51, 39, 25, 25, 25, 13, 13, 11, 3],
+    "surfing": [51, 51, 39, 25, 25, 25, 13, 13, 11, 3],
+    "old_rod": [1],
+    "good_rod": [1, 1],
+    "super_rod": None,
+}
+
+GEN2_SLOT_RATES = {
+    "grass": [30, 30, 20, 10, 5, 4, 1],
+    "surfing": [60, 30, 10],
+    "rock_smash": [90, 10],
+    "old_rod": [70, 15, 15],
+    "good_rod": [35, 35, 20, 10],
+    "super_rod": [40, 30, 20, 10],
+}
+
+GEN4_SLOT_RATES = {
+    "grass": LAND_ENCOUNTER_RATES,
+    "surfing": WATER_ENCOUNTER_RATES,
+    "rock_smash": [90, 10],
+    "old_rod": [60, 30, 5, 4, 1],
+    "good_rod": [40, 40, 15, 4, 1],
+    "super_rod": [40, 40, 15, 4, 1],
+}
+
+# Flat schema table -> pret JSON table key
+FLAT_SCHEMA_TABLES = {
+    "grass": "land_mons",
+    "surfing": "water_mons",
+    "rock_smash": "rock_smash_mons",
+}
+FLAT_SCHEMA_RODS = ["old_rod", "good_rod", "super_rod"]
+
+# Gen 2 grass tables change with the time of day; each becomes its own location
+GEN2_TIMES_OF_DAY = ["morning", "day", "night"]
+
+
+def _flat_table_rates(table: Dict, default: Optional[List[int]]) -> List[int]:
+    """Slot rates for one flat-schema table, falling back to uniform."""
+    rates = table.get("slot_rates", default)
+    if rates is None:
+        rates = [1] * len(table.get("mons", []))
+    return list(rates)
+
+
+def _flat_encounter(map_entry: Dict, slot_rates: Dict[str, Any], name: str = None,
+                    map_suffix: str = "", grass_key: str = "grass") -> Dict:
+    """Convert one flat-schema map entry into a pret-layout encounter."""
+    encounter = {
+        "map": map_entry["map"] + map_suffix,
+        "base_label": map_entry.get("base_label", ""),
+        "version": map_entry.get("version") or "Unknown",
+    }
+    if name:
+        encounter["name"] = name
+
+    for table_name, json_key in FLAT_SCHEMA_TABLES.items():
+        table = map_entry.get(grass_key if table_name == "grass" else table_name)
+        if table and table.get("mons"):
+            encounter[json_key] = {
+                "encounter_rate": table.get("encounter_rate", 0),
+                "mons": list(table["mons"]),
+                "slot_rates": _flat_table_rates(table, slot_rates.get(table_name)),
+            }
+
+    # Rods share one fishing table; groups index into the concatenated mons
+    mons, rates, groups, group_rates = [], [], {}, {}
+    for rod in FLAT_SCHEMA_RODS:
+        table = map_entry.get(rod)
+        if not table or not table.get("mons"):
+            continue
+        groups[rod] = list(range(len(mons), len(mons) + len(table["mons"])))
+        group_rates[rod] = table.get("encounter_rate", 0)
+        mons.extend(table["mons"])
+        rates.extend(_flat_table_rates(table, slot_rates.get(rod)))
+    if mons:
+        encounter["fishing_mons"] = {
+            "encounter_rate": max(group_rates.values()),
+            "mons": mons,
+            "slot_rates": rates,
+            "groups": groups,
+            "group_encounter_rates": group_rates,
+        }
+    return encounter
+
+
+def _flat_schema_document(data: Dict, encounters: List[Dict], generation: int) -> Dict:
+    """Wrap converted encounters in the pret JSON top-level layout."""
+    document = {
+        "generation": generation,
+        "game": data.get("game", f"Gen {generation}"),
+        "wild_encounter_groups": [{
+            "label": data.get("label", "gWildMonHeaders"),
+            "for_maps": True,
+            "encounters": encounters,
+        }],
+    }
+    if "species_info" in data:
+        document["species_info"] = data["species_info"]
+    return document
+
+
+def parse_flat_schema(data: Dict, generation: int, slot_rates: Dict[str, Any]) -> Dict:
+    """Parser shared by the Gen 1 and Gen 4 engines."""
+    encounters = [_flat_encounter(entry, slot_rates) for entry in data.get("maps", [])]
+    return _flat_schema_document(data, encounters, generation)
+
+
+def parse_gen2_schema(data: Dict) -> Dict:
+    """
+    Gen 2 parser. A map with grass_morning/grass_day/grass_night tables is
+    split into one location per time of day; everything else is shared.
+    """
+    encounters = []
+    for entry in data.get("maps", []):
+        times = [t for t in GEN2_TIMES_OF_DAY if entry.get(f"grass_{t}")]
+        if not times:
+            encounters.append(_flat_encounter(entry, GEN2_SLOT_RATES))
+            continue
+        base_name = entry.get("name") or format_map_name(entry["map"])
+        for t in times:
+            encounters.append(_flat_encounter(entry, GEN2_SLOT_RATES, f"{base_name} ({t.title()})",
+                                              f"_{t.upper()}", f"grass_{t}"))
+    return _flat_schema_document(data, encounters, 2)
+
+
+def parse_gen3_schema(data: Dict) -> Dict:
+    """Gen 3 files are already in the pret layout."""
+    return dict(data, generation=3)
+
+
+GENERATION_ENGINES = {
+    1: {
+        "generation": 1,
+        "name": "Gen 1 (Red/Blue/Yellow)",
+        "exp_integer": calculate_exp_integer_gen1,
+        "lucky_egg": False,
+        "parse": lambda data: parse_flat_schema(data, 1, GEN1_SLOT_RATES),
+    },
+    2: {
+        "generation": 2,
+        "name": "Gen 2 (Gold/Silver/Crystal)",
+        "exp_integer": calculate_exp_integer_gen2,
+        "lucky_egg": True,
+        "parse": parse_gen2_schema,
+    },
+    3: {
+        "generation": 3,
+        "name": "Gen 3 (Ruby/Sapphire/Emerald/FireRed/LeafGreen)",
+        "exp_integer": calculate_exp_integer,
+        "lucky_egg": True,
+        "parse": parse_gen3_schema,
+    },
+    4: {
+        "generation": 4,
+        "name": "Gen 4 (Diamond/Pearl/Platinum/HeartGold/SoulSilver)",
+        "exp_integer": calculate_exp_integer,
+        "lucky_egg": True,
+        "parse": lambda data: parse_flat_schema(data, 4, GEN4_SLOT_RATES),
+    },
+}
+
+
+def detect_generation(data: Dict, path: str = None) -> int:
+    """
+    Route a file to its engine: an explicit "generation" field wins, then
+    a GenN folder in the path, then the pret Gen 3 layout.
+
+    Raises:
+        ValueError: if the generation cannot be determined or has no engine
+    """
+    import os
+    import re
+
+    generation = data.get("generation")
+    if generation is None and path:
+        for part in reversed(os.path.normpath(os.path.abspath(path)).split(os.sep)):
+            match = re.fullmatch(r"gen(\d+)", part, re.IGNORECASE)
+            if match:
+                generation = int(match.group(1))
+                break
+    if generation is None and "wild_encounter_groups" in data:
+        generation = 3
+    if generation not in GENERATION_ENGINES:
+        raise ValueError(f"No engine for generation {generation!r}")
+    return generation
+
+
+def get_generation_engine(data: Dict) -> Dict[str, Any]:
+    """Engine for an already prepared (or pret Gen 3) data dict."""
+    return GENERATION_ENGINES[data.get("generation", 3)]
+
+
+def lucky_egg_settings(data: Dict) -> Tuple[bool, ...]:
+    """Lucky Egg settings a file's generation has: just off when there is no Lucky Egg (Gen 1)."""
+    return (False, True) if get_generation_engine(data)["lucky_egg"] else (False,)
+
+
+def prepare_encounter_data(data: Dict, path: str = None) -> Dict:
+    """
+    Parse a loaded JSON file with its generation's engine.
+
+    The result is in the pret Gen 3 layout with a "generation" field (a
+    "species_table" / "trainer_data" when the file names decomp sources,
+    and "location_attributes"), ready for process_encounters and
+    build_scenario_cube.
+
+    Raises:
+        ValueError: if no engine handles the file, or an attribute is unknown
+        OSError: if a species, trainer or attribute source cannot be read
+    """
+    data = GENERATION_ENGINES[detect_generation(data, path)]["parse"](data)
+    data = attach_trainer_data(attach_species_table(data, path), path)
+    return attach_location_attributes(data, path)
+
+
+# =============================================================================
+# LOCATION ATTRIBUTES (bitmask index)
+# =============================================================================
+# What it takes to grind at a table: the Safari Zone (no battles there),
+# a field move or rod, post-game access, or the other version of the game.
+# Map-level attributes come from a data file - location_attributes.json next
+# to the encounter file, or the file named by its "location_attributes" key:
+#   {"maps": {"MAP_SAFARI_ZONE_NORTH": ["safari"], ...},
+#    "versions": {"Emerald": {"MAP_DESERT_UNDERPASS": ["post_game"]}}}
+# Encounter types add their own requirement (surfing needs Surf, a rod table
+# its rod), and maps found in only some versions of a combined file are
+# version-exclusive. Each table's attributes are one int; the index keeps one
+# bitset of rows per attribute, so a query is a single OR/AND-NOT over those
+# bitsets no matter how many tables there are.
+LOCATION_ATTRIBUTES = ["safari", "surf", "rock_smash", "old_rod", "good_rod", "super_rod",
+                       "post_game", "version_exclusive"]
+ATTRIBUTE_BITS = {name: 1 << i for i, name in enumerate(LOCATION_ATTRIBUTES)}
+ENCOUNTER_TYPE_ATTRIBUTES = {
+    "surfing": ATTRIBUTE_BITS["surf"],
+    "rock_smash": ATTRIBUTE_BITS["rock_smash"],
+    "fishing_old_rod": ATTRIBUTE_BITS["old_rod"],
+    "fishing_good_rod": ATTRIBUTE_BITS["good_rod"],
+    "fishing_super_rod": ATTRIBUTE_BITS["super_rod"],
+}
+LOCATION_ATTRIBUTES_FILE = "location_attributes.json"
+
+# The Safari Zone has no battles, so it is excluded unless asked for
+DEFAULT_BLOCKED_ATTRIBUTES = ATTRIBUTE_BITS["safari"]
+
+
+def attribute_mask(names: List[str]) -> int:
+    """
+    OR the bits for a list of attribute names.
+
+    Raises:
+        ValueError: for a name not in LOCATION_ATTRIBUTES
+    """
+    mask = 0
+    for name in names:
+        if name not in ATTRIBUTE_BITS:
+            raise ValueError(f"Unknown location attribute '{name}' (expected one of "
+                             f"{', '.join(LOCATION_ATTRIBUTES)})")
+        mask |= ATTRIBUTE_BITS[name]
+    return mask
+
+
+def format_attribute_mask(mask: int) -> str:
+    """Attribute names in a mask, for display."""
+    return ", ".join(name.replace("_", " ") for name in LOCATION_ATTRIBUTES if mask & ATTRIBUTE_BITS[name]) or "none"
+
+
+def attach_location_attributes(data: Dict, path: str = None) -> Dict:
+    """
+    Resolve map attributes into data["location_attributes"].
+
+    The "location_attributes" key may hold the attributes inline or a path
+    relative to the encounter file. The result is {"maps": {map: mask}, "versions": {version: {map: mask}}},
+    with version-exclusive maps of combined files added per version.
+    """
+    import os
+
+    source = data.get("location_attributes")
+    base_dir = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    if isinstance(source, str):
+        with open(os.path.join(base_dir, source), "r") as f:
+            source = json.load(f)
+    elif source is None:
+        default_path = os.path.join(base_dir, LOCATION_ATTRIBUTES_FILE)
+        source = {}
+        if path and os.path.exists(default_path):
+            with open(default_path, "r") as f:
+                source = json.load(f)
+
+    maps = {_normalize_map_name(name): attribute_mask(names)
+            for name, names in source.get("maps", {}).items()}
+    versions = {version: {_normalize_map_name(name): attribute_mask(names) for name, names in entries.items()}
+                for version, entries in source.get("versions", {}).items()}
+
+    # Maps that only some versions of a combined file have
+    detected_game = detect_game_version(data)
+    map_versions = defaultdict(set)
+    for group in data.get("wild_encounter_groups", []):
+        if group.get("for_maps", False):
+            for encounter in group.get("encounters", []):
+                version = encounter.get("version") or get_encounter_version(encounter.get("base_label", ""),
+                                                                              detected_game)
+                map_versions[encounter.get("map", "Unknown")].add(version)
+    all_versions = set().union(*map_versions.values()) if map_versions else set()
+    if len(all_versions) > 1:
+        for map_name, found in map_versions.items():
+            if found != all_versions:
+                for version in found:
+                    entries = versions.setdefault(version, {})
+                    entries[map_name] = entries.get(map_name, 0) | ATTRIBUTE_BITS["version_exclusive"]
+
+    return dict(data, location_attributes={"maps": maps, "versions": versions})
+
+
+def location_attribute_mask(location_attributes: Dict, map_name: str, version: str) -> int:
+    """Attribute mask of one map in one version."""
+    if not location_attributes:
+        return 0
+    return (location_attributes["maps"].get(map_name, 0)
+            | location_attributes["versions"].get(version, {}).get(map_name, 0))
+
+
+ATTRIBUTE_INDEX_MAX_ENTRIES = 8
+_ATTRIBUTE_INDEX_CACHE = OrderedDict()
+
+
+def get_attribute_index(results: Dict[str, Dict]) -> Dict[str, Any]:
+    """
+    Bitmask index of every table in a results dict (memoized per results object).
+
+    Returns:
+        Dict with "rows" ((location_key, etype) in results order), "masks"
+        (each row's attributes), "columns" ({bit: bitset of rows with that
+        attribute}), "all" (bitset of every row) and "views" (memoized
+        filtered views by blocked mask).
+    """
+    cache_key = id(results)
+    if cache_key in _ATTRIBUTE_INDEX_CACHE:
+        _ATTRIBUTE_INDEX_CACHE.move_to_end(cache_key)
+        return _ATTRIBUTE_INDEX_CACHE[cache_key][1]
+
+    rows, masks = [], []
+    columns = {bit: 0 for bit in ATTRIBUTE_BITS.values()}
+    for key, data in results.items():
+        location_mask = data.get("attributes", 0)
+        for etype in ENCOUNTER_TYPES:
+            if etype in data:
+                mask = location_mask | ENCOUNTER_TYPE_ATTRIBUTES.get(etype, 0)
+                row_bit = 1 << len(rows)
+                for bit in columns:
+                    if mask & bit:
+                        columns[bit] |= row_bit
+                rows.append((key, etype))
+                masks.append(mask)
+    index = {"rows": rows, "masks": masks, "columns": columns, "all": (1 << len(rows)) - 1, "views": {}}
+
+    # Holding results keeps its id from being reused while the entry lives
+    _ATTRIBUTE_INDEX_CACHE[cache_key] = (results, index)
+    while len(_ATTRIBUTE_INDEX_CACHE) > ATTRIBUTE_INDEX_MAX_ENTRIES:
+        _ATTRIBUTE_INDEX_CACHE.popitem(last=False)
+    return index
+
+
+def select_tables(results: Dict[str, Dict], blocked: int) -> List[Tuple[str, str]]:
+    """(location_key, etype) of every table with none of the blocked attributes."""
+    index = get_attribute_index(results)
+    excluded = 0
+    for bit, column in index["columns"].items():
+        if blocked & bit:
+            excluded |= column
+    allowed = index["all"] & ~excluded
+    rows = index["rows"]
+    # Walk the set bits of the allowed bitset, lowest row first
+    return [rows[i] for i, bit in enumerate(reversed(bin(allowed)[2:])) if bit == "1"]
+
+
+def filter_results(results: Dict[str, Dict], blocked: int) -> Dict[str, Dict]:
+    """
+    Results view without the tables that have any blocked attribute.
+
+    Locations left without tables are dropped. The view is memoized on the
+    index, and results itself is returned when nothing is blocked.
+    """
+    if not blocked:
+        return results
+    index = get_attribute_index(results)
+    if blocked not in index["views"]:
+        view = {}
+        for key, etype in select_tables(results, blocked):
+            if key not in view:
+                view[key] = {k: v for k, v in results[key].items() if k not in ENCOUNTER_TYPES}
+            view[key][etype] = results[key][etype]
+        index["views"][blocked] = view
+    return index["views"][blocked]
+
+
+# =============================================================================
+# DATA PROCESSING
+# =============================================================================
+
+def format_map_name(map_name: str) -> str:
+    """Convert MAP_ROUTE101 to Route 101, etc."""
+    name = map_name.replace("MAP_", "")
+    if name.startswith("ROUTE_"):
+        # Gen 1/2/4 decomps separate the number: MAP_ROUTE_29
+        return f"Route {name[6:].replace('_', ' ').title()}"
+    if name.startswith("ROUTE"):
+        route_num = name.replace("ROUTE", "")
+        return f"Route {route_num}"
+    name = name.replace("_", " ").title()
+    return name
+
+
+def detect_game_version(data: Dict) -> str:
+    """
+    Auto-detect which game the encounter data is from.
+    
+    Ruby/Sapphire JSON has base_labels like "Route101_Ruby", "Route101_Sapphire"
+    Emerald JSON has base_labels like "gRoute101"
+    FireRed/LeafGreen JSON has base_labels like "sRoute1_FireRed", "sRoute1_LeafGreen"
+    Files from other generations name their game explicitly.
+    """
+    if data.get("game"):
+        return data["game"]
+    for group in data.get("wild_encounter_groups", []):
+        if not group.get("for_maps", False):
+            continue
+        for encounter in group.get("encounters", []):
+            base_label = encounter.get("base_label", "")
+            if "_Ruby" in base_label or "_Sapphire" in base_label:
+                return "RS"  # Ruby/Sapphire combined file
+            elif "_FireRed" in base_label or "_LeafGreen" in base_label:
+                return "FRLG"  # FireRed/LeafGreen combined file
+            elif base_label.startswith("g"):
+                return "Emerald"
+    return "Unknown"
+
+
+def get_encounter_version(base_label: str, detected_game: str) -> str:
+    """Determine which version an encounter entry belongs to from its base_label."""
+    if "_Ruby" in base_label:
+        return "Ruby"
+    elif "_Sapphire" in base_label:
+        return "Sapphire"
+    elif "_FireRed" in base_label:
+        return "FireRed"
+    elif "_LeafGreen" in base_label:
+        return "LeafGreen"
+    elif detected_game == "Emerald":
+        return "Emerald"
+    return "Unknown"
+
+
+def get_encounter_rates_from_json(data: Dict) -> Dict[str, List[int]]:
+    """
+    Extract encounter rates from the JSON header instead of hardcoding.
+    """
+    rates = {}
+    for group in data.get("wild_encounter_groups", []):
+        if not group.get("for_maps", False):
+            continue
+        for field in group.get("fields", []):
+            field_type = field.get("type", "")
+            enc_rates = field.get("encounter_rates", [])
+            if enc_rates:
+                rates[field_type] = enc_rates
+            # Also grab fishing groups if present
+            if "groups" in field:
+                rates["fishing_groups"] = field["groups"]
+    return rates
+
+
+def _table_rates(data: Dict) -> Dict[str, Any]:
+    """Slot rates per table type and the fishing rod groups, from the JSON header or the Gen 3 defaults."""
+    json_rates = get_encounter_rates_from_json(data)
+    return {
+        "land_mons": json_rates.get("land_mons", LAND_ENCOUNTER_RATES),
+        "water_mons": json_rates.get("water_mons", WATER_ENCOUNTER_RATES),
+        "rock_smash_mons": json_rates.get("rock_smash_mons", ROCK_SMASH_ENCOUNTER_RATES),
+        "fishing_mons": json_rates.get("fishing_mons", FISHING_ENCOUNTER_RATES),
+        "fishing_groups": json_rates.get("fishing_groups", FISHING_GROUPS),
+    }
+
+
+def _iter_map_encounters(data: Dict, game_filter: str = None) -> Iterator[Tuple[Dict, str, str]]:
+    """Yield (encounter, map_name, version) for every map encounter the version filter keeps."""
+    detected_game = detect_game_version(data)
+    for group in data.get("wild_encounter_groups", []):
+        if not group.get("for_maps", False):
+            continue
+        for encounter in group.get("encounters", []):
+            map_name = encounter.get("map", "Unknown")
+            version = encounter.get("version") or get_encounter_version(encounter.get("base_label", ""),
+                                                                        detected_game)
+            if not game_filter or version == game_filter:
+                yield encounter, map_name, version
+
+
+def _iter_encounter_tables(
+    encounter: Dict,
+    table_rates: Dict[str, Any]
+) -> Iterator[Tuple[str, List[Dict], List[int], Optional[List[int]], int]]:
+    """
+    Yield (etype, mons, slot_rates, indices, encounter_rate) for every table of one map encounter.
+
+    Fishing is split into one table per rod; indices pick that rod's slots.
+    """
+    encounter_types = [
+        ("land_mons", "grass"),
+        ("water_mons", "surfing"),
+        ("rock_smash_mons", "rock_smash"),
+    ]
+    for data_key, result_key in encounter_types:
+        if data_key in encounter:
+            mon_data = encounter[data_key]
+            mons = mon_data.get("mons", [])
+            if mons:
+                # Tables may carry their own slot rates (other generations)
+                yield (result_key, mons, mon_data.get("slot_rates", table_rates[data_key]), None,
+                       mon_data.get("encounter_rate", 0))
+
+    if "fishing_mons" in encounter:
+        fish_data = encounter["fishing_mons"]
+        mons = fish_data.get("mons", [])
+        # Per-rod encounter rates (flat schema), else the shared one
+        group_rates = fish_data.get("group_encounter_rates", {})
+        for rod_name, rod_indices in fish_data.get("groups", table_rates["fishing_groups"]).items():
+            if rod_indices and len(mons) > max(rod_indices):
+                yield (f"fishing_{rod_name}", mons, fish_data.get("slot_rates", table_rates["fishing_mons"]),
+                       rod_indices, group_rates.get(rod_name, fish_data.get("encounter_rate", 0)))
+
+
+def process_encounters(
+    data: Dict,
+    lucky_egg: bool = False,
+    game_filter: str = None,
+    traded: bool = False,
+    unknown_species: Dict[str, int] = None,
+    maps: Set[str] = None
+) -> Dict[str, Dict]:
+    """
+    Process wild encounter data and calculate expected EXP for each location.
+    
+    Args:
+        data: The loaded JSON data
+        lucky_egg: Whether to apply Lucky Egg bonus
+        game_filter: Optional filter - "Ruby", "Sapphire", "Emerald", or None for all
+        traded: Whether the Pokemon gaining EXP is traded (1.5x bonus)
+        unknown_species: Optional dict that collects {species: slot count}
+            for species missing from the species table, for the caller to
+            report (see format_unknown_species_report).
+        maps: Optional set of map names; other maps are skipped
+    """
+    results = defaultdict(lambda: defaultdict(dict))
+    
+    # Non-Gen 3 files arrive normalized to this layout by prepare_encounter_data
+    engine = get_generation_engine(data)
+    exp_formula = engine["exp_integer"]
+    species_table = data.get("species_table")
+    location_attributes = data.get("location_attributes")
+    trainer_data = data.get("trainer_data")
+    if unknown_species is None:
+        unknown_species = {}
+    
+    # Use rates from JSON if available, otherwise fall back to hardcoded
+    table_rates = _table_rates(data)
+    
+    for encounter, map_name, version in _iter_map_encounters(data, game_filter):
+        if maps is not None and map_name not in maps:
+            continue
+        
+        location_key = f"{map_name}_{version}"
+        formatted_name = encounter.get("name") or format_map_name(map_name)
+        
+        results[location_key]["map_name"] = map_name
+        results[location_key]["formatted_name"] = formatted_name
+        results[location_key]["version"] = version
+        results[location_key]["generation"] = engine["generation"]
+        results[location_key]["attributes"] = location_attribute_mask(location_attributes, map_name, version)
+        if species_table:
+            results[location_key]["species_table"] = species_table
+        if trainer_data and map_name in trainer_data["maps"]:
+            results[location_key]["trainers"] = trainer_data["maps"][map_name]
+            results[location_key]["trainer_exp"] = calculate_map_trainer_exp(
+                trainer_data, map_name, lucky_egg, traded, species_table, unknown_species
+            )
+        
+        # Process each encounter type (fishing separate by rod)
+        for result_key, mons, rates, indices, enc_rate in _iter_encounter_tables(encounter, table_rates):
+            exp, breakdown, evs, items, exp_exact = calculate_encounter_type_metrics(
+                mons, rates, indices, lucky_egg, traded,
+                exp_formula, species_table, unknown_species
+            )
+            efficiency = calculate_efficiency_score(exp_exact, enc_rate)
+            results[location_key][result_key] = {
+                "expected_exp": exp,
+                "exp_exact": exp_exact,
+                "breakdown": breakdown,
+                "encounter_rate": enc_rate,
+                "efficiency": efficiency,
+                "evs": evs,
+                "items": items
+            }
+    
+    return dict(results)
+
+
+# =============================================================================
+# SCENARIO CUBE (every modifier combination, computed once)
+# =============================================================================
+# Modifier combinations as (lucky_egg, traded). The version dimension is not
+# part of this list: every combination is computed over all versions and a
+# version filter is just a row selection when a cell is read.
+SCENARIO_MODIFIERS = [(False, False), (True, False), (False, True), (True, True)]
+
+
+def _flatten_scenario(results: Dict[str, Dict]) -> Tuple[Dict, List, List, List, List, List, List, Dict]:
+    """
+    Flatten one process_encounters result into cube-friendly pieces.
+
+    Returns:
+        Tuple of (locations, tables, slots, table_exp, slot_exp, table_metrics,
+        table_exact, trainer_exp) where tables are (location_key, etype,
+        encounter_rate, first_slot, end_slot), slots are (species, min_level,
+        max_level, rate, probability), table_metrics are (evs, items), which no
+        modifier changes, table_exact holds each table's exact expected EXP
+        and trainer_exp each location's guaranteed trainer EXP.
+    """
+    locations, tables, slots, table_exp, slot_exp, table_metrics, table_exact = {}, [], [], [], [], [], []
+    trainer_exp = {}
+    for key, data in results.items():
+        locations[key] = {
+            "map_name": data.get("map_name", key),
+            "formatted_name": data.get("formatted_name", key),
+            "version": data.get("version", "Unknown"),
+            "generation": data.get("generation", 3),
+            "attributes": data.get("attributes", 0),
+        }
+        if "species_table" in data:
+            locations[key]["species_table"] = data["species_table"]
+        if "trainers" in data:
+            locations[key]["trainers"] = data["trainers"]
+            trainer_exp[key] = data["trainer_exp"]
+        for etype in ENCOUNTER_TYPES:
+            if etype not in data:
+                continue
+            edata = data[etype]
+            first_slot = len(slots)
+            for slot in edata["breakdown"]:
+                slots.append((slot["species"], slot["min_level"], slot["max_level"], slot["rate"],
+                              slot["probability"]))
+                slot_exp.append(slot["expected_exp"])
+            tables.append((key, etype, edata.get("encounter_rate", 0), first_slot, len(slots)))
+            table_exp.append(edata["expected_exp"])
+            table_metrics.append((edata["evs"], edata["items"]))
+            table_exact.append(edata["exp_exact"])
+    return locations, tables, slots, table_exp, slot_exp, table_metrics, table_exact, trainer_exp
+
+
+def _scenario_worker(args: Tuple[Dict, bool, bool]) -> Tuple:
+    """Process pool entry point: compute one (lucky_egg, traded) combination."""
+    data, lucky_egg, traded = args
+    unknown_species = {}
+    results = process_encounters(data, lucky_egg, None, traded, unknown_species)
+    return _flatten_scenario(results) + (unknown_species,)
+
+
+def build_scenario_cube(data: Dict, workers: int = None) -> Dict[str, Any]:
+    """
+    Precompute results for every version x Lucky Egg x traded combination.
+
+    Each modifier combination is processed once over all versions, in
+    parallel across CPU cores when workers > 1. Slot metadata is stored
+    once; per-combination values are packed into array('d') buffers.
+    """
+    import os
+    from array import array
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # A generation without a Lucky Egg only gets the Lucky Egg off cells
+    eggs = lucky_egg_settings(data)
+    jobs = [(data, lucky_egg, traded) for lucky_egg, traded in SCENARIO_MODIFIERS if lucky_egg in eggs]
+
+    flat = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                flat = list(pool.map(_scenario_worker, jobs))
+        except (OSError, RuntimeError):
+            # No process support (restricted sandboxes, frozen apps): fall back
+            flat = None
+    if flat is None:
+        flat = [_scenario_worker(job) for job in jobs]
+
+    locations, tables, slots = flat[0][0], flat[0][1], flat[0][2]
+    return {
+        "modifiers": [(lucky_egg, traded) for _, lucky_egg, traded in jobs],
+        "lucky_eggs": eggs,
+        "versions": sorted({loc["version"] for loc in locations.values()}),
+        "locations": locations,
+        "tables": tables,
+        "slots": slots,
+        "table_metrics": flat[0][5],
+        "table_exp": [array("d", part[3]) for part in flat],
+        "slot_exp": [array("d", part[4]) for part in flat],
+        "table_exact": [part[6] for part in flat],
+        "trainer_exp": [part[7] for part in flat],
+        # Every combination sees the same slots; report them once
+        "unknown_species": flat[0][8],
+        "cells": {},
+    }
+
+
+def get_scenario_results(
+    cube: Dict[str, Any],
+    game_filter: str = None,
+    lucky_egg: bool = False,
+    traded: bool = False
+) -> Dict[str, Dict]:
+    """
+    Read one cell of the scenario cube as a process_encounters-style dict.
+
+    Cells are materialized on first access and memoized on the cube, so
+    repeated reads (e.g. toggling Lucky Egg back and forth) are free.
+
+    Raises:
+        ValueError: for Lucky Egg on a generation that has none
+    """
+    cell_key = (game_filter, lucky_egg, traded)
+    if cell_key in cube["cells"]:
+        return cube["cells"][cell_key]
+    if (lucky_egg, traded) not in cube["modifiers"]:
+        raise ValueError("This generation has no Lucky Egg")
+
+    m = cube["modifiers"].index((lucky_egg, traded))
+    table_exp, slot_exp, table_exact = cube["table_exp"][m], cube["slot_exp"][m], cube["table_exact"][m]
+    slots = cube["slots"]
+
+    results = {}
+    for key, location in cube["locations"].items():
+        if not game_filter or location["version"] == game_filter:
+            results[key] = dict(location)
+            if key in cube["trainer_exp"][m]:
+                results[key]["trainer_exp"] = cube["trainer_exp"][m][key]
+
+    for t, (key, etype, enc_rate, first_slot, end_slot) in enumerate(cube["tables"]):
+        if key not in results:
+            continue
+
+        breakdown = []
+        for i in range(first_slot, end_slot):
+            species, min_level, max_level, rate, prob = slots[i]
+            breakdown.append({
+                "slot": i - first_slot,
+                "species": species,
+                "min_level": min_level,
+                "max_level": max_level,
+                "rate": rate,
+                "probability": prob,
+                "expected_exp": slot_exp[i],
+                "contribution": slot_exp[i] * prob
+            })
+        exp = table_exp[t]
+        evs, items = cube["table_metrics"][t]
+        results[key][etype] = {
+            "expected_exp": exp,
+            "exp_exact": table_exact[t],
+            "breakdown": breakdown,
+            "encounter_rate": enc_rate,
+            "efficiency": calculate_efficiency_score(table_exact[t], enc_rate),
+            "evs": dict(evs),
+            "items": dict(items)
+        }
+
+    cube["cells"][cell_key] = results
+    return results
+
+
+# =============================================================================
+# REPEL / LEAD LEVEL MODELING
+# =============================================================================
+# With a Repel active, Gen 3 rolls the slot and level as usual and then
+# cancels the encounter if the wild level is below the lead's level. The
+# surviving (slot, level) pairs are renormalized and the encounter rate
+# shrinks by the pass probability.
+MAX_LEVEL = 100
+
+# Fishing encounters skip the Repel check entirely
+REPEL_ENCOUNTER_TYPES = ("grass", "surfing", "rock_smash")
+
+# (etype, slot tuple, lucky_egg, traded, generation) -> (exp_by_lead, pass_by_lead, masses),
+# where slots are (base_exp, min_level, max_level, rate).
+# Keyed on table content so identical tables (Ruby/Sapphire, repeated cave
+# floors) are computed once.
+_REPEL_TABLE_CACHE = {}
+
+
+def _repel_table(etype: str, slots: Tuple, lucky_egg: bool, traded: bool,
+                 generation: int = 3) -> Tuple[Any, Any, Tuple[List[int], List[int], int]]:
+    """
+    Expected EXP per battle and pass probability for lead levels 0..100.
+
+    Every (slot, level) pair adds its mass at its level; a suffix sum over
+    levels then gives, for each lead level L, the mass and EXP of
+    everything at level >= L in a single pass. Masses are integers over
+    one common denominator (rate sum times the least common multiple of
+    the level-range sizes), as in calculate_encounter_type_metrics, so
+    masses = (exp_mass, pass_mass, denominator) gives the exact values.
+    """
+    from array import array
+
+    cache_key = (etype, slots, lucky_egg, traded, generation)
+    cached = _REPEL_TABLE_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    exp_formula = GENERATION_ENGINES[generation]["exp_integer"]
+    common_levels = 1
+    for _, min_level, max_level, _ in slots:
+        num_levels = max_level - min_level + 1
+        common_levels *= num_levels // math.gcd(common_levels, num_levels)
+
+    exp_mass = [0] * (MAX_LEVEL + 2)
+    pass_mass = [0] * (MAX_LEVEL + 2)
+    repel_applies = etype in REPEL_ENCOUNTER_TYPES
+    for base_exp, min_level, max_level, rate in slots:
+        weight = rate * (common_levels // (max_level - min_level + 1))
+        for level in range(min_level, max_level + 1):
+            # Unaffected tables put all their mass above every possible lead
+            cutoff = level if repel_applies else MAX_LEVEL
+            exp_mass[cutoff] += weight * exp_formula(base_exp, level, lucky_egg, traded)
+            pass_mass[cutoff] += weight
+
+    denominator = sum(slot[3] for slot in slots) * common_levels
+    exp_by_lead = array("d", bytes(8 * (MAX_LEVEL + 1)))
+    pass_by_lead = array("d", bytes(8 * (MAX_LEVEL + 1)))
+    exp_total = pass_total = 0
+    for lead in range(MAX_LEVEL, -1, -1):
+        exp_total += exp_mass[lead]
+        pass_total += pass_mass[lead]
+        exp_mass[lead], pass_mass[lead] = exp_total, pass_total
+        # Integer true division rounds correctly
+        pass_by_lead[lead] = pass_total / denominator if denominator else 0.0
+        exp_by_lead[lead] = exp_total / pass_total if pass_total > 0 else 0.0
+
+    entry = (exp_by_lead, pass_by_lead, (exp_mass, pass_mass, denominator))
+    _REPEL_TABLE_CACHE[cache_key] = entry
+    return entry
+
+
+def build_repel_tables(
+    results: Dict[str, Dict],
+    lucky_egg: bool = False,
+    traded: bool = False
+) -> Dict[Tuple[str, str], Tuple[Any, Any, Tuple[List[int], List[int], int]]]:
+    """
+    Precompute Repel-aware values for every table at every lead level.
+
+    Returns:
+        {(location_key, etype): (exp_by_lead, pass_by_lead, masses)} where
+        the first two are array('d') indexed by lead level (0..100) and
+        masses holds the exact integer suffix sums (see _repel_table).
+        Index 0 means no Repel.
+    """
+    tables = {}
+    for key, data in results.items():
+        base_exp_table = (data.get("species_table") or DEFAULT_SPECIES_TABLE)["base_exp"]
+        for etype in ENCOUNTER_TYPES:
+            if etype in data:
+                slots = tuple((base_exp_table.get(f"SPECIES_{slot['species']}", 50),
+                               slot["min_level"], slot["max_level"], slot["rate"])
+                              for slot in data[etype]["breakdown"])
+                tables[(key, etype)] = _repel_table(etype, slots, lucky_egg, traded, data.get("generation", 3))
+    return tables
+
+
+def apply_lead_level(
+    results: Dict[str, Dict],
+    lead_level: int,
+    lucky_egg: bool = False,
+    traded: bool = False
+) -> Dict[str, Dict]:
+    """
+    Return a results view with a Repel active and the given lead level.
+
+    expected_exp is per battle that actually happens (exp_exact keeps it as
+    a Fraction); effective_rate is the encounter rate times the Repel pass
+    probability, and efficiency uses it. Tables the Repel blocks completely are dropped. Tables where nothing is
+    blocked, and fishing tables (never Repel-checked), keep their original
+    values untouched.
+    """
+    if not lead_level:
+        return results
+
+    repel_tables = build_repel_tables(results, lucky_egg, traded)
+    lead_level = min(lead_level, MAX_LEVEL)
+    view = {}
+    for key, data in results.items():
+        location = {k: v for k, v in data.items() if k not in ENCOUNTER_TYPES}
+        exp_formula = GENERATION_ENGINES[data.get("generation", 3)]["exp_integer"]
+        species_table = data.get("species_table")
+        base_exp_table = (species_table or DEFAULT_SPECIES_TABLE)["base_exp"]
+        for etype in ENCOUNTER_TYPES:
+            if etype not in data:
+                continue
+            edata = data[etype]
+            enc_rate = edata.get("encounter_rate", 0)
+            if (etype not in REPEL_ENCOUNTER_TYPES
+                    or all(slot["min_level"] >= lead_level for slot in edata["breakdown"])):
+                location[etype] = dict(edata, effective_rate=enc_rate, repel_pass=1.0)
+                continue
+
+            exp_by_lead, pass_by_lead, (exp_mass, pass_mass, denominator) = repel_tables[(key, etype)]
+            pass_prob = pass_by_lead[lead_level]
+            if pass_mass[lead_level] <= 0:
+                continue
+
+            breakdown = []
+            for slot in edata["breakdown"]:
+                base_exp = base_exp_table.get(f"SPECIES_{slot['species']}", 50)
+                passing = range(max(lead_level, slot["min_level"]), slot["max_level"] + 1)
+                if not passing:
+                    continue
+                slot_prob = slot["probability"] * len(passing) / (slot["max_level"] - slot["min_level"] + 1)
+                slot_exp = sum(exp_formula(base_exp, level, lucky_egg, traded)
+                               for level in passing) / len(passing)
+                breakdown.append(dict(slot, min_level=passing[0], probability=slot_prob / pass_prob,
+                                      expected_exp=slot_exp, contribution=slot_exp * slot_prob / pass_prob))
+
+            effective_rate = enc_rate * pass_prob
+            evs, items = summarize_slot_metrics(breakdown, species_table)
+            # EXP per rolled encounter is exp_mass / denominator
+            location[etype] = {
+                "expected_exp": exp_by_lead[lead_level],
+                "exp_exact": Fraction(exp_mass[lead_level], pass_mass[lead_level]),
+                "breakdown": breakdown,
+                "encounter_rate": enc_rate,
+                "effective_rate": effective_rate,
+                "repel_pass": pass_prob,
+                "efficiency": calculate_efficiency_score(Fraction(exp_mass[lead_level], denominator), enc_rate),
+                "evs": evs,
+                "items": items
+            }
+        view[key] = location
+    return view
+
+
+# =============================================================================
+# LEAD ABILITY ENCOUNTER MODIFIERS (Emerald)
+# =============================================================================
+# Emerald checks the lead Pokemon's ability while generating a wild mon:
+#   Magnet Pull / Static  - 50%: pick uniformly among Steel / Electric slots
+#                           (land and water only; no effect if none or all match)
+#   Intimidate / Keen Eye - 50%: cancel encounters at level <= lead level - 5
+#                           (land, water, rock smash; needs lead level > 5)
+#   Hustle / Pressure / Vital Spirit - 50%: force the slot's max level,
+#                           otherwise roll with the bottom level counted twice
+# Ruby/Sapphire and FireRed/LeafGreen ignore all of these.
+LEAD_ABILITIES = ["NONE", "MAGNET_PULL", "STATIC", "INTIMIDATE", "KEEN_EYE",
+                  "HUSTLE", "PRESSURE", "VITAL_SPIRIT"]
+
+# Abilities that share an effect are computed once
+ABILITY_EFFECTS = {
+    "NONE": "none",
+    "MAGNET_PULL": "steel",
+    "STATIC": "electric",
+    "INTIMIDATE": "keen_eye",
+    "KEEN_EYE": "keen_eye",
+    "HUSTLE": "max_level",
+    "PRESSURE": "max_level",
+    "VITAL_SPIRIT": "max_level",
+}
+
+ABILITY_VERSIONS = ("Emerald",)
+TYPE_ATTRACT_ENCOUNTER_TYPES = ("grass", "surfing")
+KEEN_EYE_ENCOUNTER_TYPES = ("grass", "surfing", "rock_smash")
+
+STEEL_SPECIES = frozenset([
+    "SPECIES_MAGNEMITE", "SPECIES_MAGNETON", "SPECIES_FORRETRESS", "SPECIES_STEELIX",
+    "SPECIES_SCIZOR", "SPECIES_SKARMORY", "SPECIES_MAWILE", "SPECIES_ARON", "SPECIES_LAIRON",
+    "SPECIES_AGGRON", "SPECIES_REGISTEEL", "SPECIES_BELDUM", "SPECIES_METANG",
+    "SPECIES_METAGROSS", "SPECIES_JIRACHI",
+])
+
+ELECTRIC_SPECIES = frozenset([
+    "SPECIES_PIKACHU", "SPECIES_RAICHU", "SPECIES_MAGNEMITE", "SPECIES_MAGNETON",
+    "SPECIES_VOLTORB", "SPECIES_ELECTRODE", "SPECIES_ELECTABUZZ", "SPECIES_JOLTEON",
+    "SPECIES_ZAPDOS", "SPECIES_CHINCHOU", "SPECIES_LANTURN", "SPECIES_PICHU",
+    "SPECIES_MAREEP", "SPECIES_FLAAFFY", "SPECIES_AMPHAROS", "SPECIES_ELEKID",
+    "SPECIES_RAIKOU", "SPECIES_ELECTRIKE", "SPECIES_MANECTRIC", "SPECIES_PLUSLE",
+    "SPECIES_MINUN",
+])
+
+
+def _level_distribution(min_level: int, max_level: int, max_level_bias: bool) -> List[Tuple[int, int]]:
+    """Level weights for one slot in units of 1 / (4 * range size), optionally with Hustle-style bias."""
+    n = max_level - min_level + 1
+    if not max_level_bias or n == 1:
+        return [(level, 4) for level in range(min_level, max_level + 1)]
+    # 50%: max level. 50%: rand % n, then rand-- unless 0 (min doubled, max never)
+    dist = [(min_level, 4)]
+    dist += [(level, 2) for level in range(min_level + 1, max_level)]
+    dist.append((max_level, 2 * n))
+    return dist
+
+
+def _evaluate_lead_effect(
+    etype: str,
+    slots: List[Tuple[str, int, int, int, List[int]]],
+    effect: str,
+    lead_level: int,
+    repel: bool
+) -> Optional[Tuple[Fraction, Fraction, List[Tuple[float, float, int]]]]:
+    """
+    Evaluate one table under one ability effect (plus optional Repel).
+
+    slots are (species, min_level, max_level, rate, exp_by_level). Masses
+    are integers over one common denominator, as in
+    calculate_encounter_type_metrics, so the totals are exact.
+
+    Returns:
+        (exp_exact, pass_probability, [(probability, slot_exp, min_level_seen,
+        exp_second_moment)]) with the first two as Fractions, probability the
+        slot's share of the battles and exp_second_moment the mean squared
+        EXP over the slot's (possibly biased) level distribution, or None if
+        every encounter is cancelled.
+    """
+    weights = [slot[3] for slot in slots]
+    weight_total = sum(weights)
+    if effect in ("steel", "electric") and etype in TYPE_ATTRACT_ENCOUNTER_TYPES:
+        typed = STEEL_SPECIES if effect == "steel" else ELECTRIC_SPECIES
+        matching = [i for i, slot in enumerate(slots) if f"SPECIES_{slot[0]}" in typed]
+        if 0 < len(matching) < len(slots):
+            # rate / (2 R) for every slot plus 1 / (2 m) for the m matching ones
+            count = len(matching)
+            weights = [w * count for w in weights]
+            for i in matching:
+                weights[i] += weight_total
+            weight_total *= 2 * count
+
+    repel_cut = lead_level if repel and etype in REPEL_ENCOUNTER_TYPES else 0
+    keen_cut = (lead_level - 5 if effect == "keen_eye" and etype in KEEN_EYE_ENCOUNTER_TYPES
+                and lead_level > 5 else 0)
+
+    common_levels = 1
+    for _, min_level, max_level, _, _ in slots:
+        num_levels = 4 * (max_level - min_level + 1)
+        common_levels *= num_levels // math.gcd(common_levels, num_levels)
+
+    total_mass = total_exp = 0
+    masses = []
+    for weight, (species, min_level, max_level, rate, exp_by_level) in zip(weights, slots):
+        slot_mass = slot_exp = slot_square = 0
+        lowest = None
+        for level, level_weight in _level_distribution(min_level, max_level, effect == "max_level"):
+            if level < repel_cut:
+                continue
+            # Every weight is even, so halving for Keen Eye stays exact
+            mass = level_weight // 2 if level <= keen_cut else level_weight
+            exp = exp_by_level[level - min_level]
+            slot_mass += mass
+            slot_exp += mass * exp
+            slot_square += mass * exp * exp
+            if lowest is None:
+                lowest = level
+        scale = weight * (common_levels // (4 * (max_level - min_level + 1)))
+        if slot_mass:
+            masses.append((scale * slot_mass, slot_exp / slot_mass, lowest, slot_square / slot_mass))
+        else:
+            masses.append((0, 0.0, None, 0.0))
+        total_mass += scale * slot_mass
+        total_exp += scale * slot_exp
+
+    if total_mass <= 0:
+        return None
+    per_slot = [(mass / total_mass, slot_exp, lowest, second_moment)
+                for mass, slot_exp, lowest, second_moment in masses]
+    return (Fraction(total_exp, total_mass), Fraction(total_mass, weight_total * common_levels),
+            per_slot)
+
+
+def build_lead_ability_views(
+    results: Dict[str, Dict],
+    lead_level: int = 0,
+    repel: bool = False,
+    abilities: List[str] = None,
+    lucky_egg: bool = False,
+    traded: bool = False
+) -> Dict[str, Dict[str, Dict]]:
+    """
+    Results views for several lead abilities in one batched pass.
+
+    Each table's per-level EXP is computed once and every distinct ability
+    effect is then applied to it. Views have the same shape as
+    apply_lead_level (effective_rate, repel_pass = share of rolled
+    encounters that turn into battles).
+
+    Returns:
+        {ability: results_view}
+    """
+    if abilities is None:
+        abilities = LEAD_ABILITIES
+    effects = sorted({ABILITY_EFFECTS[ability] for ability in abilities})
+    views = {effect: {} for effect in effects}
+
+    for key, data in results.items():
+        location = {k: v for k, v in data.items() if k not in ENCOUNTER_TYPES}
+        ability_applies = data.get("version") in ABILITY_VERSIONS
+        exp_formula = GENERATION_ENGINES[data.get("generation", 3)]["exp_integer"]
+        species_table = data.get("species_table")
+        base_exp_table = (species_table or DEFAULT_SPECIES_TABLE)["base_exp"]
+        for effect in effects:
+            views[effect][key] = dict(location)
+
+        for etype in ENCOUNTER_TYPES:
+            if etype not in data:
+                continue
+            edata = data[etype]
+            enc_rate = edata.get("encounter_rate", 0)
+            slots = []
+            for slot in edata["breakdown"]:
+                base_exp = base_exp_table.get(f"SPECIES_{slot['species']}", 50)
+                exp_by_level = [exp_formula(base_exp, level, lucky_egg, traded)
+                                for level in range(slot["min_level"], slot["max_level"] + 1)]
+                slots.append((slot["species"], slot["min_level"], slot["max_level"],
+                              slot["rate"], exp_by_level))
+
+            evaluated = {}
+            for effect in effects:
+                applied = effect if ability_applies else "none"
+                if applied not in evaluated:
+                    evaluated[applied] = _evaluate_lead_effect(etype, slots, applied, lead_level, repel)
+                outcome = evaluated[applied]
+                if outcome is None:
+                    continue
+                if applied == "none" and outcome[1] == 1:
+                    # Nothing changes: keep the exact original numbers
+                    views[effect][key][etype] = dict(edata, effective_rate=enc_rate, repel_pass=1.0)
+                    continue
+
+                exp_exact, pass_exact, per_slot = outcome
+                breakdown = []
+                for slot, (prob, slot_exp, lowest, second_moment) in zip(edata["breakdown"], per_slot):
+                    if prob <= 0:
+                        continue
+                    # Hustle and Keen Eye skew the levels, so the spread travels with the slot
+                    breakdown.append(dict(slot, min_level=lowest, probability=prob,
+                                          expected_exp=slot_exp, contribution=slot_exp * prob,
+                                          exp_second_moment=second_moment))
+                pass_prob = float(pass_exact)
+                effective_rate = enc_rate * pass_prob
+                evs, items = summarize_slot_metrics(breakdown, species_table)
+                views[effect][key][etype] = {
+                    "expected_exp": float(exp_exact),
+                    "exp_exact": exp_exact,
+                    "breakdown": breakdown,
+                    "encounter_rate": enc_rate,
+                    "effective_rate": effective_rate,
+                    "repel_pass": pass_prob,
+                    # EXP per rolled encounter is exp_exact * pass_exact
+                    "efficiency": calculate_efficiency_score(exp_exact * pass_exact, enc_rate),
+                    "evs": evs,
+                    "items": items
+                }
+
+    return {ability: views[ABILITY_EFFECTS[ability]] for ability in abilities}
+
+
+def apply_lead(
+    results: Dict[str, Dict],
+    lead_level: int = 0,
+    repel: bool = False,
+    ability: str = "NONE",
+    lucky_egg: bool = False,
+    traded: bool = False
+) -> Dict[str, Dict]:
+    """
+    Results view for one lead setup (Repel fast path when no ability).
+
+    Views are memoized per results snapshot, so menus asking for the same
+    setup get the same object back (and its cached renderings).
+    """
+    if ability == "NONE" and not repel:
+        return results
+    key = (id(results), lead_level, repel, ability, lucky_egg, traded)
+    entry = _LEAD_VIEW_CACHE.get(key)
+    if entry is not None and entry[0] is results:
+        _LEAD_VIEW_CACHE.move_to_end(key)
+        return entry[1]
+
+    if ability == "NONE":
+        view = apply_lead_level(results, lead_level, lucky_egg, traded)
+    else:
+        view = build_lead_ability_views(results, lead_level, repel, [ability], lucky_egg, traded)[ability]
+    _LEAD_VIEW_CACHE[key] = (results, view)
+    while len(_LEAD_VIEW_CACHE) > LEAD_VIEW_CACHE_MAX_ENTRIES:
+        _LEAD_VIEW_CACHE.popitem(last=False)
+    return view
+
+
+# (id(results), lead_level, repel, ability, lucky_egg, traded) -> (results, view);
+# holding results keeps its id() from being reused while the entry lives
+LEAD_VIEW_CACHE_MAX_ENTRIES = 8
+_LEAD_VIEW_CACHE = OrderedDict()
+
+
+# =============================================================================
+# GEN 3 RNG EMULATION
+# =============================================================================
+# Gen 3 uses a 32-bit LCG: seed = seed * 0x41C64E6D + 0x6073, and Random()
+# returns the upper 16 bits of the new seed. A "frame" here is the RNG state
+# right before wild generation starts: the first Random() picks the slot
+# (rand % rate total against the cumulative slot rates) and the second picks
+# the level (min + rand % range).
+LCG_MULTIPLIER = 0x41C64E6D
+LCG_INCREMENT = 0x6073
+LCG_MASK = 0xFFFFFFFF
+
+# Encounter type -> (JSON table key, rod group name or None)
+RNG_TABLE_SOURCES = {
+    "grass": ("land_mons", None),
+    "surfing": ("water_mons", None),
+    "rock_smash": ("rock_smash_mons", None),
+    "fishing_old_rod": ("fishing_mons", "old_rod"),
+    "fishing_good_rod": ("fishing_mons", "good_rod"),
+    "fishing_super_rod": ("fishing_mons", "super_rod"),
+}
+
+
+def lcg_jump_coefficients(n: int) -> Tuple[int, int]:
+    """
+    Multiplier and increment that advance the LCG by n steps at once.
+
+    Composes the affine map x -> a*x + c with itself by repeated squaring,
+    so jumping a billion frames costs ~30 multiplications.
+    """
+    mult, add = 1, 0
+    step_mult, step_add = LCG_MULTIPLIER, LCG_INCREMENT
+    while n > 0:
+        if n & 1:
+            mult, add = (mult * step_mult) & LCG_MASK, (add * step_mult + step_add) & LCG_MASK
+        step_mult, step_add = (step_mult * step_mult) & LCG_MASK, (step_add * step_mult + step_add) & LCG_MASK
+        n >>= 1
+    return mult, add
+
+
+def lcg_advance(seed: int, n: int = 1) -> int:
+    """RNG state after n advances from seed (O(log n))."""
+    mult, add = lcg_jump_coefficients(n)
+    return (seed * mult + add) & LCG_MASK
+
+
+def get_rng_slot_table(data: Dict, location_key: str, etype: str) -> Optional[Dict[str, Any]]:
+    """
+    Build the slot/level lookup needed to predict encounters for one table.
+
+    Returns:
+        Dict with "mons", "thresholds" (cumulative slot rates), "total"
+        (the modulus for the slot roll), "base_exp" (per mon, from the
+        file's species table) or None if the table does not exist.
+    """
+    data_key, rod = RNG_TABLE_SOURCES[etype]
+    detected_game = detect_game_version(data)
+    json_rates = get_encounter_rates_from_json(data)
+    default_rates = {
+        "land_mons": LAND_ENCOUNTER_RATES,
+        "water_mons": WATER_ENCOUNTER_RATES,
+        "rock_smash_mons": ROCK_SMASH_ENCOUNTER_RATES,
+        "fishing_mons": FISHING_ENCOUNTER_RATES,
+    }
+    rates = json_rates.get(data_key, default_rates[data_key])
+
+    for group in data.get("wild_encounter_groups", []):
+        if not group.get("for_maps", False):
+            continue
+        for encounter in group.get("encounters", []):
+            version = get_encounter_version(encounter.get("base_label", ""), detected_game)
+            if f"{encounter.get('map', 'Unknown')}_{version}" != location_key or data_key not in encounter:
+                continue
+            mons = encounter[data_key].get("mons", [])
+            indices = json_rates.get("fishing_groups", FISHING_GROUPS)[rod] if rod else range(len(mons))
+            if not mons or len(mons) <= max(indices):
+                return None
+            thresholds = []
+            running = 0
+            for i in indices:
+                running += rates[i]
+                thresholds.append(running)
+            base_exp_table = (data.get("species_table") or DEFAULT_SPECIES_TABLE)["base_exp"]
+            return {"mons": [mons[i] for i in indices], "thresholds": thresholds, "total": running,
+                    "base_exp": [base_exp_table.get(mons[i]["species"], 50) for i in indices]}
+    return None
+
+
+def _rng_exp_lookup(table: Dict[str, Any], lucky_egg: bool,
+                    traded: bool) -> Tuple[List[int], List[int], List[int], List[int]]:
+    """
+    Flatten a slot table into lookups used by the frame search.
+
+    Returns:
+        (slot_by_roll, level_ranges, exp_offsets, exp_values) packed as
+        slot_by_roll[rand % total] -> slot, and exp_values[exp_offsets[slot]
+        + rand % level_ranges[slot]] -> EXP.
+    """
+    import bisect
+
+    slot_by_roll = [bisect.bisect_right(table["thresholds"], roll) for roll in range(table["total"])]
+    level_ranges, exp_offsets, exp_values = [], [], []
+    for mon, base_exp in zip(table["mons"], table["base_exp"]):
+        level_ranges.append(mon["max_level"] - mon["min_level"] + 1)
+        exp_offsets.append(len(exp_values))
+        exp_values.extend(calculate_exp_integer(base_exp, level, lucky_egg, traded)
+                          for level in range(mon["min_level"], mon["max_level"] + 1))
+    return slot_by_roll, level_ranges, exp_offsets, exp_values
+
+
+def predict_frames(
+    table: Dict[str, Any],
+    seed: int,
+    start_frame: int,
+    count: int,
+    lucky_egg: bool = False,
+    traded: bool = False
+) -> List[Dict[str, Any]]:
+    """Predict species, level and EXP for each frame in a (small) window."""
+    slot_by_roll, level_ranges, exp_offsets, exp_values = _rng_exp_lookup(table, lucky_egg, traded)
+    state = lcg_advance(seed, start_frame)
+    predictions = []
+    for frame in range(start_frame, start_frame + count):
+        slot_state = (state * LCG_MULTIPLIER + LCG_INCREMENT) & LCG_MASK
+        level_state = (slot_state * LCG_MULTIPLIER + LCG_INCREMENT) & LCG_MASK
+        slot = slot_by_roll[(slot_state >> 16) % table["total"]]
+        offset = (level_state >> 16) % level_ranges[slot]
+        mon = table["mons"][slot]
+        predictions.append({
+            "frame": frame,
+            "state": state,
+            "slot": slot,
+            "species": mon["species"].replace("SPECIES_", ""),
+            "level": mon["min_level"] + offset,
+            "exp": exp_values[exp_offsets[slot] + offset],
+        })
+        state = slot_state
+    return predictions
+
+
+def _search_frames_chunk(args: Tuple) -> List[Tuple[int, int]]:
+    """
+    Best (exp, -frame) hits in one chunk of frames.
+
+    Runs on the backend named in args (pool workers do not inherit the
+    parent's active backend): NumPy computes every state of the chunk from
+    one jump table, stdlib runs a tight loop.
+    """
+    lookup, total, seed, start_frame, count, top_k, backend_name = args
+    state = lcg_advance(seed, start_frame)
+    return COMPUTE_BACKENDS[backend_name]()["best_frames"](lookup, total, state, start_frame, count, top_k)
+
+
+def search_frames(
+    table: Dict[str, Any],
+    seed: int,
+    start_frame: int,
+    count: int,
+    top_k: int = 10,
+    lucky_egg: bool = False,
+    traded: bool = False,
+    workers: int = None,
+    chunk_size: int = 1 << 20
+) -> List[Dict[str, Any]]:
+    """
+    Find the highest-EXP frames in [start_frame, start_frame + count).
+
+    The window is split into chunks whose starting states come from
+    O(log n) jump-ahead, so chunks run independently on a process pool.
+
+    Returns:
+        Predictions (see predict_frames) sorted by EXP, earliest frame first on ties.
+    """
+    import heapq
+    import os
+
+    lookup = _rng_exp_lookup(table, lucky_egg, traded)
+    backend_name = get_backend()["name"]
+    jobs = [(lookup, table["total"], seed, chunk_start, min(chunk_size, start_frame + count - chunk_start), top_k,
+             backend_name)
+            for chunk_start in range(start_frame, start_frame + count, chunk_size)]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunk_hits = None
+    if workers > 1 and len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                chunk_hits = list(pool.map(_search_frames_chunk, jobs))
+        except (OSError, RuntimeError):
+            chunk_hits = None
+    if chunk_hits is None:
+        chunk_hits = [_search_frames_chunk(job) for job in jobs]
+
+    best = heapq.nlargest(top_k, (hit for hits in chunk_hits for hit in hits))
+    return [predict_frames(table, seed, -neg_frame, 1, lucky_egg, traded)[0] for _, neg_frame in best]
+
+
+# =============================================================================
+# GRINDING ROUTE PLANNER (progression-aware)
+# =============================================================================
+# Milestones are ordered unlock points tied to the grinding Pokemon's level:
+#   {"name": "Surf", "level": 32, "encounter_types": ["surfing"],
+#    "maps": ["MAP_ROUTE119", "Route 120"]}
+# "maps" may be "*" for every map. If no milestone names any maps, every map
+# is open from the start; likewise for encounter types.
+
+def _normalize_map_name(name: str) -> str:
+    """Accept MAP_ROUTE119, ROUTE119 or "Route 119" and return MAP_ROUTE119."""
+    name = name.strip().upper().replace(" ", "")
+    return name if name.startswith("MAP_") else f"MAP_{name}"
+
+
+def load_milestones(path: str) -> List[Dict[str, Any]]:
+    """Load a milestone list from JSON, sorted by level (stable, so file order breaks ties)."""
+    with open(path, "r") as f:
+        milestones = json.load(f)
+    return sorted(milestones, key=lambda m: m.get("level", 0))
+
+
+def _milestone_availability(
+    results: Dict[str, Dict],
+    milestones: List[Dict[str, Any]],
+    start_level: int,
+    target_level: int
+) -> List[List[Tuple[str, str]]]:
+    """
+    Tables open at each level from start_level to target_level - 1.
+
+    Returns:
+        One list of (location_key, etype) per level, in results order.
+    """
+    limit_maps = any("maps" in m for m in milestones)
+    limit_types = any("encounter_types" in m for m in milestones)
+    maps, etypes = set(), set()
+    all_maps = not limit_maps
+    all_types = not limit_types
+    pending = list(milestones)
+
+    available = []
+    current = None
+    for level in range(start_level, target_level):
+        changed = current is None
+        while pending and pending[0].get("level", 0) <= level:
+            milestone = pending.pop(0)
+            unlocked_maps = milestone.get("maps", [])
+            if unlocked_maps == "*":
+                all_maps = True
+            else:
+                maps.update(_normalize_map_name(m) for m in unlocked_maps)
+            etypes.update(milestone.get("encounter_types", []))
+            changed = True
+        if changed:
+            current = [(key, etype)
+                       for key, data in results.items()
+                       if all_maps or data.get("map_name") in maps
+                       for etype in ENCOUNTER_TYPES
+                       if etype in data and (all_types or etype in etypes)]
+        available.append(current)
+    return available
+
+
+def plan_grinding_route(
+    results: Dict[str, Dict],
+    species: str,
+    start_level: int,
+    target_level: int,
+    milestones: List[Dict[str, Any]] = None,
+    current_exp: int = None,
+    repel: bool = False,
+    lucky_egg: bool = False,
+    traded: bool = False,
+    species_table: Dict[str, Dict] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Sequence of grinding spots that minimizes total battles from start to target.
+
+    Dynamic programming over levels: a segment from level a to level b is
+    ground at the best spot open at level a, costing ceil(EXP / EXP per
+    battle) battles; best[b] = min over a of best[a] + cost(a, b). With
+    Repel the grinding Pokemon is the lead, so EXP per battle at each spot
+    is read per level from the memoized Repel tables, and a spot is ground
+    without one whenever that gives more EXP per battle.
+
+    Args:
+        results: process_encounters results for the current Lucky Egg / traded setting
+        milestones: Ordered unlock points (see above); None means everything is open
+        current_exp: Total EXP at start_level (defaults to the level's minimum)
+        repel: Grind with a Repel, leading with the Pokemon being trained
+        species_table: Imported species table for the growth rate
+
+    Returns:
+        Dict with total_battles and segments, or None when some level has
+        no open spot.
+    """
+    target_level = min(target_level, MAX_LEVEL)
+    if target_level <= start_level:
+        return {"species": species, "start_level": start_level, "target_level": target_level,
+                "total_battles": 0, "segments": []}
+
+    available = _milestone_availability(results, milestones or [], start_level, target_level)
+    repel_tables = build_repel_tables(results, lucky_egg, traded) if repel else None
+
+    # Best open spot per level; levels sharing one availability list and no
+    # Repel share the same answer
+    best_spot = []
+    memo = {}
+    for offset, spots in enumerate(available):
+        level = start_level + offset
+        memo_key = (id(spots), level if repel else None)
+        if memo_key not in memo:
+            best = None
+            for key, etype in spots:
+                edata = results[key][etype]
+                if edata.get("encounter_rate", 0) <= 0:
+                    continue
+                exp, use_repel = edata["expected_exp"], False
+                if repel:
+                    # A Repel that blocks everything just stays in the bag
+                    exp_by_lead, pass_by_lead, _ = repel_tables[(key, etype)]
+                    if pass_by_lead[level] > 0 and exp_by_lead[level] > exp:
+                        exp, use_repel = exp_by_lead[level], True
+                if exp > 0 and (best is None or exp > best[0]):
+                    best = (exp, key, etype, use_repel)
+            memo[memo_key] = best
+        if memo[memo_key] is None:
+            return None
+        best_spot.append(memo[memo_key])
+
+    total_exp = [get_total_exp_for_level(species, level, species_table)
+                 for level in range(start_level, target_level + 1)]
+    if current_exp is not None:
+        total_exp[0] = max(current_exp, total_exp[0])
+
+    n = target_level - start_level
+    best_cost = [0] + [None] * n
+    choice = [None] * (n + 1)
+    for b in range(1, n + 1):
+        for a in range(b):
+            exp = best_spot[a][0]
+            cost = best_cost[a] + max(0, math.ceil((total_exp[b] - total_exp[a]) / exp))
+            if best_cost[b] is None or cost < best_cost[b]:
+                best_cost[b] = cost
+                choice[b] = a
+
+    # Walk back, merging consecutive segments at the same spot. With Repel the
+    # EXP per battle changes with the lead's level, so a merged segment keeps
+    # the battle-weighted mean and expected_exp * battles stays its EXP gained
+    segments = []
+    b = n
+    while b > 0:
+        a = choice[b]
+        exp, key, etype, use_repel = best_spot[a]
+        battles = best_cost[b] - best_cost[a]
+        if (segments and segments[0]["location_key"] == key and segments[0]["etype"] == etype
+                and segments[0]["repel"] == use_repel):
+            merged_battles = segments[0]["battles"] + battles
+            if merged_battles > 0:
+                segments[0]["expected_exp"] = (
+                    segments[0]["expected_exp"] * segments[0]["battles"] + exp * battles
+                ) / merged_battles
+            segments[0]["start_level"] = start_level + a
+            segments[0]["battles"] = merged_battles
+        else:
+            segments.insert(0, {
+                "start_level": start_level + a,
+                "end_level": start_level + b,
+                "location_key": key,
+                "formatted_name": results[key].get("formatted_name", key),
+                "version": results[key].get("version", ""),
+                "etype": etype,
+                "expected_exp": exp,
+                "repel": use_repel,
+                "battles": battles,
+            })
+        b = a
+
+    return {"species": species, "start_level": start_level, "target_level": target_level,
+            "total_battles": best_cost[n], "segments": segments}
+
+
+# =============================================================================
+# PARETO SKYLINE (multi-criteria spot selection)
+# =============================================================================
+# Rankings fold everything into one efficiency score. The skyline keeps every
+# (location, encounter type) that no other spot beats on all chosen criteria
+# at once: more EXP per battle, a higher encounter rate, a lower highest wild
+# level (safer for an underleveled lead) and lower EXP variance. Criteria to
+# minimize are negated so every dimension is "larger is better".
+#
+# Dominance checks sort once: one sorted sweep for 2 criteria and a sweep
+# against a binary-searched 2D staircase for 3, both O(n log n). For 4 or
+# more (the default), sort-filter-skyline uses a lexicographic presort, so
+# a dominator always precedes what it dominates, and then compares each row
+# with the skyline kept so far: O(n * s) for a skyline of s rows, which is
+# O(n^2) when most rows survive. Rows from many results (every game and
+# scenario) can be merged into one call.
+
+# Criterion -> (label, +1 to maximize / -1 to minimize)
+SKYLINE_CRITERIA = {
+    "exp": ("EXP/battle", 1),
+    "rate": ("Rate", 1),
+    "max_level": ("Max Lv", -1),
+    "variance": ("EXP SD", -1),
+    "efficiency": ("Eff", 1),
+}
+DEFAULT_SKYLINE_CRITERIA = ["exp", "rate", "max_level", "variance"]
+
+# (exp_formula, base_exp, min_level, max_level, lucky_egg, traded) -> integer
+# sum of squared EXP over the level range
+_SLOT_EXP_SQUARE_SUM_CACHE = {}
+
+
+def table_exp_variance(location: Dict, etype: str, lucky_egg: bool = False, traded: bool = False) -> float:
+    """
+    Variance of the EXP one battle at a table gives.
+
+    Levels are uniform within each slot unless the slot carries its own
+    exp_second_moment (lead-ability views, where Hustle and Keen Eye skew
+    the level distribution).
+    """
+    exp_formula = GENERATION_ENGINES[location.get("generation", 3)]["exp_integer"]
+    base_exp_table = (location.get("species_table") or DEFAULT_SPECIES_TABLE)["base_exp"]
+    mean = second_moment = 0.0
+    for slot in location[etype]["breakdown"]:
+        mean += slot["probability"] * slot["expected_exp"]
+        if "exp_second_moment" in slot:
+            second_moment += slot["probability"] * slot["exp_second_moment"]
+            continue
+        base_exp = base_exp_table.get(f"SPECIES_{slot['species']}", 50)
+        min_level, max_level = slot["min_level"], slot["max_level"]
+        sum_key = (exp_formula, base_exp, min_level, max_level, lucky_egg, traded)
+        square_sum = _SLOT_EXP_SQUARE_SUM_CACHE.get(sum_key)
+        if square_sum is None:
+            square_sum = sum(exp_formula(base_exp, level, lucky_egg, traded) ** 2
+                             for level in range(min_level, max_level + 1))
+            _SLOT_EXP_SQUARE_SUM_CACHE[sum_key] = square_sum
+        num_levels = max_level - min_level + 1
+        second_moment += slot["probability"] * square_sum / num_levels
+    return max(0.0, second_moment - mean * mean)
+
+
+def skyline_rows(results: Dict[str, Dict], lucky_egg: bool = False, traded: bool = False) -> List[Dict[str, Any]]:
+    """
+    One row per table with every skyline criterion.
+
+    Rows from different results (versions, Lucky Egg / traded cells, files)
+    can be concatenated and passed to pareto_skyline together.
+    """
+    rows = []
+    for key, data in results.items():
+        for etype in ENCOUNTER_TYPES:
+            if etype not in data:
+                continue
+            edata = data[etype]
+            rate = edata.get("effective_rate", edata.get("encounter_rate", 0))
+            if rate <= 0:
+                continue
+            rows.append({
+                "key": key,
+                "etype": etype,
+                "formatted_name": data.get("formatted_name", key),
+                "version": data.get("version", ""),
+                "lucky_egg": lucky_egg,
+                "traded": traded,
+                "exp": edata["expected_exp"],
+                "rate": rate,
+                "max_level": max(slot["max_level"] for slot in edata["breakdown"]),
+                "variance": table_exp_variance(data, etype, lucky_egg, traded),
+                "efficiency": edata.get("efficiency", 0),
+            })
+    return rows
+
+
+def _skyline_2d(points: List[Tuple], order: List[int]) -> List[int]:
+    """Sweep in descending x; a point survives if its y beats every strictly larger x."""
+    skyline = []
+    best_y = None
+    i = 0
+    while i < len(order):
+        # Points sharing x: only those with the group's largest y can survive
+        x = points[order[i]][0]
+        j = i
+        while j < len(order) and points[order[j]][0] == x:
+            j += 1
+        group_y = points[order[i]][1]
+        if best_y is None or group_y > best_y:
+            skyline.extend(idx for idx in order[i:j] if points[idx][1] == group_y)
+            best_y = group_y
+        i = j
+    return skyline
+
+
+def _skyline_3d(points: List[Tuple], order: List[int]) -> List[int]:
+    """Sweep in descending x against a (y, z) staircase of the points already kept."""
+    import bisect
+
+    # Staircase of kept points: y ascending, z descending
+    stair_y, stair_z = [], []
+    skyline = []
+    i = 0
+    while i < len(order):
+        x = points[order[i]][0]
+        j = i
+        while j < len(order) and points[order[j]][0] == x:
+            j += 1
+        # Within one x the 2D rule applies; against larger x, y' >= y and z' >= z dominates
+        group = _skyline_2d([points[idx][1:] for idx in order[i:j]], list(range(j - i)))
+        survivors = []
+        for g in group:
+            y, z = points[order[i + g]][1:]
+            pos = bisect.bisect_left(stair_y, y)
+            if pos == len(stair_y) or stair_z[pos] < z:
+                survivors.append(order[i + g])
+        for idx in survivors:
+            y, z = points[idx][1:]
+            pos = bisect.bisect_left(stair_y, y)
+            if pos < len(stair_y) and stair_z[pos] >= z:
+                continue
+            # Drop the staircase points this one covers (y' <= y, z' <= z)
+            start = pos
+            if start < len(stair_y) and stair_y[start] == y:
+                start += 1
+            lo = pos
+            while lo > 0 and stair_z[lo - 1] <= z:
+                lo -= 1
+            del stair_y[lo:start], stair_z[lo:start]
+            stair_y.insert(lo, y)
+            stair_z.insert(lo, z)
+        skyline.extend(survivors)
+        i = j
+    return skyline
+
+
+def _skyline_sfs(points: List[Tuple], order: List[int]) -> List[int]:
+    """
+    Sort-filter-skyline over distinct points: compare each only with the skyline found so far.
+
+    O(n * s) for a skyline of s points, so O(n^2) in the worst case.
+    """
+    skyline = []
+    kept_points = []
+    for idx in order:
+        point = points[idx]
+        # Points are distinct here, so "at least as large everywhere" dominates
+        if not any(all(a >= b for a, b in zip(other, point)) for other in kept_points):
+            skyline.append(idx)
+            kept_points.append(point)
+    return skyline
+
+
+def pareto_skyline(points: List[Tuple[float, ...]]) -> List[int]:
+    """
+    Indices of the points no other point dominates, every dimension maximized.
+
+    A point dominates another when it is at least as large everywhere and
+    larger somewhere; identical points never dominate each other. Returned
+    in descending lexicographic order of the points.
+    """
+    if not points:
+        return []
+    # Identical points share one fate; merged games and scenarios repeat many
+    copies = defaultdict(list)
+    for i, point in enumerate(points):
+        copies[point].append(i)
+    unique = sorted(copies, reverse=True)
+    order = list(range(len(unique)))
+    dims = len(unique[0])
+    if dims == 1:
+        kept = order[:1]
+    elif dims == 2:
+        kept = _skyline_2d(unique, order)
+    elif dims == 3:
+        kept = _skyline_3d(unique, order)
+    else:
+        kept = _skyline_sfs(unique, order)
+    return [i for u in kept for i in copies[unique[u]]]
+
+
+def compute_skyline(rows: List[Dict[str, Any]], criteria: List[str] = None) -> List[Dict[str, Any]]:
+    """
+    Non-dominated rows for the chosen criteria, best EXP first.
+
+    Raises:
+        ValueError: for a criterion not in SKYLINE_CRITERIA
+    """
+    criteria = criteria or DEFAULT_SKYLINE_CRITERIA
+    for name in criteria:
+        if name not in SKYLINE_CRITERIA:
+            raise ValueError(f"Unknown criterion '{name}' (expected one of {', '.join(SKYLINE_CRITERIA)})")
+    signs = [SKYLINE_CRITERIA[name][1] for name in criteria]
+    points = [tuple(sign * row[name] for name, sign in zip(criteria, signs)) for row in rows]
+    skyline = [rows[i] for i in pareto_skyline(points)]
+    skyline.sort(key=lambda row: (-row["exp"], row["formatted_name"], row["etype"]))
+    return skyline
+
+
+def iter_skyline_lines(skyline: List[Dict[str, Any]], criteria: List[str]) -> Iterator[str]:
+    """Yield the skyline as a table, one line at a time."""
+    yield "=" * 80
+    yield f"PARETO SKYLINE - {len(skyline)} spots not beaten on all of: " \
+          f"{', '.join(SKYLINE_CRITERIA[name][0] for name in criteria)}"
+    yield "=" * 80
+    yield f"  {'Location':28s} {'Type':17s} {'Ver':9s} {'EXP':>7s} {'Rate':>5s} {'MaxLv':>5s} {'SD':>6s} {'Eff':>7s}"
+    for row in skyline:
+        yield (f"  {row['formatted_name']:28s} {row['etype'].replace('_', ' '):17s} {row['version']:9s} "
+               f"{row['exp']:7.1f} {row['rate']:5.1f} {row['max_level']:5d} {math.sqrt(row['variance']):6.1f} "
+               f"{row['efficiency']:7.1f}")
+
+
+# =============================================================================
+# RANKING QUERIES (compiled filter and score expressions)
+# =============================================================================
+# A query is a filter and a score written as small Python-like expressions:
+#   where: version == "Emerald" and etype in ("grass", "surfing") and rate >= 10
+#   score: exp * rate / max(max_level, 1)
+# Each expression is parsed with ast and checked against a whitelist of
+# syntax, columns and functions. It is then compiled once into nested
+# closures that work a whole column at a time: map(operator.add, left, right)
+# rather than a tree walk or dict lookups per row. Compiled expressions are
+# memoized by text. Columns are extracted once per results snapshot and only
+# when a query first uses them, so trying many variants of a query only costs
+# the list passes of its operators. Division by zero gives 0. Powers are
+# float powers, so an overflow is an error instead of a huge integer, and
+# * and % only take numbers (no repeated or formatted strings).
+
+# Column -> (description, value of one table from (location, table, etype, attribute mask))
+RANKING_COLUMNS = {
+    "location": ("location name", lambda loc, t, etype, mask: loc.get("formatted_name", "")),
+    "map": ("map constant", lambda loc, t, etype, mask: loc.get("map_name", "")),
+    "version": ("game version", lambda loc, t, etype, mask: loc.get("version", "")),
+    "generation": ("generation", lambda loc, t, etype, mask: loc.get("generation", 3)),
+    "etype": ("encounter type", lambda loc, t, etype, mask: etype),
+    "exp": ("expected EXP per battle", lambda loc, t, etype, mask: t["expected_exp"]),
+    "rate": ("encounter rate (Repel-reduced in lead views)",
+             lambda loc, t, etype, mask: t.get("effective_rate", t.get("encounter_rate", 0))),
+    "efficiency": ("efficiency score", lambda loc, t, etype, mask: t.get("efficiency", 0)),
+    "min_level": ("lowest wild level", lambda loc, t, etype, mask: min(s["min_level"] for s in t["breakdown"])),
+    "max_level": ("highest wild level", lambda loc, t, etype, mask: max(s["max_level"] for s in t["breakdown"])),
+    "slots": ("number of slots", lambda loc, t, etype, mask: len(t["breakdown"])),
+    "item": ("chance of a held item", lambda loc, t, etype, mask: sum(t.get("items", {}).values())),
+    "trainer_exp": ("guaranteed trainer EXP on the map", lambda loc, t, etype, mask: loc.get("trainer_exp", 0)),
+}
+for _stat in EV_STATS:
+    RANKING_COLUMNS[_stat] = (f"{_stat} EVs per battle",
+                              lambda loc, t, etype, mask, stat=_stat: t.get("evs", {}).get(stat, 0.0))
+for _name, _bit in ATTRIBUTE_BITS.items():
+    # Attribute flags; "rock_smash" the flag and "rock_smash" the etype string do not clash
+    RANKING_COLUMNS[_name] = (f"{_name.replace('_', ' ')} attribute",
+                              lambda loc, t, etype, mask, bit=_bit: bool(mask & bit))
+del _stat, _name, _bit
+
+
+def _ranking_numbers(a, b):
+    if isinstance(a, (str, tuple)) or isinstance(b, (str, tuple)):
+        raise TypeError("only numbers can be multiplied, divided or raised to a power")
+
+
+def _ranking_mul(a, b):
+    _ranking_numbers(a, b)
+    return a * b
+
+
+def _ranking_div(a, b):
+    return a / b if b else 0.0
+
+
+def _ranking_floordiv(a, b):
+    return a // b if b else 0
+
+
+def _ranking_mod(a, b):
+    _ranking_numbers(a, b)
+    return a % b if b else 0
+
+
+def _ranking_pow(a, b):
+    _ranking_numbers(a, b)
+    try:
+        return math.pow(a, b)
+    except ValueError:
+        # A negative number to a fractional power
+        return 0.0
+
+
+def _ranking_log(x):
+    return math.log(x) if x > 0 else 0.0
+
+
+def _ranking_sqrt(x):
+    return math.sqrt(x) if x > 0 else 0.0
+
+
+RANKING_FUNCTIONS = {"abs": abs, "min": min, "max": max, "round": round, "log": _ranking_log, "sqrt": _ranking_sqrt}
+
+RANKING_EXPRESSION_CACHE_MAX_ENTRIES = 512
+_RANKING_EXPRESSION_CACHE = OrderedDict()
+RANKING_COLUMNS_MAX_ENTRIES = 8
+_RANKING_COLUMNS_CACHE = OrderedDict()
+
+
+def _ranking_operators() -> Tuple[Dict, Dict, Dict]:
+    """ast operator node type -> function, for binary, unary and comparison nodes."""
+    import ast
+    import operator
+
+    binary = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: _ranking_mul, ast.Div: _ranking_div,
+              ast.FloorDiv: _ranking_floordiv, ast.Mod: _ranking_mod, ast.Pow: _ranking_pow}
+    unary = {ast.Not: operator.not_, ast.USub: operator.neg, ast.UAdd: operator.pos}
+    compare = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+               ast.Gt: operator.gt, ast.GtE: operator.ge,
+               ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b}
+    return binary, unary, compare
+
+
+def _apply_ranking_function(func, *parts):
+    """
+    Combine compiled parts elementwise with func.
+
+    A part is ("const", value) or ("column", fn) where fn(get_column, n)
+    returns a list; constants stay scalars and are folded when possible.
+    """
+    from itertools import repeat
+
+    if all(kind == "const" for kind, _ in parts):
+        return ("const", func(*(value for _, value in parts)))
+
+    def run(get_column, n):
+        columns = [repeat(value, n) if kind == "const" else value(get_column, n) for kind, value in parts]
+        return list(map(func, *columns))
+
+    return ("column", run)
+
+
+def _compile_ranking_node(node) -> Tuple[str, Any]:
+    """Compile one validated ast node into a ("const", value) or ("column", fn) part."""
+    import ast
+
+    binary, unary, compare = _ranking_operators()
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float, bool)):
+        return ("const", node.value)
+    if isinstance(node, (ast.Tuple, ast.List)):
+        parts = [_compile_ranking_node(element) for element in node.elts]
+        if any(kind != "const" for kind, _ in parts):
+            raise ValueError("Tuples may only hold constants, e.g. etype in (\"grass\", \"surfing\")")
+        return ("const", tuple(value for _, value in parts))
+    if isinstance(node, ast.Name):
+        if node.id not in RANKING_COLUMNS:
+            raise ValueError(f"Unknown column '{node.id}' (expected one of {', '.join(RANKING_COLUMNS)})")
+        name = node.id
+        return ("column", lambda get_column, n: get_column(name))
+    if isinstance(node, ast.BinOp) and type(node.op) in binary:
+        return _apply_ranking_function(binary[type(node.op)], _compile_ranking_node(node.left),
+                                       _compile_ranking_node(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in unary:
+        return _apply_ranking_function(unary[type(node.op)], _compile_ranking_node(node.operand))
+    if isinstance(node, ast.BoolOp):
+        combine = (lambda a, b: a and b) if isinstance(node.op, ast.And) else (lambda a, b: a or b)
+        part = _compile_ranking_node(node.values[0])
+        for value in node.values[1:]:
+            part = _apply_ranking_function(combine, part, _compile_ranking_node(value))
+        return part
+    if isinstance(node, ast.Compare):
+        # a < b < c is (a < b) and (b < c)
+        left, result = _compile_ranking_node(node.left), None
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in compare:
+                raise ValueError(f"Unsupported comparison: {type(op).__name__}")
+            right = _compile_ranking_node(comparator)
+            part = _apply_ranking_function(compare[type(op)], left, right)
+            result = part if result is None else _apply_ranking_function(lambda a, b: a and b, result, part)
+            left = right
+        return result
+    if isinstance(node, ast.IfExp):
+        return _apply_ranking_function(lambda test, body, orelse: body if test else orelse,
+                                       _compile_ranking_node(node.test), _compile_ranking_node(node.body),
+                                       _compile_ranking_node(node.orelse))
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in RANKING_FUNCTIONS or node.keywords:
+            raise ValueError(f"Unknown function (expected one of {', '.join(RANKING_FUNCTIONS)})")
+        return _apply_ranking_function(RANKING_FUNCTIONS[node.func.id],
+                                       *(_compile_ranking_node(arg) for arg in node.args))
+    raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+
+def compile_ranking_expression(text: str) -> Callable[[Dict[str, Any]], List[Any]]:
+    """
+    Compile a filter or score expression (memoized by text).
+
+    Returns:
+        fn(columns) -> one value per row, where columns comes from
+        get_ranking_columns.
+
+    Raises:
+        ValueError: on a syntax error, an unknown column or function,
+            syntax outside the expression language, or an expression
+            nested too deeply to parse or compile
+    """
+    import ast
+
+    text = text.strip()
+    if text in _RANKING_EXPRESSION_CACHE:
+        _RANKING_EXPRESSION_CACHE.move_to_end(text)
+        return _RANKING_EXPRESSION_CACHE[text]
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    except (RecursionError, MemoryError):
+        # e.g. thousands of chained unary minuses or additions
+        raise ValueError("Invalid expression: nested too deeply")
+    try:
+        kind, value = _compile_ranking_node(tree.body)
+    except (TypeError, ZeroDivisionError, OverflowError) as e:
+        raise ValueError(f"Invalid expression: {e}")
+    except (RecursionError, MemoryError):
+        raise ValueError("Invalid expression: nested too deeply")
+
+    if kind == "const":
+        def evaluate(columns):
+            return [value] * len(columns["rows"])
+    else:
+        def evaluate(columns):
+            return value(columns["column"], len(columns["rows"]))
+
+    _RANKING_EXPRESSION_CACHE[text] = evaluate
+    while len(_RANKING_EXPRESSION_CACHE) > RANKING_EXPRESSION_CACHE_MAX_ENTRIES:
+        _RANKING_EXPRESSION_CACHE.popitem(last=False)
+    return evaluate
+
+
+def get_ranking_columns(results: Dict[str, Dict]) -> Dict[str, Any]:
+    """
+    Column store of every table in a results dict (memoized per results object).
+
+    Returns:
+        Dict with "rows" ((location_key, etype) in results order) and
+        "column" (name -> list of values, built on first use).
+    """
+    cache_key = id(results)
+    if cache_key in _RANKING_COLUMNS_CACHE:
+        _RANKING_COLUMNS_CACHE.move_to_end(cache_key)
+        return _RANKING_COLUMNS_CACHE[cache_key][1]
+
+    rows, sources = [], []
+    for key, data in results.items():
+        for etype in ENCOUNTER_TYPES:
+            if etype in data:
+                rows.append((key, etype))
+                sources.append((data, data[etype], etype,
+                                data.get("attributes", 0) | ENCOUNTER_TYPE_ATTRIBUTES.get(etype, 0)))
+    built = {}
+
+    def column(name):
+        values = built.get(name)
+        if values is None:
+            extract = RANKING_COLUMNS[name][1]
+            values = built[name] = [extract(*source) for source in sources]
+        return values
+
+    columns = {"rows": rows, "column": column}
+    # Holding results keeps its id from being reused while the entry lives
+    _RANKING_COLUMNS_CACHE[cache_key] = (results, columns)
+    while len(_RANKING_COLUMNS_CACHE) > RANKING_COLUMNS_MAX_ENTRIES:
+        _RANKING_COLUMNS_CACHE.popitem(last=False)
+    return columns
+
+
+def run_ranking_query(
+    results: Dict[str, Dict],
+    where: str = None,
+    score: str = None,
+    k: int = 15,
+    ascending: bool = False
+) -> Dict[str, Any]:
+    """
+    Rank the tables that pass a filter by a score expression.
+
+    Args:
+        where: Filter expression; None or blank keeps every table
+        score: Score expression; None or blank ranks by efficiency
+        k: Rows to return; 0 or less returns every match
+        ascending: Lowest score first instead of highest
+
+    Returns:
+        {"rows": [{"key", "etype", "score", "location", "version", "exp",
+        "rate", "efficiency"}, ...], "matched": count, "total": count}.
+        Ties keep results order.
+
+    Raises:
+        ValueError: for an invalid expression (including one nested too
+            deeply to evaluate) or a score that is not a number
+    """
+    columns = get_ranking_columns(results)
+    score = (score or "").strip() or "efficiency"
+    try:
+        keep = range(len(columns["rows"]))
+        if where and where.strip():
+            keep = [i for i, passed in enumerate(compile_ranking_expression(where)(columns)) if passed]
+        all_scores = compile_ranking_expression(score)(columns)
+    except (TypeError, ZeroDivisionError, OverflowError) as e:
+        raise ValueError(f"Cannot evaluate expression: {e}")
+    except (RecursionError, MemoryError):
+        # The compiled closures nest as deeply as the expression
+        raise ValueError("Cannot evaluate expression: nested too deeply")
+    scores = [all_scores[i] for i in keep]
+    if any(not isinstance(value, (int, float)) for value in scores):
+        raise ValueError("The score expression must give a number")
+
+    backend = get_backend()
+    keys = [-value for value in scores] if ascending else scores
+    order = backend["top_k"](keys, k) if k and k > 0 else backend["argsort_desc"](keys)
+    rows = []
+    for position in order:
+        i = keep[position]
+        rows.append({
+            "key": columns["rows"][i][0],
+            "etype": columns["rows"][i][1],
+            "score": scores[position],
+            **{name: columns["column"](name)[i] for name in ("location", "version", "exp", "rate", "efficiency")},
+        })
+    return {"rows": rows, "matched": len(scores), "total": len(columns["rows"])}
+
+
+def iter_ranking_query_lines(ranking: Dict[str, Any], where: str = None, score: str = None,
+                             ascending: bool = False) -> Iterator[str]:
+    """Yield a ranking query's result as a table, one line at a time."""
+    score = (score or "").strip() or "efficiency"
+    yield "=" * 80
+    yield f"CUSTOM RANKING - score: {score} ({'lowest' if ascending else 'highest'} first)"
+    yield f"Filter: {where.strip() if where and where.strip() else '(none)'} - " \
+          f"{ranking['matched']} of {ranking['total']} spots match, showing {len(ranking['rows'])}"
+    yield "=" * 80
+    yield f"  {'#':>4s} {'Location':28s} {'Type':17s} {'Ver':9s} {'EXP':>7s} {'Rate':>5s} {'Eff':>7s} {'Score':>10s}"
+    for rank, row in enumerate(ranking["rows"], 1):
+        yield (f"  {rank:4d} {row['location']:28s} {row['etype'].replace('_', ' '):17s} {row['version']:9s} "
+               f"{row['exp']:7.1f} {row['rate']:5.1f} {row['efficiency']:7.1f} {row['score']:10.2f}")
+
+
+# =============================================================================
+# OUTPUT GENERATION
+# =============================================================================
+
+CSV_HEADER = ["Location", "Version", "Encounter Type", "Expected EXP", "Encounter Rate", "Efficiency Score"]
+
+
+def _results_generation(results: Dict[str, Dict]) -> int:
+    """Generation whose engine computed the results (Gen 3 when empty)."""
+    return next((data.get("generation", 3) for data in results.values()), 3)
+
+
+def _iter_report_header(lucky_egg: bool = False, game: str = None, lead_level: int = None,
+                        lead_ability: str = None, generation: int = 3) -> Iterator[str]:
+    """Title block of the location report."""
+    egg_str = " (WITH LUCKY EGG)" if lucky_egg else ""
+    game_str = f" - {game}" if game else ""
+    yield "=" * 80
+    yield f"POKEMON GEN {generation} EXPECTED EXP PER BATTLE BY LOCATION{egg_str}{game_str}"
+    yield "Using proper integer math (floor after each operation)"
+    if lead_level:
+        yield f"Repel active, lead level {lead_level} (Eff uses the Repel-reduced encounter rate)"
+    if lead_ability and lead_ability != "NONE":
+        yield f"Lead ability: {lead_ability.replace('_', ' ').title()} (Emerald encounters only)"
+    yield "=" * 80
+    yield ""
+
+
+def _report_version_order(versions: Iterable[str]) -> List[str]:
+    """Gen 3 versions in their usual order, then any other generation's, then Unknown."""
+    gen3_versions = ["Ruby", "Sapphire", "Emerald", "FireRed", "LeafGreen"]
+    other_versions = sorted(v for v in versions if v not in gen3_versions and v != "Unknown")
+    return [v for v in gen3_versions + other_versions + ["Unknown"] if v in versions]
+
+
+def _iter_version_heading(version: str) -> Iterator[str]:
+    """Heading that opens one version's part of the report."""
+    yield f"\n{'='*40}"
+    yield f"  {version.upper()} VERSION"
+    yield f"{'='*40}\n"
+
+
+def _iter_location_report_lines(key: str, data: Dict, verbose: bool = False) -> Iterator[str]:
+    """Report lines of one location (nothing if it has no encounter tables)."""
+    formatted_name = data.get("formatted_name", key)
+    
+    encounter_types = [etype for etype in ENCOUNTER_TYPES if etype in data]
+    if not encounter_types:
+        return
+    
+    yield f"\n{formatted_name}"
+    yield "-" * len(formatted_name)
+    
+    for etype in encounter_types:
+        edata = data[etype]
+        exp = edata["expected_exp"]
+        eff = edata.get("efficiency", 0)
+        enc_rate = edata.get("encounter_rate", 0)
+        
+        etype_display = etype.replace("_", " ").title().replace("Fishing ", "Fishing: ")
+        
+        yield f"  {etype_display:25s} | EXP: {exp:7.1f} | Rate: {enc_rate:2d}/16 | Eff: {eff:7.1f}"
+        
+        if verbose:
+            yield f"    {'Species':15s} | {'Lvl':9s} | {'Prob':6s} | {'EXP':6s} | {'Contrib':7s}"
+            yield f"    {'-'*55}"
+            for slot in edata["breakdown"]:
+                species = slot["species"]
+                level_str = f"{slot['min_level']}-{slot['max_level']}"
+                prob = f"{slot['probability']*100:.1f}%"
+                exp_str = f"{slot['expected_exp']:.1f}"
+                contrib = f"{slot['contribution']:.2f}"
+                yield f"    {species:15s} | {level_str:9s} | {prob:6s} | {exp_str:6s} | {contrib:7s}"
+            yield ""
+
+
+def iter_report_lines(results: Dict[str, Dict], verbose: bool = False, lucky_egg: bool = False,
+                      game: str = None, lead_level: int = None, lead_ability: str = None) -> Iterator[str]:
+    """Yield the formatted report of expected EXP by location, one line at a time."""
+    yield from _iter_report_header(lucky_egg, game, lead_level, lead_ability, _results_generation(results))
+    
+    by_version = defaultdict(list)
+    for key, data in results.items():
+        version = data.get("version", "Unknown")
+        by_version[version].append((key, data))
+    
+    for version in _report_version_order(by_version):
+        yield from _iter_version_heading(version)
+        
+        locations = sorted(by_version[version], key=lambda x: x[1].get("formatted_name", ""))
+        
+        for key, data in locations:
+            yield from _iter_location_report_lines(key, data, verbose)
+
+
+def generate_report(results: Dict[str, Dict], verbose: bool = False, lucky_egg: bool = False, game: str = None,
+                    lead_level: int = None) -> str:
+    """Generate a formatted report of expected EXP by location."""
+    return "\n".join(get_rendered_lines(iter_report_lines, results, verbose, lucky_egg, game, lead_level))
+
+
+def _location_csv_rows(key: str, data: Dict) -> Iterator[List]:
+    """CSV rows of one location, one per encounter type."""
+    formatted_name = data.get("formatted_name", key)
+    version = data.get("version", "Unknown")
+    
+    for etype in ENCOUNTER_TYPES:
+        if etype in data:
+            edata = data[etype]
+            exp = edata["expected_exp"]
+            rate = edata.get("encounter_rate", 0)
+            eff = edata.get("efficiency", 0)
+            etype_display = etype.replace("_", " ").title()
+            yield [formatted_name, version, etype_display, f"{exp:.2f}", rate, f"{eff:.2f}"]
+
+
+def iter_csv_rows(results: Dict[str, Dict]) -> Iterator[List]:
+    """Yield CSV rows (header first), one per location and encounter type."""
+    yield CSV_HEADER
+    
+    for key, data in sorted(results.items()):
+        yield from _location_csv_rows(key, data)
+
+
+def write_csv(results: Dict[str, Dict], stream: TextIO):
+    """Stream CSV output to an open text stream using the csv module for quoting."""
+    import csv
+
+    writer = csv.writer(stream, lineterminator="\n")
+    for row in iter_csv_rows(results):
+        writer.writerow(row)
+
+
+def generate_csv(results: Dict[str, Dict]) -> str:
+    """Generate CSV output."""
+    import io
+
+    buffer = io.StringIO()
+    write_csv(results, buffer)
+    return buffer.getvalue().rstrip("\n")
+
+
+def iter_efficiency_summary_lines(results: Dict[str, Dict], top_n: int = 15,
+                                  weights: Dict[str, float] = None) -> Iterator[str]:
+    """Yield the efficiency summary one line at a time, optionally ranked by a weighted objective."""
+    top_k = get_backend()["top_k"]
+
+    yield from _iter_summary_header(weights)
+    
+    for etype in ENCOUNTER_TYPES:
+        rows = [(key, data) for key, data in results.items() if etype in data]
+        scores = [calculate_objective_score(data[etype], weights) for _, data in rows]
+        # Only the top entries are selected, never a full sorted copy
+        top = [rows[i] for i in top_k(scores, top_n)]
+        yield from _iter_summary_section(etype, top, weights)
+
+
+def _iter_summary_header(weights: Dict[str, float] = None) -> Iterator[str]:
+    """Title block of the efficiency summary."""
+    yield "\n" + "=" * 80
+    if weights:
+        yield "TOP GRINDING LOCATIONS BY WEIGHTED OBJECTIVE"
+        terms = " + ".join(f"{weight:g} × {metric}" for metric, weight in weights.items())
+        yield f"Score = ({terms}) per battle × (Encounter Rate / 16)"
+    else:
+        yield "TOP GRINDING LOCATIONS BY EFFICIENCY SCORE"
+        yield "Efficiency = Expected EXP × (Encounter Rate / 16)"
+    yield "=" * 80
+
+
+def _iter_summary_section(etype: str, top: List[Tuple[str, Dict]], weights: Dict[str, float] = None) -> Iterator[str]:
+    """One encounter type's ranked (key, location) entries, best first."""
+    if not top:
+        return
+    
+    etype_display = etype.replace("_", " ").title()
+    yield f"\n{etype_display}"
+    # Rule and column header as one string so list views keep them together
+    yield ("-" * 60 + "\n"
+           + f"  {'#':>2s}  {'Location':30s} {'Ver':8s} {'EXP':>7s} {'Rate':>4s} {'Score' if weights else 'Eff':>8s}")
+    
+    for i, (key, data) in enumerate(top, 1):
+        edata = data[etype]
+        name = data.get("formatted_name", key)
+        version = data.get("version", "Unknown")
+        yield (f"  {i:2d}. {name:30s} {version:8s} {edata['expected_exp']:7.1f} "
+               f"{edata.get('encounter_rate', 0):4d} {calculate_objective_score(edata, weights):8.1f}")
+
+
+def generate_efficiency_summary(results: Dict[str, Dict]) -> str:
+    """Generate summary sorted by efficiency score."""
+    return "\n".join(get_rendered_lines(iter_efficiency_summary_lines, results))
+
+
+# Rendered outputs kept for reuse: viewing a report and then exporting it
+# (or toggling a setting back) reads the lines instead of re-rendering.
+# Keyed by (renderer, results snapshot, arguments); results objects are
+# cube cells or lead views, which are never modified once built.
+RENDER_CACHE_MAX_ENTRIES = 8
+
+_RENDER_CACHE = OrderedDict()
+
+
+def get_rendered_lines(renderer, results: Dict[str, Dict], *args) -> List[str]:
+    """
+    Lines of renderer(results, *args), rendered once per results snapshot
+    and arguments.
+
+    The cache holds a reference to each results dict so its id() cannot be
+    reused by another snapshot while the entry exists. At most
+    RENDER_CACHE_MAX_ENTRIES outputs are kept, least recently used first out.
+    """
+    # Weights and other dict arguments become hashable
+    frozen = tuple(tuple(sorted(arg.items())) if isinstance(arg, dict) else arg for arg in args)
+    key = (renderer, id(results)) + frozen
+    entry = _RENDER_CACHE.get(key)
+    if entry is not None and entry[0] is results:
+        _RENDER_CACHE.move_to_end(key)
+        return entry[1]
+
+    lines = list(renderer(results, *args))
+    _RENDER_CACHE[key] = (results, lines)
+    while len(_RENDER_CACHE) > RENDER_CACHE_MAX_ENTRIES:
+        _RENDER_CACHE.popitem(last=False)
+    return lines
+
+
+def clear_rendered_output():
+    """Drop every cached rendering (results were reprocessed)."""
+    _RENDER_CACHE.clear()
+
+
+def write_lines(lines: Iterable[str], stream: TextIO, chunk_lines: int = 512):
+    """
+    Write lines to a stream in bounded chunks.
+
+    Only chunk_lines lines are ever joined at once, so memory stays flat
+    no matter how long the report is.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            stream.write("\n".join(chunk))
+            stream.write("\n")
+            chunk = []
+    if chunk:
+        stream.write("\n".join(chunk))
+        stream.write("\n")
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    name TEXT NOT NULL,
+    UNIQUE (game_id, name)
+);
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER PRIMARY KEY,
+    version_id INTEGER NOT NULL REFERENCES versions(id),
+    map_name TEXT NOT NULL,
+    formatted_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS encounter_tables (
+    id INTEGER PRIMARY KEY,
+    location_id INTEGER NOT NULL REFERENCES locations(id),
+    encounter_type TEXT NOT NULL,
+    lucky_egg INTEGER NOT NULL,
+    traded INTEGER NOT NULL DEFAULT 0,
+    encounter_rate INTEGER NOT NULL,
+    expected_exp REAL NOT NULL,
+    efficiency REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    id INTEGER PRIMARY KEY,
+    table_id INTEGER NOT NULL REFERENCES encounter_tables(id),
+    slot INTEGER NOT NULL,
+    species TEXT NOT NULL,
+    min_level INTEGER NOT NULL,
+    max_level INTEGER NOT NULL,
+    probability REAL NOT NULL,
+    expected_exp REAL NOT NULL,
+    contribution REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS species (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    name TEXT NOT NULL,
+    constant TEXT NOT NULL,
+    base_exp INTEGER NOT NULL,
+    growth_rate TEXT NOT NULL,
+    PRIMARY KEY (game_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_tables_efficiency ON encounter_tables(efficiency);
+CREATE INDEX IF NOT EXISTS idx_tables_location ON encounter_tables(location_id);
+CREATE INDEX IF NOT EXISTS idx_slots_species ON slots(species);
+CREATE INDEX IF NOT EXISTS idx_slots_table ON slots(table_id);
+CREATE INDEX IF NOT EXISTS idx_locations_name ON locations(formatted_name);
+CREATE INDEX IF NOT EXISTS idx_locations_version ON locations(version_id);
+"""
+
+# Created after the migration below, since older databases lack the column
+SQLITE_SCENARIO_INDEX = "CREATE INDEX IF NOT EXISTS idx_tables_scenario ON encounter_tables(lucky_egg, traded)"
+
+
+def export_sqlite(
+    results: Dict[str, Dict],
+    path: str,
+    game_label: str,
+    lucky_egg: bool = False,
+    source: str = "",
+    traded: bool = False
+) -> int:
+    """
+    Export results to a normalized SQLite database.
+
+    Re-exporting the same game, Lucky Egg and traded setting replaces the
+    earlier rows (and any locations no scenario uses any more), so one
+    database can hold every game and scenario side by side. Species rows
+    are stored per game, from the imported species table when the results
+    carry one.
+    All inserts happen in a single transaction with executemany.
+
+    Returns:
+        Number of encounter tables written
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SQLITE_SCHEMA)
+        species_columns = {row[1] for row in conn.execute("PRAGMA table_info(species)")}
+        if "game_id" not in species_columns:
+            # Older databases kept one species table for every game: copy it to each game
+            with conn:
+                conn.execute("ALTER TABLE species RENAME TO species_shared")
+                conn.executescript(SQLITE_SCHEMA)
+                conn.execute("INSERT INTO species (game_id, name, constant, base_exp, growth_rate) "
+                             "SELECT g.id, s.name, s.constant, s.base_exp, s.growth_rate "
+                             "FROM species_shared s CROSS JOIN games g")
+                conn.execute("DROP TABLE species_shared")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(encounter_tables)")}
+        if "traded" not in columns:
+            conn.execute("ALTER TABLE encounter_tables ADD COLUMN traded INTEGER NOT NULL DEFAULT 0")
+        conn.execute(SQLITE_SCENARIO_INDEX)
+
+        species_table = next(
+            (data["species_table"] for data in results.values() if data.get("species_table")),
+            DEFAULT_SPECIES_TABLE
+        )
+        growth_rates = species_table["growth_rate"]
+
+        with conn:
+            cur = conn.cursor()
+            cur.execute("INSERT OR IGNORE INTO games (name, source) VALUES (?, ?)", (game_label, source))
+            cur.execute("UPDATE games SET source = ? WHERE name = ?", (source, game_label))
+            game_id = cur.execute("SELECT id FROM games WHERE name = ?", (game_label,)).fetchone()[0]
+
+            # Each game keeps its own species rows, so a romhack's changed base EXP
+            # and growth rates never overwrite another game's
+            cur.execute("DELETE FROM species WHERE game_id = ?", (game_id,))
+            cur.executemany(
+                "INSERT INTO species (game_id, name, constant, base_exp, growth_rate) VALUES (?, ?, ?, ?, ?)",
+                [(game_id, name.replace("SPECIES_", ""), name, base_exp, growth_rates.get(name, "medium_fast"))
+                 for name, base_exp in species_table["base_exp"].items()]
+            )
+
+            # Drop any earlier export of this game + Lucky Egg + traded scenario,
+            # then the locations and versions no remaining scenario refers to
+            stale = ("SELECT t.id FROM encounter_tables t JOIN locations l ON t.location_id = l.id "
+                     "JOIN versions v ON l.version_id = v.id "
+                     "WHERE v.game_id = ? AND t.lucky_egg = ? AND t.traded = ?")
+            scenario = (game_id, int(lucky_egg), int(traded))
+            cur.execute(f"DELETE FROM slots WHERE table_id IN ({stale})", scenario)
+            cur.execute(f"DELETE FROM encounter_tables WHERE id IN ({stale})", scenario)
+            cur.execute(
+                "DELETE FROM locations WHERE version_id IN (SELECT id FROM versions WHERE game_id = ?) "
+                "AND id NOT IN (SELECT location_id FROM encounter_tables)", (game_id,)
+            )
+            cur.execute(
+                "DELETE FROM versions WHERE game_id = ? AND id NOT IN (SELECT version_id FROM locations)",
+                (game_id,)
+            )
+
+            version_ids = {}
+            for name in sorted({data.get("version", "Unknown") for data in results.values()}):
+                cur.execute("INSERT OR IGNORE INTO versions (game_id, name) VALUES (?, ?)", (game_id, name))
+                version_ids[name] = cur.execute(
+                    "SELECT id FROM versions WHERE game_id = ? AND name = ?", (game_id, name)
+                ).fetchone()[0]
+
+            location_ids = {}
+            for row in cur.execute(
+                "SELECT l.id, l.map_name, v.name FROM locations l JOIN versions v ON l.version_id = v.id "
+                "WHERE v.game_id = ?", (game_id,)
+            ).fetchall():
+                location_ids[(row[1], row[2])] = row[0]
+
+            # Assign ids up front so every table can be written with one executemany
+            next_location_id = (cur.execute("SELECT MAX(id) FROM locations").fetchone()[0] or 0) + 1
+            next_table_id = (cur.execute("SELECT MAX(id) FROM encounter_tables").fetchone()[0] or 0) + 1
+            location_rows, table_rows, slot_rows = [], [], []
+
+            for key, data in sorted(results.items()):
+                version = data.get("version", "Unknown")
+                map_name = data.get("map_name", key)
+                location_id = location_ids.get((map_name, version))
+                if location_id is None:
+                    location_id = next_location_id
+                    next_location_id += 1
+                    location_ids[(map_name, version)] = location_id
+                    location_rows.append((location_id, version_ids[version], map_name,
+                                          data.get("formatted_name", key)))
+
+                for etype in ENCOUNTER_TYPES:
+                    if etype not in data:
+                        continue
+                    edata = data[etype]
+                    table_rows.append((next_table_id, location_id, etype, int(lucky_egg), int(traded),
+                                       edata.get("encounter_rate", 0), edata["expected_exp"],
+                                       edata.get("efficiency", 0)))
+                    for slot in edata.get("breakdown", []):
+                        slot_rows.append((next_table_id, slot["slot"], slot["species"], slot["min_level"],
+                                          slot["max_level"], slot["probability"], slot["expected_exp"],
+                                          slot["contribution"]))
+                    next_table_id += 1
+
+            cur.executemany(
+                "INSERT INTO locations (id, version_id, map_name, formatted_name) VALUES (?, ?, ?, ?)",
+                location_rows
+            )
+            cur.executemany(
+                "INSERT INTO encounter_tables (id, location_id, encounter_type, lucky_egg, traded, "
+                "encounter_rate, expected_exp, efficiency) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                table_rows
+            )
+            cur.executemany(
+                "INSERT INTO slots (table_id, slot, species, min_level, max_level, probability, "
+                "expected_exp, contribution) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                slot_rows
+            )
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    return len(table_rows)
+
+
+def build_result_columns(results: Dict[str, Dict], include_slots: bool = False) -> Tuple[Dict, Dict]:
+    """
+    Flatten results into typed columns (one row per location + encounter type).
+
+    Numeric columns are array.array buffers ('d' = float64, 'i' = int32),
+    text columns are plain lists. Row order matches generate_csv.
+
+    Returns:
+        Tuple of (table_columns, slot_columns); slot_columns is empty
+        unless include_slots is set. slot_columns["table_index"] points
+        back into the table rows.
+    """
+    from array import array
+
+    tables = {
+        "location": [], "map_name": [], "version": [], "encounter_type": [],
+        "expected_exp": array("d"), "encounter_rate": array("i"), "efficiency": array("d"),
+    }
+    slots = {}
+    if include_slots:
+        slots = {
+            "table_index": array("i"), "slot": array("i"), "species": [],
+            "min_level": array("i"), "max_level": array("i"), "probability": array("d"),
+            "expected_exp": array("d"), "contribution": array("d"),
+        }
+
+    row = 0
+    for key, data in sorted(results.items()):
+        for etype in ENCOUNTER_TYPES:
+            if etype not in data:
+                continue
+            edata = data[etype]
+            tables["location"].append(data.get("formatted_name", key))
+            tables["map_name"].append(data.get("map_name", key))
+            tables["version"].append(data.get("version", "Unknown"))
+            tables["encounter_type"].append(etype)
+            tables["expected_exp"].append(edata["expected_exp"])
+            tables["encounter_rate"].append(edata.get("encounter_rate", 0))
+            tables["efficiency"].append(edata.get("efficiency", 0))
+            if include_slots:
+                for slot in edata.get("breakdown", []):
+                    slots["table_index"].append(row)
+                    slots["slot"].append(slot["slot"])
+                    slots["species"].append(slot["species"])
+                    slots["min_level"].append(slot["min_level"])
+                    slots["max_level"].append(slot["max_level"])
+                    slots["probability"].append(slot["probability"])
+                    slots["expected_exp"].append(slot["expected_exp"])
+                    slots["contribution"].append(slot["contribution"])
+            row += 1
+
+    return tables, slots
+
+
+def _npy_bytes(column) -> bytes:
+    """Serialize one column in the .npy v1.0 format (no NumPy needed)."""
+    import sys
+
+    if isinstance(column, list):
+        width = max((len(value) for value in column), default=1) or 1
+        descr = f"<U{width}"
+        payload = b"".join(value.ljust(width, "\0").encode("utf-32-le") for value in column)
+        count = len(column)
+    else:
+        kind = "f" if column.typecode in "fd" else "i"
+        descr = f"<{kind}{column.itemsize}"
+        if sys.byteorder == "big":
+            column = column.__copy__()
+            column.byteswap()
+        payload = column.tobytes()
+        count = len(column)
+
+    return _npy_header(descr, (count,)) + payload
+
+
+def _npy_header(descr: str, shape: Tuple[int, ...]) -> bytes:
+    """Magic, version and padded header dict of a .npy v1.0 file."""
+    header = "{" + f"'descr': '{descr}', 'fortran_order': False, 'shape': {tuple(shape)}, " + "}"
+    # magic(6) + version(2) + header length(2) + header must be a multiple of 64
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = (header + " " * padding + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header
+
+
+def write_npz(path: str, tables: Dict, slots: Dict = None):
+    """
+    Write columns to a compressed NumPy .npz archive using only the stdlib.
+
+    np.load(path) yields one array per column; slot-level columns are
+    stored with a "slot_" prefix.
+    """
+    import zipfile
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, column in tables.items():
+            archive.writestr(f"{name}.npy", _npy_bytes(column))
+        for name, column in (slots or {}).items():
+            archive.writestr(f"slot_{name}.npy", _npy_bytes(column))
+
+
+def write_parquet(path: str, tables: Dict, slots: Dict = None):
+    """
+    Write columns to Parquet (requires pyarrow).
+
+    The slot-level table, if any, goes to a sibling file ending in
+    "_slots.parquet".
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def to_arrow(columns):
+        arrays = {}
+        for name, column in columns.items():
+            if isinstance(column, list):
+                arrays[name] = pa.array(column, type=pa.string())
+            elif column.typecode in "fd":
+                arrays[name] = pa.array(column, type=pa.float64())
+            else:
+                arrays[name] = pa.array(column, type=pa.int32())
+        return pa.table(arrays)
+
+    pq.write_table(to_arrow(tables), path)
+    if slots:
+        stem = path[:-len(".parquet")] if path.endswith(".parquet") else path
+        pq.write_table(to_arrow(slots), f"{stem}_slots.parquet")
+
+
+def parquet_available() -> bool:
+    """True if pyarrow can be imported."""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_columnar(results: Dict[str, Dict], path: str, include_slots: bool = False) -> int:
+    """
+    Export results in a typed columnar binary format chosen by extension.
+
+    ".parquet" uses pyarrow (must be installed); anything else is written
+    as a NumPy-loadable ".npz", which needs no third-party packages.
+
+    Returns:
+        Number of table rows written
+    """
+    tables, slots = build_result_columns(results, include_slots)
+    if path.endswith(".parquet"):
+        write_parquet(path, tables, slots)
+    else:
+        write_npz(path, tables, slots)
+    return len(tables["location"])
+
+
+# =============================================================================
+# EXPORT FAN-OUT (one pass over the results, every format)
+# =============================================================================
+# export_fanout walks a results snapshot once and hands each location to
+# every requested sink, which keeps only what its format needs: rendered
+# report lines grouped by version, CSV rows, or a running top-N heap per
+# encounter type. Sinks then emit their text in chunks to buffered files,
+# optionally through one writer thread per file so disk writes overlap
+# rendering. Every file is written under a temporary name and renamed into
+# place only after all sinks finished, so a set of exports always comes
+# from the same snapshot and a failed run leaves the previous files alone.
+EXPORT_FORMATS = {
+    "report": "_Exp_Report.txt",
+    "rankings": "_Rankings.txt",
+    "csv": "_Exp_Rates.csv",
+    "columnar": "_Exp_Rates.npz",
+}
+EXPORT_BUFFER_BYTES = 1 << 16
+# Chunks a writer thread may fall behind before rendering waits for it
+EXPORT_QUEUE_CHUNKS = 64
+
+
+def _lines_text(lines: Iterable[str]) -> str:
+    """Lines as newline-terminated text (the same text write_lines writes)."""
+    lines = list(lines)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def _chunk_texts(texts: Iterable[str], chunk_bytes: int = EXPORT_BUFFER_BYTES) -> Iterator[str]:
+    """Group text pieces into chunks of about chunk_bytes characters."""
+    chunk, size = [], 0
+    for text in texts:
+        chunk.append(text)
+        size += len(text)
+        if size >= chunk_bytes:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def _report_sink(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Location report: text rendered per location, ordered by version and name at the end."""
+    verbose = options.get("verbose", False)
+    by_version = defaultdict(list)
+    generations = set()
+
+    def visit(key, data):
+        generations.add(data.get("generation", 3))
+        by_version[data.get("version", "Unknown")].append(
+            (data.get("formatted_name", ""), _lines_text(_iter_location_report_lines(key, data, verbose))))
+
+    def finish(snapshot):
+        def texts():
+            yield _lines_text(_iter_report_header(options.get("lucky_egg", False), options.get("game"),
+                                                  options.get("lead_level"), options.get("lead_ability"),
+                                                  min(generations, default=3)))
+            for version in _report_version_order(by_version):
+                yield _lines_text(_iter_version_heading(version))
+                for _, text in sorted(by_version[version], key=lambda entry: entry[0]):
+                    yield text
+        return _chunk_texts(texts())
+
+    return {"visit": visit, "finish": finish}
+
+
+def _rankings_sink(options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Efficiency rankings: a bounded heap per encounter type, filled during the walk.
+
+    Tables with any of options["blocked_attributes"] are left out, as
+    filter_results leaves them out of the on-screen rankings.
+    """
+    import heapq
+
+    top_n, weights = options.get("top_n", 15), options.get("weights")
+    blocked = options.get("blocked_attributes", 0)
+    heaps = {etype: [] for etype in ENCOUNTER_TYPES}
+    seen = {etype: 0 for etype in ENCOUNTER_TYPES}
+
+    def visit(key, data):
+        location_mask = data.get("attributes", 0)
+        for etype in ENCOUNTER_TYPES:
+            if etype in data and not (location_mask | ENCOUNTER_TYPE_ATTRIBUTES.get(etype, 0)) & blocked:
+                # -seen keeps earlier locations ahead on ties, as heapq.nlargest does
+                entry = (calculate_objective_score(data[etype], weights), -seen[etype], key, data)
+                seen[etype] += 1
+                if len(heaps[etype]) < top_n:
+                    heapq.heappush(heaps[etype], entry)
+                elif top_n > 0:
+                    heapq.heappushpop(heaps[etype], entry)
+
+    def finish(snapshot):
+        def texts():
+            yield _lines_text(_iter_summary_header(weights))
+            for etype in ENCOUNTER_TYPES:
+                top = [(key, data) for _, _, key, data in sorted(heaps[etype], reverse=True)]
+                yield _lines_text(_iter_summary_section(etype, top, weights))
+        return _chunk_texts(texts())
+
+    return {"visit": visit, "finish": finish}
+
+
+def _csv_sink(options: Dict[str, Any]) -> Dict[str, Any]:
+    """CSV: rows collected per location, written in key order."""
+    import csv
+    import io
+
+    rows = []
+
+    def visit(key, data):
+        rows.append((key, list(_location_csv_rows(key, data))))
+
+    def finish(snapshot):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(CSV_HEADER)
+        for _, location_rows in sorted(rows, key=lambda entry: entry[0]):
+            writer.writerows(location_rows)
+            if buffer.tell() >= EXPORT_BUFFER_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    # The csv module does its own line endings
+    return {"visit": visit, "finish": finish, "newline": ""}
+
+
+def _columnar_sink(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Columnar binary: written from the snapshot by export_columnar (not a text stream)."""
+    def finish(snapshot, partial, path):
+        export_columnar(snapshot, partial, options.get("include_slots", False))
+        # Parquet puts slots in a sibling file, which is renamed along with it
+        if partial.endswith(".parquet") and options.get("include_slots", False):
+            return [(f"{partial[:-len('.parquet')]}_slots.parquet", f"{path[:-len('.parquet')]}_slots.parquet")]
+        return []
+
+    return {"visit": None, "finish": finish, "binary": True}
+
+
+EXPORT_SINKS = {
+    "report": _report_sink,
+    "rankings": _rankings_sink,
+    "csv": _csv_sink,
+    "columnar": _columnar_sink,
+}
+
+
+def _partial_path(path: str) -> str:
+    """Temporary name for path, keeping the extension (export_columnar reads it)."""
+    import os
+
+    base, ext = os.path.splitext(path)
+    return f"{base}.partial{ext}"
+
+
+def _sink_writer(path: str, threaded: bool, newline: str = None) -> Tuple[Callable[[str], None], Callable[[], None]]:
+    """
+    (write, close) for a buffered text file, optionally fed through a writer thread.
+
+    close() raises the first error the writer thread hit.
+    """
+    stream = open(path, "w", buffering=EXPORT_BUFFER_BYTES, newline=newline)
+    if not threaded:
+        return stream.write, stream.close
+
+    import queue
+    import threading
+
+    chunks = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    errors = []
+
+    def drain():
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            # After an error keep draining so the producer never blocks
+            if not errors:
+                try:
+                    stream.write(chunk)
+                except OSError as e:
+                    errors.append(e)
+        try:
+            stream.close()
+        except OSError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=drain, name=f"export:{path}", daemon=True)
+    thread.start()
+
+    def close():
+        chunks.put(None)
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    return chunks.put, close
+
+
+def scenario_export_prefix(game_label: str, lucky_egg: bool, traded: bool) -> str:
+    """File name stem for one scenario's exports, e.g. Emerald_LuckyEgg_Traded."""
+    return f"{game_label}{'_LuckyEgg' if lucky_egg else ''}{'_Traded' if traded else ''}"
+
+
+def export_fanout(
+    results: Dict[str, Dict],
+    outputs: Dict[str, str],
+    options: Dict[str, Any] = None,
+    threaded: bool = False
+) -> Dict[str, str]:
+    """
+    Write several export formats from one pass over the results.
+
+    Args:
+        outputs: {format: path}, formats from EXPORT_SINKS
+        options: Renderer settings - verbose, lucky_egg, game, lead_level,
+            lead_ability (report), top_n, weights (rankings), include_slots
+            (columnar)
+        threaded: Give every text file its own writer thread
+
+    Returns:
+        The outputs written, {format: path}
+
+    Raises:
+        ValueError: for an unknown format; OSError from any sink (no
+            output is replaced then)
+    """
+    import os
+
+    options = options or {}
+    for name in outputs:
+        if name not in EXPORT_SINKS:
+            raise ValueError(f"Unknown export format '{name}' (expected one of {', '.join(EXPORT_SINKS)})")
+
+    # One snapshot feeds every sink; results objects are never modified,
+    # so the item list is all the isolation the pass needs
+    snapshot = dict(results)
+    sinks = {name: EXPORT_SINKS[name](options) for name in outputs}
+    visitors = [sink["visit"] for sink in sinks.values() if sink["visit"]]
+    for key, data in snapshot.items():
+        for visit in visitors:
+            visit(key, data)
+
+    partials = {name: _partial_path(path) for name, path in outputs.items()}
+    renames = [(partials[name], path) for name, path in outputs.items()]
+    try:
+        writers = {}
+        try:
+            for name, sink in sinks.items():
+                if not sink.get("binary"):
+                    writers[name] = _sink_writer(partials[name], threaded, sink.get("newline"))
+            for name, sink in sinks.items():
+                if sink.get("binary"):
+                    renames.extend(sink["finish"](snapshot, partials[name], outputs[name]))
+                else:
+                    write = writers[name][0]
+                    for chunk in sink["finish"](snapshot):
+                        write(chunk)
+        finally:
+            # Close every writer (joining its thread) even when a sink failed
+            close_errors = []
+            for write, close in writers.values():
+                try:
+                    close()
+                except OSError as e:
+                    close_errors.append(e)
+            if close_errors:
+                raise close_errors[0]
+    except BaseException:
+        for partial, _ in renames:
+            if os.path.exists(partial):
+                os.remove(partial)
+        raise
+
+    for partial, path in renames:
+        os.replace(partial, path)
+    return dict(outputs)
+
+
+# =============================================================================
+# JOB SCHEDULER (chunked, checkpointed, resumable)
+# =============================================================================
+# Long sweeps are split into chunks that run on a process pool. Each
+# finished chunk is pickled to <checkpoint_dir>/<job>_<hash>/chunk_NNNNNN.pkl.
+# The hash covers the job name and every chunk's arguments, so rerunning the
+# same job finds its checkpoints and only computes what is missing, while a
+# changed input starts a new job. Results reach the caller's consume(index,
+# result) in chunk order, whatever order they finish in. Checkpointed
+# results wait on disk rather than in memory. The job folder is removed once
+# every chunk has been consumed.
+JOB_CHECKPOINT_DIR = "Job_Checkpoints"
+
+# Bump when a job's chunk layout changes so older checkpoints are ignored
+JOB_CHECKPOINT_FORMAT = 1
+
+
+def _job_chunk_path(job_dir: str, index: int) -> str:
+    import os
+
+    return os.path.join(job_dir, f"chunk_{index:06d}.pkl")
+
+
+def _ignore_interrupts():
+    """Pool initializer: Ctrl+C is handled by the parent, not by each worker."""
+    import signal
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def print_job_progress(name: str) -> Callable[[int, int, int, float], None]:
+    """Progress callback that keeps one status line updated on stdout."""
+    import sys
+
+    def report(finished: int, total: int, resumed: int, elapsed: float):
+        computed = finished - resumed
+        rate = computed / elapsed if elapsed > 0 else 0.0
+        eta = f"{(total - finished) / rate:.0f}s" if rate else "?"
+        line = f"\r{name}: {finished}/{total} chunks ({finished * 100 // max(total, 1)}%)"
+        if resumed:
+            line += f", {resumed} resumed"
+        sys.stdout.write(f"{line}, {rate:.2f} chunks/s, ETA {eta}   ")
+        if finished == total:
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+
+    return report
+
+
+def run_job(
+    name: str,
+    chunks: List[Any],
+    worker: Callable[[Any], Any],
+    consume: Callable[[int, Any], None],
+    checkpoint_dir: str = None,
+    workers: int = None,
+    progress: Callable[[int, int, int, float], None] = None
+) -> Optional[str]:
+    """
+    Run worker(chunk) for every chunk and hand the results to consume in order.
+
+    Args:
+        name: Job type, part of the checkpoint folder name
+        chunks: Picklable worker arguments, one per chunk
+        worker: Top-level function (the process pool pickles it by name)
+        consume: Called as consume(index, result) for chunk 0, 1, 2, ...
+        checkpoint_dir: Where to checkpoint finished chunks; None keeps them
+            in memory only (nothing to resume)
+        progress: Called as progress(finished, total, resumed, elapsed) after
+            every chunk, and once up front
+
+    Returns:
+        The job's checkpoint folder (already removed), or None.
+
+    A KeyboardInterrupt stops handing out chunks, saves the ones already
+    running and propagates. Chunks finished by then stay checkpointed, so
+    calling again with the same arguments resumes.
+    """
+    import hashlib
+    import os
+    import pickle
+    import shutil
+    import time
+
+    total = len(chunks)
+    job_dir = None
+    completed = set()
+    if checkpoint_dir:
+        digest = hashlib.sha256(pickle.dumps((name, JOB_CHECKPOINT_FORMAT, chunks), protocol=4)).hexdigest()
+        job_dir = os.path.join(checkpoint_dir, f"{name}_{digest[:16]}")
+        os.makedirs(job_dir, exist_ok=True)
+        completed = {i for i in range(total) if os.path.exists(_job_chunk_path(job_dir, i))}
+    resumed = len(completed)
+    held = {}
+    state = {"next": 0}
+    start = time.perf_counter()
+
+    def deliver():
+        while state["next"] < total and state["next"] in completed:
+            i = state["next"]
+            if i in held:
+                result = held.pop(i)
+            else:
+                with open(_job_chunk_path(job_dir, i), "rb") as f:
+                    result = pickle.load(f)
+            consume(i, result)
+            state["next"] += 1
+
+    def finish(i, result):
+        if job_dir:
+            # Write then rename, so a crash never leaves a torn checkpoint
+            partial = _job_chunk_path(job_dir, i) + ".partial"
+            with open(partial, "wb") as f:
+                pickle.dump(result, f, protocol=4)
+            os.replace(partial, _job_chunk_path(job_dir, i))
+        else:
+            held[i] = result
+        completed.add(i)
+        if progress:
+            progress(len(completed), total, resumed, time.perf_counter() - start)
+        deliver()
+
+    if progress:
+        progress(resumed, total, resumed, 0.0)
+    deliver()
+
+    pending = [i for i in range(total) if i not in completed]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool = None
+    if workers > 1 and len(pending) > 1:
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_ignore_interrupts)
+        except (OSError, NotImplementedError):
+            # No process support (restricted sandboxes, frozen apps): the job runs serially
+            pool = None
+    if pool is not None:
+        with pool:
+            # Only a couple of chunks per worker are in flight at a time
+            queue = iter(pending)
+            running = {}
+            try:
+                for i in queue:
+                    running[pool.submit(worker, chunks[i])] = i
+                    if len(running) >= 2 * workers:
+                        break
+            except OSError:
+                # Worker processes could not be started: the job runs serially
+                for future in running:
+                    future.cancel()
+                running = {}
+            try:
+                while running:
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(running.pop(future), future.result())
+                        i = next(queue, None)
+                        if i is not None:
+                            running[pool.submit(worker, chunks[i])] = i
+            except KeyboardInterrupt:
+                # Drop what has not started; save what is already running
+                for future in running:
+                    future.cancel()
+                for future in wait(running)[0]:
+                    if not future.cancelled() and future.exception() is None:
+                        finish(running[future], future.result())
+                raise
+            except BrokenProcessPool:
+                # A worker process died (killed, out of memory): the rest runs serially.
+                # Errors raised by the worker itself or by a checkpoint write propagate.
+                pass
+    for i in pending:
+        if i not in completed:
+            finish(i, worker(chunks[i]))
+
+    if job_dir:
+        shutil.rmtree(job_dir, ignore_errors=True)
+    return job_dir
+
+
+def _sweep_worker(args: Tuple[str, str, Optional[str], Optional[str], str, bool, bool, Optional[str]]
+                  ) -> Tuple[Dict[str, Dict], Dict[str, int]]:
+    """Process pool entry point: one encounter file under one (lucky_egg, traded) setting."""
+    path, _digest, _species_hash, _trainer_hash, _attributes_hash, lucky_egg, traded, game_filter = args
+    with open(path, "r") as f:
+        data = prepare_encounter_data(json.load(f), path)
+    unknown_species = {}
+    results = process_encounters(data, lucky_egg, game_filter, traded, unknown_species)
+    return results, unknown_species
+
+
+def sweep_encounters(
+    paths: List[str],
+    game_filter: str = None,
+    scenarios: List[Tuple[bool, bool]] = None,
+    checkpoint_dir: str = None,
+    workers: int = None,
+    progress: Callable[[int, int, int, float], None] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    process_encounters for every file x (lucky_egg, traded) scenario as a job.
+
+    Each chunk is one file under one scenario. Chunks carry hashes of
+    their file and of the species, trainer and attribute sources it
+    resolves to, so editing any of them invalidates its checkpoints. A
+    generation without a Lucky Egg skips the Lucky Egg scenarios.
+
+    Returns:
+        {path: {"scenarios": {(lucky_egg, traded): results}, "unknown_species": {species: slots}}}
+    """
+    import hashlib
+
+    if scenarios is None:
+        scenarios = SCENARIO_MODIFIERS
+    chunks = []
+    for path in paths:
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        # The sources the file names are part of what a checkpoint saw
+        data = prepare_encounter_data(json.loads(raw), path)
+        species_hash = (data.get("species_table") or {}).get("hash")
+        trainer_hash = (data.get("trainer_data") or {}).get("hash")
+        attributes_hash = hashlib.sha256(json.dumps(data.get("location_attributes"),
+                                                    sort_keys=True).encode()).hexdigest()
+        eggs = lucky_egg_settings(data)
+        chunks.extend((path, digest, species_hash, trainer_hash, attributes_hash, lucky_egg, traded, game_filter)
+                      for lucky_egg, traded in scenarios if lucky_egg in eggs)
+
+    swept = {path: {"scenarios": {}, "unknown_species": {}} for path in paths}
+
+    def consume(i, result):
+        path, _, _, _, _, lucky_egg, traded, _ = chunks[i]
+        results, unknown_species = result
+        swept[path]["scenarios"][(lucky_egg, traded)] = results
+        # Every scenario sees the same slots; keep one count per species
+        swept[path]["unknown_species"].update(unknown_species)
+
+    run_job("process_encounters", chunks, _sweep_worker, consume, checkpoint_dir, workers, progress)
+    return swept
+
+
+# =============================================================================
+# PRECOMPUTED BATTLES-NEEDED TABLE
+# =============================================================================
+# A uint32 .npy array of shape (lucky_egg, growth_rate, level_pair, table):
+# the battles calculate_battles_needed gives from the start of level s to
+# level t (1 <= s < t <= 100) at each (location, encounter type). The table
+# axis is last so every spot for one question is contiguous. A JSON index
+# next to it (<path>.index.json) names the axes. Load with
+# np.load(path, mmap_mode="r") or load_battle_table (stdlib mmap).
+BATTLE_TABLE_LEVELS = 100
+BATTLE_TABLE_UNREACHABLE = 0xFFFFFFFF
+
+
+def battle_table_pair_index(start_level: int, target_level: int) -> int:
+    """Row of (start, target) among all 1 <= start < target <= 100 pairs."""
+    before = (start_level - 1) * BATTLE_TABLE_LEVELS - (start_level - 1) * start_level // 2
+    return before + target_level - start_level - 1
+
+
+def battle_table_index_path(path: str) -> str:
+    """Path of the JSON index that describes a battles table."""
+    return f"{path}.index.json"
+
+
+def _battle_table_worker(args: Tuple[str, List[float]]) -> bytes:
+    """Battles for one growth rate: every level pair x every table, as uint32 bytes."""
+    from array import array
+    import sys
+
+    growth_rate, table_exp = args
+    func = GROWTH_RATE_FUNCTIONS[growth_rate]
+    total_exp = [0] + [func(level) for level in range(1, BATTLE_TABLE_LEVELS + 1)]
+    block = array("I")
+    for start in range(1, BATTLE_TABLE_LEVELS):
+        for target in range(start + 1, BATTLE_TABLE_LEVELS + 1):
+            exp_needed = max(0, total_exp[target] - total_exp[start])
+            block.extend(math.ceil(exp_needed / exp) if exp > 0 else BATTLE_TABLE_UNREACHABLE
+                         for exp in table_exp)
+    if sys.byteorder == "big":
+        block.byteswap()
+    return block.tobytes()
+
+
+def build_battle_table(
+    results_by_lucky_egg: Dict[bool, Dict[str, Dict]],
+    path: str,
+    traded: bool = False,
+    game: str = None,
+    workers: int = None,
+    checkpoint_dir: str = None,
+    progress: Callable[[int, int, int, float], None] = None
+) -> Dict[str, Any]:
+    """
+    Precompute expected battles for every growth rate x level pair x table.
+
+    One chunk per (Lucky Egg setting, growth rate) runs through run_job;
+    blocks are written in order as they arrive.
+
+    Args:
+        results_by_lucky_egg: {lucky_egg: results}, e.g. {False: ..., True: ...}
+            from get_scenario_results; include one key to build a single setting
+        path: Output .npy path (the index goes to <path>.index.json)
+        traded, game: Recorded in the index so lookups can check they match
+        checkpoint_dir, progress: See run_job; with a checkpoint_dir an
+            interrupted build resumes where it stopped
+
+    Returns:
+        The index dict written next to the table.
+    """
+    lucky_egg_settings = sorted(results_by_lucky_egg)
+    base = results_by_lucky_egg[lucky_egg_settings[0]]
+    tables = [(key, etype) for key, data in base.items() for etype in ENCOUNTER_TYPES if etype in data]
+    growth_rates = list(GROWTH_RATE_FUNCTIONS)
+
+    jobs = []
+    for lucky_egg in lucky_egg_settings:
+        results = results_by_lucky_egg[lucky_egg]
+        table_exp = [results[key][etype]["expected_exp"] for key, etype in tables]
+        jobs.extend((growth_rate, table_exp) for growth_rate in growth_rates)
+
+    pairs = BATTLE_TABLE_LEVELS * (BATTLE_TABLE_LEVELS - 1) // 2
+    shape = (len(lucky_egg_settings), len(growth_rates), pairs, len(tables))
+
+    with open(path, "wb") as f:
+        f.write(_npy_header("<u4", shape))
+        run_job("battle_table", jobs, _battle_table_worker, lambda i, block: f.write(block),
+                checkpoint_dir, workers, progress)
+
+    index = {
+        "shape": list(shape),
+        "lucky_egg": list(lucky_egg_settings),
+        "traded": traded,
+        "game": game,
+        "growth_rates": growth_rates,
+        "levels": BATTLE_TABLE_LEVELS,
+        "tables": [list(table) for table in tables],
+    }
+    with open(battle_table_index_path(path), "w") as f:
+        json.dump(index, f)
+    return index
+
+
+def load_battle_table(path: str) -> Dict[str, Any]:
+    """
+    Memory-map a battles table written by build_battle_table.
+
+    Returns:
+        The index plus "values" (a uint32 memoryview over the mapped file)
+        and "table_index" ({(location_key, etype): column}).
+    """
+    import mmap
+    import sys
+
+    with open(battle_table_index_path(path), "r") as f:
+        index = json.load(f)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header_len = int.from_bytes(mapped[8:10], "little")
+    if sys.byteorder == "big":
+        raise RuntimeError("memory-mapped battle tables need a little-endian machine")
+    index["values"] = memoryview(mapped)[10 + header_len:].cast("I")
+    index["table_index"] = {tuple(table): i for i, table in enumerate(index["tables"])}
+    return index
+
+
+def lookup_battles(
+    battle_table: Dict[str, Any],
+    species: str,
+    start_level: int,
+    target_level: int,
+    location_key: str,
+    etype: str,
+    lucky_egg: bool = False,
+    species_table: Dict[str, Dict] = None
+) -> Optional[int]:
+    """
+    Expected battles from the start of start_level to target_level - one array read.
+
+    Returns:
+        Battles, float('inf') if the spot gives no EXP, or None when the
+        question is outside the table (unknown spot, Lucky Egg setting not
+        built, levels out of range).
+    """
+    column = battle_table["table_index"].get((location_key, etype))
+    if column is None or lucky_egg not in battle_table["lucky_egg"]:
+        return None
+    if not 1 <= start_level < target_level <= battle_table["levels"]:
+        return 0 if 1 <= target_level <= start_level <= battle_table["levels"] else None
+
+    growth_rate = (species_table or DEFAULT_SPECIES_TABLE)["growth_rate"].get(species, "medium_fast")
+    _, num_rates, num_pairs, num_tables = battle_table["shape"]
+    offset = ((battle_table["lucky_egg"].index(lucky_egg) * num_rates
+               + battle_table["growth_rates"].index(growth_rate)) * num_pairs
+              + battle_table_pair_index(start_level, target_level)) * num_tables + column
+    battles = battle_table["values"][offset]
+    return float('inf') if battles == BATTLE_TABLE_UNREACHABLE else battles
+
+
+# =============================================================================
+# DATASET DIFF (hash join on version + map + encounter type)
+# =============================================================================
+# Two result sets (two versions of one file, or vanilla vs an edited file)
+# are joined on (version, map, encounter type). When each side holds a
+# single version (Ruby vs Sapphire) the version is left out of the key, so
+# the two versions' maps join each other; any other pairing of versions is
+# ambiguous and has to be narrowed to one version first. Each table is reduced to a hash of
+# everything its EXP depends on - generation, encounter rate, (species, level
+# range, probability, base EXP) per slot and the map's trainer EXP - so
+# matching tables are recognized by one comparison and only tables whose
+# hashes differ are compared slot by slot.
+#
+# Two files are diffed before any EXP is computed: raw_table_hashes hashes
+# the same inputs straight from each file's *_mons tables, identical files
+# stop there, and only the after side's maps with a changed table are
+# processed. The before side is processed whole, for the ranks.
+
+def table_content_hash(edata: Dict[str, Any], location: Dict[str, Any] = None) -> str:
+    """Stable hash of an encounter table's rate and slots plus its location's generation and trainer EXP."""
+    import hashlib
+
+    location = location or {}
+    base_exp_table = (location.get("species_table") or DEFAULT_SPECIES_TABLE)["base_exp"]
+    content = [location.get("generation", 3), edata.get("encounter_rate", 0), location.get("trainer_exp", 0)]
+    content.extend((slot["species"], slot["min_level"], slot["max_level"], repr(slot["probability"]),
+                    base_exp_table.get(f"SPECIES_{slot['species']}", 50))
+                   for slot in edata["breakdown"])
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+
+def raw_table_hashes(
+    data: Dict,
+    game_filter: str = None,
+    by_version: bool = True,
+    unknown_species: Dict[str, int] = None
+) -> Dict[Tuple[Optional[str], str, str], str]:
+    """
+    Hash every encounter table of a prepared file without computing any EXP.
+
+    Each hash covers the generation, the encounter rate, every slot's
+    species, level range, rate and base EXP, and the species and levels of
+    the map's trainers. Species missing from the species table are counted
+    into unknown_species when given, as process_encounters does.
+
+    Returns:
+        {(version, map_name, etype): hash}, version None without by_version
+    """
+    import hashlib
+
+    if unknown_species is None:
+        unknown_species = {}
+    generation = get_generation_engine(data)["generation"]
+    species_table = data.get("species_table")
+    trainer_data = data.get("trainer_data")
+    table_rates = _table_rates(data)
+    hashes = {}
+    for encounter, map_name, version in _iter_map_encounters(data, game_filter):
+        trainers = []
+        if trainer_data:
+            trainers = [(species, level, _lookup_base_exp(species, species_table, unknown_species))
+                        for name in trainer_data["maps"].get(map_name, [])
+                        for species, level in trainer_data["trainers"][name]["party"]]
+        for etype, mons, rates, indices, enc_rate in _iter_encounter_tables(encounter, table_rates):
+            picked = zip(mons, rates) if indices is None else ((mons[i], rates[i]) for i in indices)
+            content = [generation, enc_rate, trainers]
+            content.extend((mon["species"], mon["min_level"], mon["max_level"], rate,
+                            _lookup_base_exp(mon["species"], species_table, unknown_species))
+                           for mon, rate in picked)
+            join_key = (version if by_version else None, map_name, etype)
+            hashes[join_key] = hashlib.sha1(repr(content).encode()).hexdigest()
+    return hashes
+
+
+def _result_versions(results: Dict[str, Dict]) -> Set[str]:
+    """Versions present in a result set."""
+    return {data.get("version", "Unknown") for data in results.values()}
+
+
+def _join_by_version(before_versions: Set[str], after_versions: Set[str]) -> bool:
+    """
+    Whether a diff joins on version as well (see the section comment).
+
+    Raises:
+        ValueError: if the sides hold different sets of versions and are
+            not one version each
+    """
+    by_version = len(before_versions) > 1 or len(after_versions) > 1
+    if by_version and before_versions != after_versions:
+        raise ValueError(f"Cannot pair versions {', '.join(sorted(before_versions))} with "
+                         f"{', '.join(sorted(after_versions))}; pick one version on each side")
+    return by_version
+
+
+def _rank_table_entries(index: Dict[Tuple[Optional[str], str, str], Dict[str, Any]]):
+    """Set each entry's 1-based efficiency rank among tables of its type and version."""
+    by_type = defaultdict(list)
+    for (version, _, etype), entry in index.items():
+        by_type[(version, etype)].append(entry)
+    for (_, etype), entries in by_type.items():
+        entries.sort(key=lambda entry: (-entry["location"][etype].get("efficiency", 0),
+                                        entry["location"].get("formatted_name", entry["key"])))
+        for rank, entry in enumerate(entries, 1):
+            entry["rank"] = rank
+
+
+def index_result_tables(results: Dict[str, Dict],
+                        by_version: bool = True) -> Dict[Tuple[Optional[str], str, str], Dict[str, Any]]:
+    """
+    Build the join side for one result set.
+
+    Args:
+        by_version: Key tables by their version; without it the version is
+            None, which only identifies a table within a single version
+
+    Returns:
+        {(version, map_name, etype): {"hash", "key", "location", "rank"}}
+        where rank is the table's 1-based efficiency rank among tables of
+        its type and version.
+    """
+    index = {}
+    for key, data in results.items():
+        version = data.get("version", "Unknown") if by_version else None
+        map_name = data.get("map_name", key)
+        for etype in ENCOUNTER_TYPES:
+            if etype in data:
+                index[(version, map_name, etype)] = {"hash": table_content_hash(data[etype], data),
+                                                     "key": key, "location": data}
+    # Without by_version each side holds a single version, so the join key
+    # groups the ranks the same way
+    _rank_table_entries(index)
+    return index
+
+
+def _slot_label(slot: Dict[str, Any]) -> str:
+    """Slot as shown in diffs: species, level range and probability."""
+    return (f"{slot['species']} Lv{slot['min_level']}-{slot['max_level']} "
+            f"({slot['probability'] * 100:.1f}%)")
+
+
+def diff_results(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Any]:
+    """
+    Diff two result sets by hash join on (version, map, encounter type).
+
+    Sides holding one version each are joined on (map, encounter type)
+    alone, which is what compares Ruby with Sapphire.
+
+    Returns:
+        Dict with "added" and "removed" ((version, map_name, etype,
+        formatted_name) lists, version None for a single-version join),
+        "changed" (per table: exp/efficiency before, after and delta, rank
+        before/after, and changed slots as (slot, before, after) labels)
+        sorted by largest efficiency change, and "unchanged" (count of
+        tables with identical content).
+
+    Raises:
+        ValueError: if the sides hold different sets of versions and are
+            not one version each
+    """
+    by_version = _join_by_version(_result_versions(before), _result_versions(after))
+    return _join_table_indexes(index_result_tables(before, by_version), index_result_tables(after, by_version))
+
+
+def diff_encounter_data(
+    before: Dict,
+    after: Dict,
+    before_game: str = None,
+    after_game: str = None,
+    lucky_egg: bool = False,
+    traded: bool = False,
+    before_unknown: Dict[str, int] = None,
+    after_unknown: Dict[str, int] = None
+) -> Dict[str, Any]:
+    """
+    Diff two prepared encounter files for one scenario without scenario cubes.
+
+    Raw tables are hashed first (raw_table_hashes), so identical files stop
+    there. Otherwise the before side is processed once and the after side
+    only for maps holding a changed or added table; its unchanged tables
+    rank with the before side's values, which matching hashes guarantee
+    are the same. before_unknown / after_unknown collect each side's
+    unknown species.
+
+    Returns:
+        Same shape as diff_results.
+
+    Raises:
+        ValueError: as diff_results
+    """
+    by_version = _join_by_version({version for _, _, version in _iter_map_encounters(before, before_game)},
+                                  {version for _, _, version in _iter_map_encounters(after, after_game)})
+    left_hashes = raw_table_hashes(before, before_game, by_version, before_unknown)
+    right_hashes = raw_table_hashes(after, after_game, by_version, after_unknown)
+    if left_hashes == right_hashes:
+        return {"added": [], "removed": [], "changed": [], "unchanged": len(left_hashes)}
+
+    changed_maps = {map_name for (version, map_name, etype), digest in right_hashes.items()
+                    if left_hashes.get((version, map_name, etype)) != digest}
+    left = index_result_tables(process_encounters(before, lucky_egg, before_game, traded), by_version)
+    right = index_result_tables(process_encounters(after, lucky_egg, after_game, traded, maps=changed_maps),
+                                by_version)
+    for index, hashes in ((left, left_hashes), (right, right_hashes)):
+        for join_key, entry in index.items():
+            entry["hash"] = hashes[join_key]
+    for join_key, digest in right_hashes.items():
+        if join_key not in right:
+            # Every table of an unprocessed map matched the before side
+            right[join_key] = dict(left[join_key], hash=digest)
+    _rank_table_entries(right)
+    return _join_table_indexes(left, right)
+
+
+def _join_table_indexes(left: Dict[Tuple[Optional[str], str, str], Dict[str, Any]],
+                        right: Dict[Tuple[Optional[str], str, str], Dict[str, Any]]) -> Dict[str, Any]:
+    """Hash join two index_result_tables sides into a diff_results report."""
+    diff = {"added": [], "removed": [], "changed": [], "unchanged": 0}
+
+    for join_key, old in left.items():
+        new = right.get(join_key)
+        version, map_name, etype = join_key
+        if new is None:
+            diff["removed"].append((version, map_name, etype, old["location"].get("formatted_name", map_name)))
+            continue
+        if new["hash"] == old["hash"]:
+            diff["unchanged"] += 1
+            continue
+
+        old_t, new_t = old["location"][etype], new["location"][etype]
+        old_slots, new_slots = old_t["breakdown"], new_t["breakdown"]
+        slot_changes = []
+        for i in range(max(len(old_slots), len(new_slots))):
+            old_label = _slot_label(old_slots[i]) if i < len(old_slots) else None
+            new_label = _slot_label(new_slots[i]) if i < len(new_slots) else None
+            if old_label != new_label:
+                slot_changes.append((i, old_label, new_label))
+        diff["changed"].append({
+            "version": version,
+            "map_name": map_name,
+            "etype": etype,
+            "formatted_name": new["location"].get("formatted_name", map_name),
+            "exp_before": old_t["expected_exp"],
+            "exp_after": new_t["expected_exp"],
+            "exp_delta": new_t["expected_exp"] - old_t["expected_exp"],
+            "efficiency_before": old_t.get("efficiency", 0),
+            "efficiency_after": new_t.get("efficiency", 0),
+            "efficiency_delta": new_t.get("efficiency", 0) - old_t.get("efficiency", 0),
+            "rate_before": old_t.get("encounter_rate", 0),
+            "rate_after": new_t.get("encounter_rate", 0),
+            "rank_before": old["rank"],
+            "rank_after": new["rank"],
+            "slot_changes": slot_changes,
+        })
+
+    for join_key, new in right.items():
+        if join_key not in left:
+            version, map_name, etype = join_key
+            diff["added"].append((version, map_name, etype, new["location"].get("formatted_name", map_name)))
+
+    diff["added"].sort(key=lambda entry: (entry[0] or "",) + entry[1:])
+    diff["removed"].sort(key=lambda entry: (entry[0] or "",) + entry[1:])
+    diff["changed"].sort(key=lambda change: -abs(change["efficiency_delta"]))
+    return diff
+
+
+def iter_diff_lines(diff: Dict[str, Any], before_label: str = "before", after_label: str = "after",
+                    verbose: bool = False) -> Iterator[str]:
+    """Yield a readable diff report, one line at a time."""
+    yield "=" * 80
+    yield f"DIFF: {before_label} -> {after_label}"
+    yield (f"{len(diff['changed'])} changed, {len(diff['added'])} added, {len(diff['removed'])} removed, "
+           f"{diff['unchanged']} unchanged tables")
+    yield "=" * 80
+
+    for title, entries in (("ADDED", diff["added"]), ("REMOVED", diff["removed"])):
+        if entries:
+            yield f"\n{title}"
+            yield "-" * 60
+            for version, map_name, etype, name in entries:
+                label = f"{name} ({version})" if version else name
+                yield f"  {label:30s} {etype.replace('_', ' ')}"
+
+    if diff["changed"]:
+        yield "\nCHANGED (largest efficiency change first)"
+        yield "-" * 80
+        yield f"  {'Location':28s} {'Type':16s} {'EXP':>15s} {'Eff':>17s} {'Rank':>11s}"
+        for change in diff["changed"]:
+            exp = f"{change['exp_before']:.1f}->{change['exp_after']:.1f}"
+            eff = f"{change['efficiency_delta']:+.1f}"
+            rank = f"{change['rank_before']}->{change['rank_after']}"
+            name = change["formatted_name"]
+            if change["version"]:
+                name = f"{name} ({change['version']})"
+            line = (f"  {name:28s} {change['etype'].replace('_', ' '):16s} "
+                    f"{exp:>15s} {eff:>17s} {rank:>11s}")
+            if change["rate_before"] != change["rate_after"]:
+                line += f"  rate {change['rate_before']}->{change['rate_after']}"
+            if verbose:
+                for i, old_label, new_label in change["slot_changes"]:
+                    line += f"\n      slot {i:2d}: {old_label or '-'}  ->  {new_label or '-'}"
+            yield line
+
+
+# =============================================================================
+# DIFFERENTIAL CORRECTNESS HARNESS
+# =============================================================================
+# The reference functions below are frozen copies of the original float path.
+# Optimized engines are checked against them, so they must NOT be "improved".
+
+def _reference_exp_integer(base_exp: int, level: int, lucky_egg: bool = False) -> int:
+    """Reference Gen 3 EXP formula (floor after every step)."""
+    exp = (base_exp * level) // 7
+    if lucky_egg:
+        exp = (exp * 3) // 2
+    return exp
+
+
+def _reference_expected_exp_for_slot(
+    species: str,
+    min_level: int,
+    max_level: int,
+    lucky_egg: bool = False
+) -> float:
+    """Reference slot average (silent fallback of 50 for unknown species)."""
+    base_exp = BASE_EXP.get(species, 50)
+    total_exp = 0
+    for level in range(min_level, max_level + 1):
+        total_exp += _reference_exp_integer(base_exp, level, lucky_egg)
+    return total_exp / (max_level - min_level + 1)
+
+
+def _reference_table(mons: List[Dict], rates: List[int], indices: List[int], lucky_egg: bool) -> Dict:
+    """Reference evaluation of one encounter table."""
+    if indices is not None:
+        working_mons = [mons[i] for i in indices]
+        working_rates = [rates[i] for i in indices]
+    else:
+        working_mons = mons
+        working_rates = rates[:len(mons)]
+    total = sum(working_rates)
+
+    expected_exp = 0.0
+    slots = []
+    for mon, rate in zip(working_mons, working_rates):
+        prob = rate / total
+        slot_exp = _reference_expected_exp_for_slot(
+            mon["species"], mon["min_level"], mon["max_level"], lucky_egg
+        )
+        expected_exp += slot_exp * prob
+        slots.append((prob, slot_exp))
+    return {"expected_exp": expected_exp, "slots": slots}
+
+
+def _reference_process_encounters(data: Dict, lucky_egg: bool = False, game_filter: str = None) -> Dict[str, Dict]:
+    """Reference version of process_encounters (no breakdown dicts)."""
+    results = {}
+    detected_game = detect_game_version(data)
+    json_rates = get_encounter_rates_from_json(data)
+    table_specs = [
+        ("land_mons", "grass", json_rates.get("land_mons", LAND_ENCOUNTER_RATES)),
+        ("water_mons", "surfing", json_rates.get("water_mons", WATER_ENCOUNTER_RATES)),
+        ("rock_smash_mons", "rock_smash", json_rates.get("rock_smash_mons", ROCK_SMASH_ENCOUNTER_RATES)),
+    ]
+    fish_rates = json_rates.get("fishing_mons", FISHING_ENCOUNTER_RATES)
+    fish_groups = json_rates.get("fishing_groups", FISHING_GROUPS)
+
+    for group in data.get("wild_encounter_groups", []):
+        if not group.get("for_maps", False):
+            continue
+        for encounter in group.get("encounters", []):
+            map_name = encounter.get("map", "Unknown")
+            base_label = encounter.get("base_label", "")
+            version = "Unknown"
+            for suffix in ("Ruby", "Sapphire", "FireRed", "LeafGreen"):
+                if f"_{suffix}" in base_label:
+                    version = suffix
+                    break
+            else:
+                if detected_game == "Emerald":
+                    version = "Emerald"
+            if game_filter and version != game_filter:
+                continue
+
+            location = results.setdefault(f"{map_name}_{version}", {})
+            location["formatted_name"] = format_map_name(map_name)
+            location["version"] = version
+
+            for data_key, result_key, rates in table_specs:
+                mons = encounter.get(data_key, {}).get("mons", [])
+                if mons:
+                    table = _reference_table(mons, rates, None, lucky_egg)
+                    enc_rate = encounter[data_key].get("encounter_rate", 0)
+                    table["encounter_rate"] = enc_rate
+                    table["efficiency"] = table["expected_exp"] * (enc_rate / 16.0) if enc_rate > 0 else 0.0
+                    location[result_key] = table
+
+            if "fishing_mons" in encounter:
+                mons = encounter["fishing_mons"].get("mons", [])
+                enc_rate = encounter["fishing_mons"].get("encounter_rate", 0)
+                for rod_name, rod_indices in fish_groups.items():
+                    if len(mons) > max(rod_indices):
+                        table = _reference_table(mons, fish_rates, rod_indices, lucky_egg)
+                        table["encounter_rate"] = enc_rate
+                        table["efficiency"] = table["expected_exp"] * (enc_rate / 16.0) if enc_rate > 0 else 0.0
+                        location[f"fishing_{rod_name}"] = table
+
+    return results
+
+
+REFERENCE_ENGINE = {
+    "exp_integer": _reference_exp_integer,
+    "expected_exp_for_slot": _reference_expected_exp_for_slot,
+    "process_encounters": _reference_process_encounters,
+}
+
+
+def get_current_engine() -> Dict[str, Any]:
+    """The engine the rest of the program actually uses."""
+    return {
+        "exp_integer": calculate_exp_integer,
+        "expected_exp_for_slot": calculate_expected_exp_for_slot,
+        "process_encounters": process_encounters,
+    }
+
+
+def get_cube_engine() -> Dict[str, Any]:
+    """Current kernels, with whole-file results read from a scenario cube."""
+    cubes = {}
+
+    def cube_process_encounters(data, lucky_egg=False, game_filter=None):
+        # Keep a reference to data so its id() cannot be reused
+        if id(data) not in cubes:
+            cubes[id(data)] = (data, build_scenario_cube(data))
+        return get_scenario_results(cubes[id(data)][1], game_filter, lucky_egg)
+
+    engine = get_current_engine()
+    engine["process_encounters"] = cube_process_encounters
+    return engine
+
+
+# Engines selectable with --self-check --engine NAME
+CANDIDATE_ENGINES = {
+    "current": get_current_engine,
+    "cube": get_cube_engine,
+}
+
+
+def get_bundled_encounter_files() -> List[str]:
+    """Return every JSON file shipped under Wild_Encounters/Gen*/."""
+    import os
+
+    base_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Wild_Encounters")
+    files = []
+    if os.path.isdir(base_path):
+        for gen_folder in sorted(os.listdir(base_path)):
+            gen_path = os.path.join(base_path, gen_folder)
+            if os.path.isdir(gen_path) and gen_folder.lower().startswith("gen"):
+                for f in sorted(os.listdir(gen_path)):
+                    if f.endswith("_wild_encounters.json"):
+                        files.append(os.path.join(gen_path, f))
+    return files
+
+
+def generate_synthetic_encounter_data(num_tables: int, seed: int = 0) -> Dict:
+    """
+    Build a random encounter file in the pret JSON layout.
+
+    Tables mix every encounter type, random species (including an
+    unknown one), random level ranges and random encounter rates.
+    """
+    import random
+
+    rng = random.Random(seed)
+    species_pool = sorted(BASE_EXP) + ["SPECIES_MISSINGNO"]
+
+    def random_mons(count):
+        mons = []
+        for _ in range(count):
+            min_level = rng.randint(1, 100)
+            max_level = min(100, min_level + rng.choice([0, 0, 1, 2, 4, 9]))
+            mons.append({
+                "min_level": min_level,
+                "max_level": max_level,
+                "species": rng.choice(species_pool)
+            })
+        return mons
+
+    encounters = []
+    for i in range(num_tables):
+        encounter = {
+            "map": f"MAP_SYNTHETIC_{i}",
+            "base_label": f"sSynthetic{i}_{rng.choice(['Ruby', 'Sapphire', 'FireRed', 'LeafGreen'])}",
+        }
+        for data_key, count in (("land_mons", 12), ("water_mons", 5),
+                                ("rock_smash_mons", 5), ("fishing_mons", 10)):
+            if rng.random() < 0.6:
+                encounter[data_key] = {
+                    "encounter_rate": rng.randint(0, 40),
+                    "mons": random_mons(count)
+                }
+        encounters.append(encounter)
+
+    # Randomize the slot rate table too, so normalization is exercised
+    def random_rates(count):
+        return [rng.randint(1, 60) for _ in range(count)]
+
+    return {
+        "wild_encounter_groups": [{
+            "label": "gSyntheticWildMonHeaders",
+            "for_maps": True,
+            "fields": [
+                {"type": "land_mons", "encounter_rates": random_rates(12)},
+                {"type": "water_mons", "encounter_rates": random_rates(5)},
+                {"type": "rock_smash_mons", "encounter_rates": random_rates(5)},
+                {"type": "fishing_mons", "encounter_rates": random_rates(10), "groups": FISHING_GROUPS},
+            ],
+            "encounters": encounters
+        }]
+    }
+
+
+def _compare_float(mismatches: List[Dict], case: str, field: str, ref: float, cand: float, rel_tol: float,
+                   display: bool = True):
+    """
+    Record a value or display-rounding mismatch between two floats.
+
+    display=False skips the rounding check, for candidates that are the
+    exact value correctly rounded (the reference's summation noise can
+    flip a digit that the exact value gets right).
+    """
+    if not math.isclose(ref, cand, rel_tol=rel_tol, abs_tol=rel_tol):
+        kind = "value"
+    elif display and (f"{ref:.1f}" != f"{cand:.1f}" or f"{ref:.2f}" != f"{cand:.2f}"):
+        kind = "rounding"
+    else:
+        return
+    mismatches.append({"kind": kind, "case": case, "field": field, "reference": ref, "candidate": cand})
+
+
+def _compare_processed(mismatches: List[Dict], case: str, ref: Dict, cand: Dict, rel_tol: float):
+    """Compare two process_encounters result sets location by location."""
+    for key in sorted(set(ref) | set(cand)):
+        if key not in ref or key not in cand:
+            mismatches.append({"kind": "missing", "case": case, "field": key,
+                               "reference": key in ref, "candidate": key in cand})
+            continue
+        ref_loc, cand_loc = ref[key], cand[key]
+        for etype in ["grass", "surfing", "rock_smash", "fishing_old_rod",
+                      "fishing_good_rod", "fishing_super_rod"]:
+            if (etype in ref_loc) != (etype in cand_loc):
+                mismatches.append({"kind": "missing", "case": case, "field": f"{key}/{etype}",
+                                   "reference": etype in ref_loc, "candidate": etype in cand_loc})
+                continue
+            if etype not in ref_loc:
+                continue
+            ref_t, cand_t = ref_loc[etype], cand_loc[etype]
+            where = f"{key}/{etype}"
+            # The reported float must be the exact value correctly rounded
+            exact = "exp_exact" in cand_t
+            if exact and float(cand_t["exp_exact"]) != cand_t["expected_exp"]:
+                mismatches.append({"kind": "value", "case": case, "field": f"{where}/exp_exact",
+                                   "reference": float(cand_t["exp_exact"]),
+                                   "candidate": cand_t["expected_exp"]})
+            _compare_float(mismatches, case, f"{where}/expected_exp",
+                           ref_t["expected_exp"], cand_t["expected_exp"], rel_tol, not exact)
+            _compare_float(mismatches, case, f"{where}/efficiency",
+                           ref_t["efficiency"], cand_t.get("efficiency", 0), rel_tol, not exact)
+            if ref_t["encounter_rate"] != cand_t.get("encounter_rate", 0):
+                mismatches.append({"kind": "value", "case": case, "field": f"{where}/encounter_rate",
+                                   "reference": ref_t["encounter_rate"],
+                                   "candidate": cand_t.get("encounter_rate", 0)})
+            cand_slots = cand_t.get("breakdown", [])
+            if len(cand_slots) != len(ref_t["slots"]):
+                mismatches.append({"kind": "value", "case": case, "field": f"{where}/slots",
+                                   "reference": len(ref_t["slots"]), "candidate": len(cand_slots)})
+                continue
+            for i, ((prob, slot_exp), slot) in enumerate(zip(ref_t["slots"], cand_slots)):
+                _compare_float(mismatches, case, f"{where}/slot{i}/probability",
+                               prob, slot["probability"], rel_tol)
+                _compare_float(mismatches, case, f"{where}/slot{i}/expected_exp",
+                               slot_exp, slot["expected_exp"], rel_tol)
+
+
+def run_differential_check(
+    candidate: Dict[str, Any] = None,
+    data_paths: List[str] = None,
+    synthetic_tables: int = 200,
+    seed: int = 0,
+    rel_tol: float = 1e-9
+) -> Tuple[List[Dict], int]:
+    """
+    Run a candidate engine side by side with the reference implementation.
+
+    Checks every species in BASE_EXP at every level 1-100 (with and without
+    Lucky Egg), every table of every bundled file under every version
+    filter, and a randomized synthetic file.
+
+    Returns:
+        Tuple of (mismatches, number_of_cases_checked)
+    """
+    if candidate is None:
+        candidate = get_current_engine()
+    if data_paths is None:
+        data_paths = get_bundled_encounter_files()
+
+    mismatches = []
+    cases = 0
+
+    # Per-species kernel checks
+    for species in sorted(BASE_EXP):
+        base_exp = BASE_EXP[species]
+        for lucky_egg in (False, True):
+            for level in range(1, 101):
+                cases += 1
+                ref = _reference_exp_integer(base_exp, level, lucky_egg)
+                cand = candidate["exp_integer"](base_exp, level, lucky_egg)
+                if ref != cand:
+                    mismatches.append({"kind": "value", "case": f"{species} L{level} egg={lucky_egg}",
+                                       "field": "exp_integer", "reference": ref, "candidate": cand})
+                max_level = min(100, level + 4)
+                _compare_float(mismatches, f"{species} L{level}-{max_level} egg={lucky_egg}",
+                               "expected_exp_for_slot",
+                               _reference_expected_exp_for_slot(species, level, max_level, lucky_egg),
+                               candidate["expected_exp_for_slot"](species, level, max_level, lucky_egg),
+                               rel_tol)
+
+    # Whole-file checks
+    datasets = []
+    for path in data_paths:
+        with open(path, "r") as f:
+            data = json.load(f)
+        # The frozen reference only knows the Gen 3 formula and layout
+        if detect_generation(data, path) == 3:
+            datasets.append((path, data))
+    if synthetic_tables:
+        datasets.append((f"<synthetic seed={seed}>",
+                         generate_synthetic_encounter_data(synthetic_tables, seed)))
+
+    for label, data in datasets:
+        reference_all = _reference_process_encounters(data, False, None)
+        versions = sorted({loc["version"] for loc in reference_all.values()})
+        for game_filter in [None] + versions:
+            for lucky_egg in (False, True):
+                case = f"{label} filter={game_filter} egg={lucky_egg}"
+                ref = _reference_process_encounters(data, lucky_egg, game_filter)
+                cand = candidate["process_encounters"](data, lucky_egg, game_filter)
+                cases += sum(len(loc) for loc in ref.values())
+                _compare_processed(mismatches, case, ref, cand, rel_tol)
+
+    return mismatches, cases
+
+
+def print_differential_report(mismatches: List[Dict], cases: int, limit: int = 25):
+    """Print a summary of a differential run."""
+    print("=" * 60)
+    print("DIFFERENTIAL CHECK")
+    print("=" * 60)
+    print(f"  Cases checked: {cases:,}")
+
+    if not mismatches:
+        print("  Result: OK - candidate matches reference exactly")
+        return
+
+    by_kind = defaultdict(int)
+    for m in mismatches:
+        by_kind[m["kind"]] += 1
+    summary = ", ".join(f"{count} {kind}" for kind, count in sorted(by_kind.items()))
+    print(f"  Result: {len(mismatches)} mismatch(es) ({summary})\n")
+
+    for m in mismatches[:limit]:
+        print(f"  [{m['kind']:8s}] {m['case']} :: {m['field']}")
+        print(f"             reference={m['reference']!r} candidate={m['candidate']!r}")
+    if len(mismatches) > limit:
+        print(f"  ... and {len(mismatches) - limit} more")
+
+
+# =============================================================================
+# SESSION MANAGER (bounded LRU of loaded datasets)
+# =============================================================================
+# Each entry holds a parsed file and its scenario cube, keyed by absolute
+# path and content hash: switching back to a file is a dict lookup, an
+# edited file is reloaded, and the least recently used entry is dropped.
+SESSION_MAX_DATASETS = 4
+
+
+def create_session(max_datasets: int = SESSION_MAX_DATASETS) -> Dict[str, Any]:
+    """Start an empty session."""
+    return {"datasets": OrderedDict(), "max_datasets": max_datasets}
+
+
+def load_dataset(session: Dict[str, Any], path: str, build_cube: bool = True) -> Dict[str, Any]:
+    """
+    Return the dataset for path, loading and processing it only on a cache miss.
+
+    build_cube=False leaves "cube" None for callers that only need the
+    parsed file (the diff); a later load that needs the cube builds it then.
+
+    Raises:
+        FileNotFoundError, json.JSONDecodeError: as json.load would
+        ValueError: if no generation engine handles the file
+    """
+    import hashlib
+    import os
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    key = (os.path.abspath(path), hashlib.sha256(raw).hexdigest())
+
+    datasets = session["datasets"]
+    if key in datasets:
+        datasets.move_to_end(key)
+        datasets[key]["cached"] = True
+        if build_cube and datasets[key]["cube"] is None:
+            datasets[key]["cube"] = build_scenario_cube(datasets[key]["data"])
+        return datasets[key]
+
+    # Routed to its generation's engine and normalized to the pret layout
+    data = prepare_encounter_data(json.loads(raw), path)
+    dataset = {
+        "path": path,
+        "hash": key[1],
+        "data": data,
+        "detected_game": detect_game_version(data),
+        # Precompute every Lucky Egg / traded combination once; settings
+        # changes then just read another cell of the cube
+        "cube": build_scenario_cube(data) if build_cube else None,
+        "cached": False,
+    }
+    # Drop older copies of the same path (the file changed on disk) along
+    # with every rendering, since those may come from the old results
+    stale_keys = [k for k in datasets if k[0] == key[0]]
+    for stale in stale_keys:
+        del datasets[stale]
+    if stale_keys:
+        clear_rendered_output()
+    datasets[key] = dataset
+    while len(datasets) > session["max_datasets"]:
+        datasets.popitem(last=False)
+    return dataset
+
+
+# =============================================================================
+# TERMINAL UI (ANSI redraw, differential rendering, virtualized lists)
+# =============================================================================
+# Screens are drawn with ANSI escape sequences in one buffered write. The
+# last frame is remembered, so a redraw only repaints the rows that changed,
+# and scrolling shifts the list region in the terminal instead of
+# repainting it. When stdout is not a terminal everything falls back to
+# plain printing.
+_SCREEN = {"frame": None, "ansi": None}
+
+
+def _ansi_supported() -> bool:
+    """Whether the terminal understands ANSI sequences (enables VT mode on Windows)."""
+    if _SCREEN["ansi"] is None:
+        import os
+
+        supported = True
+        if os.name == "nt":
+            try:
+                import ctypes
+
+                kernel32 = ctypes.windll.kernel32
+                handle = kernel32.GetStdHandle(-11)
+                mode = ctypes.c_uint32()
+                # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+                supported = bool(kernel32.GetConsoleMode(handle, ctypes.byref(mode))
+                                 and kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+            except (AttributeError, OSError):
+                supported = False
+        _SCREEN["ansi"] = supported
+    return _SCREEN["ansi"]
+
+
+def _interactive_terminal() -> bool:
+    """Full-screen drawing needs a real terminal on both ends."""
+    import sys
+
+    return sys.stdin.isatty() and sys.stdout.isatty() and _ansi_supported()
+
+
+def clear_screen():
+    """Clear terminal screen."""
+    import os
+    import sys
+
+    _SCREEN["frame"] = None
+    if _ansi_supported():
+        sys.stdout.write("\033[H\033[2J\033[3J")
+        sys.stdout.flush()
+    else:
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+
+def render_frame(lines: List[str], scroll: Tuple[int, int, int] = None):
+    """
+    Draw a full-screen frame, repainting only the rows that differ from the last one.
+
+    Args:
+        lines: Rows to show (cut to the terminal size)
+        scroll: Optional (first_row, end_row, delta) hint: rows first_row..end_row-1
+            hold a list that moved by delta lines, so the terminal scrolls that
+            region and only the rows that came into view are painted.
+    """
+    import shutil
+    import sys
+
+    columns, height = shutil.get_terminal_size()
+    # The last row stays free: pressing Enter on the prompt must not scroll the screen
+    height = max(height - 1, 1)
+    rows = [line[:columns] for line in lines[:height]]
+    rows += [""] * (height - len(rows))
+
+    out = []
+    previous = _SCREEN["frame"]
+    if previous is None or len(previous) != height:
+        out.append("\033[H\033[2J")
+        previous = [None] * height
+    elif scroll and 0 < abs(scroll[2]) < scroll[1] - scroll[0]:
+        first, end, delta = scroll
+        # Index at the bottom margin / reverse index at the top margin scroll
+        # just the region (plain VT100, unlike SU/SD)
+        out.append(f"\033[{first + 1};{end}r")
+        if delta > 0:
+            out.append(f"\033[{end};1H" + "\n" * delta)
+        else:
+            out.append(f"\033[{first + 1};1H" + "\033M" * -delta)
+        out.append("\033[r")
+        region = previous[first:end]
+        region = region[delta:] + [None] * delta if delta > 0 else [None] * -delta + region[:delta]
+        previous = previous[:first] + region + previous[end:]
+
+    for i, (old, new) in enumerate(zip(previous, rows)):
+        if old != new:
+            out.append(f"\033[{i + 1};1H{new}\033[K")
+    out.append(f"\033[{height};1H")
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
+    # The prompt row gets typed over, so it is always repainted next time
+    rows[-1] = None
+    _SCREEN["frame"] = rows
+
+
+def prompt_frame(lines: List[str], prompt: str, scroll: Tuple[int, int, int] = None) -> str:
+    """Render lines with a prompt on the bottom row and read the answer."""
+    if not _interactive_terminal():
+        clear_screen()
+        print("\n".join(lines))
+        return input(prompt)
+    render_frame(lines + [""] * (_frame_height() - len(lines) - 1) + [prompt], scroll)
+    return input(prompt)
+
+
+def _frame_height() -> int:
+    """Rows available to render_frame."""
+    import shutil
+
+    return max(shutil.get_terminal_size()[1] - 1, 1)
+
+
+def build_list_blocks(lines: Iterable[str]) -> List[Tuple[List[str], List[str]]]:
+    """
+    Group report lines into (head, body) blocks for a filterable list.
+
+    A block starts at every yielded string that begins with a blank line
+    (a location, version or section heading). Its head runs through the
+    first string containing a rule line and is always shown with the block.
+    """
+    blocks = []
+    head, body = [], []
+    in_head = True
+    for text in lines:
+        if text.startswith("\n") and (head or body):
+            blocks.append((head, body))
+            head, body, in_head = [], [], True
+        physical = text.split("\n")
+        if in_head:
+            head.extend(physical)
+            if any(line and set(line) <= set("-=") for line in physical):
+                in_head = False
+        else:
+            body.extend(physical)
+    if head or body:
+        blocks.append((head, body))
+    return blocks
+
+
+def _filter_blocks(blocks: List[Tuple[List[str], List[str]]], query: str) -> List[List[str]]:
+    """Blocks whose head matches, whole; otherwise head plus matching body lines."""
+    if not query:
+        return [head + body for head, body in blocks]
+    query = query.lower()
+    shown = []
+    for head, body in blocks:
+        if any(query in line.lower() for line in head):
+            shown.append(head + body)
+            continue
+        matching = [line for line in body if query in line.lower()]
+        if matching:
+            shown.append(head + matching)
+    return shown
+
+
+def view_virtual_list(lines: Iterable[str], title: str):
+    """
+    Scrollable, filterable full-screen view of a long report.
+
+    Only the rows in the window are rendered. Commands: Enter = next page,
+    b = previous page, j/k [N] = down/up N lines, g N = go to line N,
+    G = end, /text = filter, / = clear filter, q = back.
+    """
+    import bisect
+    import sys
+
+    if not _interactive_terminal():
+        clear_screen()
+        write_lines(lines, sys.stdout)
+        pause()
+        return
+
+    blocks = build_list_blocks(lines)
+    query = ""
+    shown = _filter_blocks(blocks, query)
+    top = 0
+    delta = 0
+    while True:
+        # Prefix sums locate the first visible block without flattening the list
+        starts = [0]
+        for block in shown:
+            starts.append(starts[-1] + len(block))
+        total = starts[-1]
+        page = max(_frame_height() - 4, 1)
+        top = max(0, min(top, total - page))
+
+        window = []
+        b = bisect.bisect_right(starts, top) - 1
+        offset = top - starts[b] if shown else 0
+        while b < len(shown) and len(window) < page:
+            window.extend(shown[b][offset:offset + page - len(window)])
+            b += 1
+            offset = 0
+
+        filter_note = f"  filter: {query!r}" if query else ""
+        header = [f"{title}{filter_note}", "-" * 80]
+        status = (f"  lines {top + 1 if total else 0}-{min(top + page, total)} of {total}   "
+                  "[Enter] next  [b] back  [j/k N] line  [g N] goto  [/text] filter  [q] quit")
+        frame = header + window + [""] * (page - len(window)) + [status]
+        command = prompt_frame(frame, ": ", (2, 2 + page, delta) if delta else None).strip()
+
+        previous_top = top
+        if command in ("q", "Q"):
+            # No clear: the next screen repaints only the rows that differ
+            return
+        elif command == "":
+            top += page
+        elif command == "b":
+            top -= page
+        elif command[:1] in ("j", "k"):
+            count = int(command[1:]) if command[1:].strip().isdigit() else 1
+            top += count if command[0] == "j" else -count
+        elif command[:1] == "g" and command[1:].strip().isdigit():
+            top = int(command[1:]) - 1
+        elif command == "G":
+            top = total
+        elif command.startswith("/"):
+            query = command[1:].strip()
+            shown = _filter_blocks(blocks, query)
+            top = previous_top = 0
+            _SCREEN["frame"] = None
+        top = max(0, min(top, total - page))
+        delta = top - previous_top if not command.startswith("/") else 0
+
+
+def pause():
+    """Wait for user to press Enter."""
+    input("\nPress Enter to continue...")
+
+
+def select_json_file() -> str:
+    """Let user select or enter a JSON file path."""
+    import os
+    
+    # Look for JSON files in the Wild_Encounters folder structure
+    json_files = []
     
     # Check for Wild_Encounters folder with Gen subfolders
     wild_encounter_paths = [
@@ -1022,7 +6164,8 @@ def select_json_file() -> str:
                     gen_path = os.path.join(base_path, gen_folder)
                     if os.path.isdir(gen_path) and gen_folder.lower().startswith('gen'):
                         for f in os.listdir(gen_path):
-                            if f.endswith('.json'):
+                            # Attribute files sit next to the encounter files they describe
+                            if f.endswith('.json') and f != LOCATION_ATTRIBUTES_FILE:
                                 full_path = os.path.join(gen_path, f)
                                 if full_path not in json_files:
                                     json_files.append(full_path)
@@ -1080,6 +6223,30 @@ def select_game_version(data: Dict) -> Optional[str]:
         print(f"\nDetected: Emerald (no version filter needed)")
         return None
     
+    if data.get("generation", 3) != 3:
+        # Other generations name each map's version explicitly
+        versions = sorted({encounter.get("version", "Unknown")
+                           for group in data.get("wild_encounter_groups", [])
+                           for encounter in group.get("encounters", [])})
+        if len(versions) <= 1:
+            print(f"\nDetected: {detected} (no version filter needed)")
+            return None
+        print("\n" + "-" * 40)
+        print("GAME VERSION FILTER")
+        print("-" * 40)
+        print(f"Detected: {detected} combined file")
+        print("\n  1. Show all versions")
+        for i, version in enumerate(versions, 2):
+            print(f"  {i}. {version} only")
+        choice = input("\nSelect option [1]: ").strip() or "1"
+        try:
+            idx = int(choice) - 2
+            if 0 <= idx < len(versions):
+                return versions[idx]
+        except ValueError:
+            pass
+        return None
+    
     print("\n" + "-" * 40)
     print("GAME VERSION FILTER")
     print("-" * 40)
@@ -1111,43 +6278,251 @@ def select_game_version(data: Dict) -> Optional[str]:
     return None
 
 
-def settings_menu(settings: Dict) -> Dict:
-    """Configure settings like Lucky Egg."""
+def diff_menu(dataset: Dict[str, Any], session: Dict[str, Any], settings: Dict,
+              game_filter: Optional[str], game_label: str):
+    """Diff the current results against another version or game file."""
+    clear_screen()
+    print("=" * 50)
+    print("DIFF VERSIONS / FILES")
+    print("=" * 50)
+    versions = sorted({location["version"] for location in dataset["cube"]["locations"].values()} - {game_filter})
+    print(f"\n  Comparing from: {game_label}")
+    print("\n  1. Another version of this file")
+    print("  2. Another game file (e.g. a romhack of this one)")
+    choice = input("\nSelect option [1]: ").strip() or "1"
+
+    if choice == "1":
+        if not versions:
+            print("\nThis file has no other versions.")
+            pause()
+            return
+        for i, version in enumerate(versions, 1):
+            print(f"  {i}. {version}")
+        try:
+            other_filter = versions[int(input("\nCompare against: ").strip()) - 1]
+        except (ValueError, IndexError):
+            return
+        other_label = other_filter
+    elif choice == "2":
+        other_path = select_json_file()
+        try:
+            # Only the parsed file: the diff hashes its raw tables first
+            other = load_dataset(session, other_path, build_cube=False)
+        except (OSError, ValueError) as e:
+            # ValueError covers invalid JSON and files no engine handles
+            print(f"\nError: {e}")
+            pause()
+            return
+        other_filter = select_game_version(other["data"])
+        other_label = f"{other_path} ({other_filter or other['detected_game']})"
+    else:
+        return
+
+    try:
+        if choice == "1":
+            # Both sides are cells of the cube already built for this file
+            diff = diff_results(
+                get_scenario_results(dataset["cube"], game_filter, settings['lucky_egg'], settings['traded']),
+                get_scenario_results(dataset["cube"], other_filter, settings['lucky_egg'], settings['traded']))
+        else:
+            diff = diff_encounter_data(dataset["data"], other["data"], game_filter, other_filter,
+                                       settings['lucky_egg'], settings['traded'])
+    except ValueError as e:
+        print(f"\nError: {e}")
+        pause()
+        return
+    view_virtual_list(list(iter_diff_lines(diff, game_label, other_label, settings['verbose'])),
+                      f"DIFF - {game_label} -> {other_label}")
+
+
+def settings_menu(settings: Dict, lucky_egg_available: bool = True) -> Dict:
+    """Configure settings like Lucky Egg (fixed off for a generation without one)."""
     while True:
         clear_screen()
         print("=" * 50)
         print("SETTINGS")
         print("=" * 50)
-        print(f"\n  1. Lucky Egg: {'ON' if settings['lucky_egg'] else 'OFF'}")
+        if lucky_egg_available:
+            print(f"\n  1. Lucky Egg: {'ON' if settings['lucky_egg'] else 'OFF'}")
+        else:
+            print("\n  1. Lucky Egg: n/a (not in this generation)")
         print(f"  2. Verbose output: {'ON' if settings['verbose'] else 'OFF'}")
+        print(f"  3. Traded Pokemon (1.5x): {'ON' if settings['traded'] else 'OFF'}")
+        print(f"  4. Lead Pokemon level: {settings['lead_level'] or 'not set'}")
+        print(f"  5. Repel (blocks wild levels below lead): {'ON' if settings['repel'] else 'OFF'}")
+        print(f"  6. Lead ability: {settings['lead_ability']}")
+        print(f"  7. Exclude locations needing: {format_attribute_mask(settings['blocked_attributes'])}")
         print("\n  0. Back to main menu")
         
         choice = input("\nToggle setting: ").strip()
         
-        if choice == "1":
+        if choice == "1" and lucky_egg_available:
             settings['lucky_egg'] = not settings['lucky_egg']
         elif choice == "2":
             settings['verbose'] = not settings['verbose']
+        elif choice == "3":
+            settings['traded'] = not settings['traded']
+        elif choice == "4":
+            level = input("Lead Pokemon level (1-100, blank = not set): ").strip()
+            if not level:
+                settings['lead_level'] = 0
+            elif level.isdigit() and 1 <= int(level) <= MAX_LEVEL:
+                settings['lead_level'] = int(level)
+        elif choice == "5":
+            settings['repel'] = not settings['repel']
+        elif choice == "6":
+            settings['lead_ability'] = prompt_lead_ability(settings['lead_ability'])
+        elif choice == "7":
+            settings['blocked_attributes'] = prompt_blocked_attributes(settings['blocked_attributes'])
         elif choice == "0":
             break
     
     return settings
 
 
+def prompt_lead_ability(default: str = "NONE") -> str:
+    """Ask for a lead ability by number or name."""
+    print("\nLead abilities (Emerald only):")
+    for i, ability in enumerate(LEAD_ABILITIES, 1):
+        print(f"  {i}. {ability.replace('_', ' ').title()}")
+    choice = input(f"Select ability [{default.replace('_', ' ').title()}]: ").strip().upper().replace(" ", "_")
+    if choice.isdigit() and 1 <= int(choice) <= len(LEAD_ABILITIES):
+        return LEAD_ABILITIES[int(choice) - 1]
+    if choice in LEAD_ABILITIES:
+        return choice
+    return default
+
+
+def prompt_blocked_attributes(blocked: int) -> int:
+    """Toggle which location attributes rankings and the calculators exclude."""
+    while True:
+        print("\nExclude locations that need (rankings, battle calculator, route planner):")
+        for i, name in enumerate(LOCATION_ATTRIBUTES, 1):
+            mark = "x" if blocked & ATTRIBUTE_BITS[name] else " "
+            print(f"  {i}. [{mark}] {name.replace('_', ' ')}")
+        choice = input("Toggle number (Enter when done): ").strip()
+        if not choice:
+            return blocked
+        if choice.isdigit() and 1 <= int(choice) <= len(LOCATION_ATTRIBUTES):
+            blocked ^= ATTRIBUTE_BITS[LOCATION_ATTRIBUTES[int(choice) - 1]]
+
+
+def get_repel_lead(settings: Dict) -> int:
+    """Lead level the Repel checks against, or 0 when no Repel is active."""
+    return settings['lead_level'] if settings['repel'] else 0
+
+
 def view_location_report(results: Dict, settings: Dict, game_label: str):
     """View the full location report."""
-    clear_screen()
-    output = generate_report(results, settings['verbose'], settings['lucky_egg'], game_label)
-    print(output)
-    pause()
+    view_virtual_list(get_rendered_lines(iter_report_lines, results, settings['verbose'], settings['lucky_egg'],
+                                         game_label, get_repel_lead(settings), settings['lead_ability']),
+                      f"LOCATION REPORT - {game_label}")
 
 
-def view_efficiency_rankings(results: Dict):
-    """View efficiency-sorted rankings."""
+def view_efficiency_rankings(results: Dict, settings: Dict):
+    """View efficiency-sorted rankings, optionally for another lead ability."""
     clear_screen()
-    output = generate_efficiency_summary(results)
-    print(output)
-    pause()
+    print("=" * 50)
+    print("EFFICIENCY RANKINGS")
+    print("=" * 50)
+    print(f"\n  Enter = current lead ability ({settings['lead_ability'].replace('_', ' ').title()})")
+    print("  A = compare the best spot for every lead ability")
+    print("  S = pick another lead ability")
+    print("  W = rank by a weighted objective (EXP, EVs, held items)")
+    print("  P = Pareto skyline (spots no other spot beats on every criterion)")
+    print("  Q = custom query (filter and score expressions, any k and order)")
+    choice = input("\nSelect option: ").strip().upper()
+
+    weights = None
+    if choice == "W":
+        print(f"\n  Metrics: exp, {', '.join(EV_STATS)}, item, item:ITEM_NAME")
+        try:
+            weights = parse_objective(input("Weights (e.g. exp=1, speed=100): ").strip())
+        except ValueError as e:
+            print(f"Invalid objective: {e}")
+            pause()
+            return
+
+    if choice == "P":
+        print(f"\n  Criteria: {', '.join(SKYLINE_CRITERIA)}")
+        criteria_input = input(f"Criteria [{', '.join(DEFAULT_SKYLINE_CRITERIA)}]: ").strip()
+        criteria = [name.strip().lower() for name in criteria_input.split(",") if name.strip()]
+        view = filter_results(apply_lead(results, settings['lead_level'], settings['repel'],
+                                         settings['lead_ability'], settings['lucky_egg'], settings['traded']),
+                              settings['blocked_attributes'])
+        try:
+            skyline = compute_skyline(skyline_rows(view, settings['lucky_egg'], settings['traded']), criteria)
+        except ValueError as e:
+            print(f"Invalid criteria: {e}")
+            pause()
+            return
+        view_virtual_list(list(iter_skyline_lines(skyline, criteria or DEFAULT_SKYLINE_CRITERIA)), "PARETO SKYLINE")
+        return
+
+    if choice == "Q":
+        view = filter_results(apply_lead(results, settings['lead_level'], settings['repel'],
+                                         settings['lead_ability'], settings['lucky_egg'], settings['traded']),
+                              settings['blocked_attributes'])
+        ranking_query_menu(view)
+        return
+
+    if choice == "A":
+        views = build_lead_ability_views(results, settings['lead_level'], settings['repel'],
+                                         LEAD_ABILITIES, settings['lucky_egg'], settings['traded'])
+        views = {ability: filter_results(view, settings['blocked_attributes']) for ability, view in views.items()}
+        clear_screen()
+        print("=" * 80)
+        print("BEST SPOT PER LEAD ABILITY")
+        print("=" * 80)
+        print(f"  {'Ability':14s} {'Location':30s} {'Type':18s} {'EXP':>7s} {'Eff':>8s}")
+        for ability, view in views.items():
+            rows = [(data[etype]["efficiency"], data.get("formatted_name", key), etype, data[etype]["expected_exp"])
+                    for key, data in view.items() for etype in ENCOUNTER_TYPES if etype in data]
+            if rows:
+                eff, name, etype, exp = max(rows)
+                print(f"  {ability.replace('_', ' ').title():14s} {name:30s} {etype:18s} {exp:7.1f} {eff:8.1f}")
+        pause()
+        return
+
+    ability = prompt_lead_ability(settings['lead_ability']) if choice == "S" else settings['lead_ability']
+    view = filter_results(apply_lead(results, settings['lead_level'], settings['repel'], ability,
+                                     settings['lucky_egg'], settings['traded']),
+                          settings['blocked_attributes'])
+    title = "EFFICIENCY RANKINGS"
+    if ability != "NONE":
+        title += f" - lead ability: {ability.replace('_', ' ').title()}"
+    if settings['blocked_attributes']:
+        title += f" - excluding {format_attribute_mask(settings['blocked_attributes'])}"
+    # The list view scrolls, so it can hold every spot instead of the top 15
+    top_n = len(view) if _interactive_terminal() else 15
+    view_virtual_list(get_rendered_lines(iter_efficiency_summary_lines, view, top_n, weights), title)
+
+
+def ranking_query_menu(results: Dict):
+    """Run filter / score queries against the rankings until the user goes back."""
+    while True:
+        clear_screen()
+        print("=" * 60)
+        print("CUSTOM RANKING QUERY")
+        print("=" * 60)
+        print(f"\n  Columns: {', '.join(RANKING_COLUMNS)}")
+        print(f"  Functions: {', '.join(RANKING_FUNCTIONS)}")
+        print('  Example filter: version == "Emerald" and etype in ("grass", "surfing") and rate >= 10')
+        print("  Example score:  exp * rate / max(max_level, 1)")
+        where = input("\nFilter (blank = every spot, Q = back): ").strip()
+        if where.upper() == "Q":
+            return
+        score = input("Score [efficiency]: ").strip()
+        k_input = input("How many spots (0 = all) [15]: ").strip()
+        k = int(k_input) if k_input.lstrip("-").isdigit() else 15
+        ascending = input("Order [H]ighest first / [l]owest first: ").strip().lower() == "l"
+        try:
+            ranking = run_ranking_query(results, where, score, k, ascending)
+        except ValueError as e:
+            print(f"\n{e}")
+            pause()
+            continue
+        view_virtual_list(list(iter_ranking_query_lines(ranking, where, score, ascending)), "CUSTOM RANKING")
 
 
 def search_location(results: Dict, settings: Dict):
@@ -1202,11 +6577,13 @@ def battle_calculator_menu(results: Dict, settings: Dict):
     if not species_input.startswith("SPECIES_"):
         species_input = f"SPECIES_{species_input}"
     
-    if species_input not in SPECIES_GROWTH_RATE:
+    species_table = settings.get('species_table')
+    growth_rates = (species_table or DEFAULT_SPECIES_TABLE)["growth_rate"]
+    if species_input not in growth_rates:
         print(f"Warning: Unknown species {species_input}, using medium_fast growth rate")
         growth_rate = "medium_fast"
     else:
-        growth_rate = SPECIES_GROWTH_RATE[species_input]
+        growth_rate = growth_rates[species_input]
         print(f"Growth rate: {growth_rate}")
     
     try:
@@ -1218,8 +6595,19 @@ def battle_calculator_menu(results: Dict, settings: Dict):
         pause()
         return
     
+    # Lead setup: Repel and lead abilities both depend on the lead's level
+    default_lead = settings['lead_level'] or current_level
+    lead_input = input(f"Lead Pokemon level [{default_lead}]: ").strip()
+    lead_level = min(int(lead_input), MAX_LEVEL) if lead_input.isdigit() else default_lead
+    repel_input = input(f"Use Repel? [{'Y/n' if settings['repel'] else 'y/N'}]: ").strip().lower()
+    repel = settings['repel'] if not repel_input else repel_input == "y"
+    ability = prompt_lead_ability(settings['lead_ability'])
+    results = apply_lead(results, lead_level, repel, ability, settings['lucky_egg'], settings['traded'])
+    # Spots the player cannot battle at (yet) are left out
+    results = filter_results(results, settings['blocked_attributes'])
+    
     # Calculate EXP needed
-    exp_needed = get_exp_needed(species_input, current_level, current_exp, target_level)
+    exp_needed = get_exp_needed(species_input, current_level, current_exp, target_level, species_table)
     print(f"\nEXP needed to reach level {target_level}: {exp_needed:,}")
     
     # Get location
@@ -1238,17 +6626,26 @@ def battle_calculator_menu(results: Dict, settings: Dict):
                     "data": data,
                     "etype": etype,
                     "exp": data[etype]["expected_exp"],
-                    "eff": data[etype].get("efficiency", 0)
+                    "eff": data[etype].get("efficiency", 0),
+                    # Trainers on the map are fought once; wild battles cover the rest
+                    "wild_exp_needed": max(0, exp_needed - data.get("trainer_exp", 0))
                 })
     
-    # Sort by efficiency
-    all_locations.sort(key=lambda x: x["eff"], reverse=True)
+    # Sort by efficiency and count battles for every spot on the active backend
+    backend = get_backend()
+    order = backend["argsort_desc"]([loc["eff"] for loc in all_locations])
+    all_locations = [all_locations[i] for i in order]
+    battle_counts = backend["battles_needed"]([loc["wild_exp_needed"] for loc in all_locations],
+                                              [loc["exp"] for loc in all_locations])
+    for loc, battles in zip(all_locations, battle_counts):
+        loc["battles"] = battles
     
     print("\nTop 15 locations by efficiency:")
     for i, loc in enumerate(all_locations[:15], 1):
         name = loc["data"].get("formatted_name", "")
         etype = loc["etype"].replace("_", " ")
-        print(f"  {i:2d}. {name:25s} ({etype:15s}) - {loc['exp']:.1f} EXP, Eff: {loc['eff']:.1f}")
+        print(f"  {i:2d}. {name:25s} ({etype:15s}) - {loc['exp']:.1f} EXP, Eff: {loc['eff']:.1f}, "
+              f"~{loc['battles']:,} battles")
     
     print("\n  Or enter a location name to search")
     
@@ -1284,27 +6681,163 @@ def battle_calculator_menu(results: Dict, settings: Dict):
         # based on settings, so we can use it directly
         pass
     
-    # Calculate battles
-    battles = calculate_battles_needed(exp_needed, expected_exp, lucky_egg)
+    # Calculate battles - a precomputed table answers plain level-to-level
+    # questions with one array read
+    battles = None
+    battle_table = settings.get('battle_table')
+    trainer_exp = selected["data"].get("trainer_exp", 0)
+    if (battle_table and battle_table["traded"] == settings['traded'] and not repel and ability == "NONE"
+            and not trainer_exp and current_exp == get_total_exp_for_level(species_input, current_level, species_table)):
+        battles = lookup_battles(battle_table, species_input, current_level, target_level,
+                                 selected["key"], selected["etype"], lucky_egg, species_table)
+    if battles is None:
+        battles = selected["battles"]
     
     print(f"\n{'=' * 50}")
     print(f"RESULTS")
     print(f"{'=' * 50}")
     print(f"Pokemon: {species_input.replace('SPECIES_', '')}")
     print(f"Current: Level {current_level} ({current_exp:,} EXP)")
-    print(f"Target:  Level {target_level} ({get_total_exp_for_level(species_input, target_level):,} EXP)")
+    print(f"Target:  Level {target_level} "
+          f"({get_total_exp_for_level(species_input, target_level, species_table):,} EXP)")
     print(f"EXP Needed: {exp_needed:,}")
+    if trainer_exp:
+        print(f"Guaranteed trainer EXP: {trainer_exp:,} "
+              f"({len(selected['data']['trainers'])} trainer battle(s) on this map)")
+        print(f"EXP from wild battles: {selected['wild_exp_needed']:,}")
     print(f"")
     print(f"Location: {selected['data']['formatted_name']} ({selected['etype'].replace('_', ' ')})")
     print(f"Expected EXP/battle: {expected_exp:.1f}")
     print(f"Lucky Egg: {'Yes' if lucky_egg else 'No'}")
+    print(f"Traded: {'Yes' if settings.get('traded') else 'No'}")
+    if repel or ability != "NONE":
+        edata = selected["data"][selected["etype"]]
+        print(f"Lead: level {lead_level}, {ability.replace('_', ' ').title()}{', Repel' if repel else ''} - "
+              f"{edata.get('repel_pass', 1.0) * 100:.1f}% of encounters become battles")
     print(f"")
     print(f">>> Estimated battles needed: {battles:,} <<<")
     
     pause()
 
 
-def export_menu(results: Dict, settings: Dict, game_label: str):
+def route_planner_menu(results: Dict, settings: Dict):
+    """Plan the sequence of grinding spots from a start level to a target level."""
+    clear_screen()
+    print("=" * 60)
+    print("GRINDING ROUTE PLANNER")
+    print("=" * 60)
+
+    species_input = input("\nPokemon species (e.g., MUDKIP or mudkip): ").strip().upper()
+    if not species_input.startswith("SPECIES_"):
+        species_input = f"SPECIES_{species_input}"
+    species_table = settings.get('species_table')
+    if species_input not in (species_table or DEFAULT_SPECIES_TABLE)["growth_rate"]:
+        print(f"Warning: Unknown species {species_input}, using medium_fast growth rate")
+
+    try:
+        current_level = int(input("Current level: "))
+        exp_input = input("Current total EXP (Enter for start of level): ").strip()
+        current_exp = int(exp_input) if exp_input else None
+        target_level = int(input("Target level: "))
+    except ValueError:
+        print("Invalid input!")
+        pause()
+        return
+
+    repel_input = input(f"Use Repel when it helps? [{'Y/n' if settings['repel'] else 'y/N'}]: ").strip().lower()
+    repel = settings['repel'] if not repel_input else repel_input == "y"
+
+    milestones = None
+    milestone_path = input("Milestones file (JSON, Enter for all maps open): ").strip()
+    if milestone_path:
+        try:
+            milestones = load_milestones(milestone_path)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not load milestones: {e}")
+            pause()
+            return
+
+    plan = plan_grinding_route(filter_results(results, settings['blocked_attributes']), species_input,
+                               current_level, target_level, milestones, current_exp, repel,
+                               settings['lucky_egg'], settings['traded'], species_table)
+    if plan is None:
+        print("\nNo grinding spot is open for part of that climb - check the milestones.")
+        pause()
+        return
+
+    print(f"\n{'=' * 60}")
+    print(f"ROUTE: {species_input.replace('SPECIES_', '')} level {plan['start_level']} -> {plan['target_level']}")
+    print(f"{'=' * 60}")
+    for segment in plan["segments"]:
+        etype = segment["etype"].replace("_", " ")
+        repel_note = " + Repel" if segment["repel"] else ""
+        print(f"  Lv {segment['start_level']:3d}-{segment['end_level']:3d}  "
+              f"{segment['formatted_name']:25s} ({etype}{repel_note})")
+        print(f"             {segment['expected_exp']:.1f} EXP/battle, {segment['battles']:,} battles")
+    print(f"\n>>> Total battles: {plan['total_battles']:,} <<<")
+    pause()
+
+
+def rng_search_menu(data: Dict, results: Dict, settings: Dict):
+    """Find the RNG frames that generate the highest-EXP encounter at a location."""
+    clear_screen()
+    print("=" * 60)
+    print("RNG FRAME SEARCH")
+    print("=" * 60)
+
+    if get_generation_engine(data)["generation"] != 3:
+        print("\nRNG emulation covers the Gen 3 LCG only.")
+        pause()
+        return
+
+    query = input("\nEnter location name (partial match OK): ").strip().lower()
+    found = [(key, loc) for key, loc in results.items() if query in loc.get("formatted_name", "").lower()]
+    if not found:
+        print("\nNo locations found.")
+        pause()
+        return
+
+    for i, (key, loc) in enumerate(found[:20], 1):
+        print(f"  {i:2d}. {loc['formatted_name']} ({loc['version']})")
+    try:
+        key, loc = found[int(input("\nSelect location: ").strip() or "1") - 1]
+    except (ValueError, IndexError):
+        print("Invalid selection.")
+        pause()
+        return
+
+    etypes = [etype for etype in ENCOUNTER_TYPES if etype in loc]
+    for i, etype in enumerate(etypes, 1):
+        print(f"  {i}. {etype.replace('_', ' ').title()}")
+    try:
+        etype = etypes[int(input("Select encounter type: ").strip() or "1") - 1]
+        seed = int(input("Initial seed in hex [0]: ").strip() or "0", 16) & LCG_MASK
+        start_frame = int(input("Start frame [0]: ").strip() or "0")
+        count = int(input("Frames to search [1000000]: ").strip() or "1000000")
+        top_k = int(input("Results to show [10]: ").strip() or "10")
+    except (ValueError, IndexError):
+        print("Invalid input.")
+        pause()
+        return
+
+    table = get_rng_slot_table(data, key, etype)
+    if table is None or count <= 0 or top_k <= 0:
+        print("\nNothing to search.")
+        pause()
+        return
+
+    print(f"\nSearching {count:,} frames...")
+    hits = search_frames(table, seed, start_frame, count, top_k, settings['lucky_egg'], settings['traded'])
+
+    print(f"\n{loc['formatted_name']} ({loc['version']}) - {etype.replace('_', ' ').title()}, seed 0x{seed:08X}")
+    print("-" * 60)
+    print(f"  {'Frame':>12s}  {'State':>10s}  {'Species':15s} {'Lv':>3s}  {'EXP':>5s}")
+    for hit in hits:
+        print(f"  {hit['frame']:12,d}  {hit['state']:08X}    {hit['species']:15s} {hit['level']:3d}  {hit['exp']:5d}")
+    pause()
+
+
+def export_menu(results: Dict, settings: Dict, game_label: str, battle_results: Dict[bool, Dict] = None):
     """Export data to file."""
     import os
     
@@ -1315,6 +6848,11 @@ def export_menu(results: Dict, settings: Dict, game_label: str):
     print("\n  1. Full report (text)")
     print("  2. Full report + efficiency rankings (text)")
     print("  3. CSV format")
+    print("  4. SQLite database (all slots, indexed)")
+    print("  5. Columnar binary (.npz{})".format(" / .parquet" if parquet_available() else ""))
+    if battle_results:
+        print("  6. Battles lookup table (.npy, memory-mappable)")
+    print("  7. Everything at once (report, rankings, CSV, .npz)")
     print("\n  0. Cancel")
     
     choice = input("\nSelect format: ").strip()
@@ -1332,30 +6870,98 @@ def export_menu(results: Dict, settings: Dict, game_label: str):
     if default_folder:
         print(f"\nSample CSVs folder found: {default_folder}")
     
+    if choice == "7":
+        prefix = input(f"Output file prefix [{default_folder}{game_label}]: ").strip() or f"{default_folder}{game_label}"
+        outputs = {name: f"{prefix}{suffix}" for name, suffix in EXPORT_FORMATS.items()}
+        options = {"verbose": settings['verbose'], "lucky_egg": settings['lucky_egg'], "game": game_label,
+                   "lead_level": get_repel_lead(settings), "lead_ability": settings['lead_ability'],
+                   "blocked_attributes": settings['blocked_attributes']}
+        try:
+            export_fanout(results, outputs, options, threaded=True)
+            print("\nExported:")
+            for path in outputs.values():
+                print(f"  {path}")
+        except OSError as e:
+            print(f"\nError writing files: {e}")
+        pause()
+        return
+    
     filename = input(f"Output filename [{default_folder}{game_label}_Exp_Rates.csv]: ").strip()
     if not filename:
         if choice == "3":
             filename = f"{default_folder}{game_label}_Exp_Rates.csv"
+        elif choice == "4":
+            filename = f"{default_folder}Exp_Rates.sqlite"
+        elif choice == "5":
+            filename = f"{default_folder}{game_label}_Exp_Rates.npz"
+        elif choice == "6":
+            filename = f"{default_folder}{game_label}_Battles.npy"
         else:
             filename = f"{default_folder}{game_label}_Exp_Report.txt"
     
-    if choice == "1":
-        output = generate_report(results, settings['verbose'], settings['lucky_egg'], game_label)
-    elif choice == "2":
-        output = generate_report(results, settings['verbose'], settings['lucky_egg'], game_label)
-        output += generate_efficiency_summary(results)
-    elif choice == "3":
-        output = generate_csv(results)
-        if not filename.endswith('.csv'):
-            filename += '.csv'
-    else:
+    if choice not in ("1", "2", "3", "4", "5") and not (choice == "6" and battle_results):
         print("Invalid choice.")
         pause()
         return
+    if choice == "6":
+        if not filename.endswith(".npy"):
+            filename += ".npy"
+        eggs = tuple(battle_results)
+        if len(eggs) > 1:
+            egg_input = input("Lucky Egg settings [B]oth / [o]ff only / o[n] only: ").strip().lower()
+            eggs = {"o": (False,), "n": (True,)}.get(egg_input, eggs)
+        print("\nBuilding battles table...")
+        try:
+            index = build_battle_table({egg: battle_results[egg] for egg in eggs}, filename,
+                                       settings['traded'], game_label, progress=print_job_progress("Battles table"))
+            settings['battle_table'] = load_battle_table(filename)
+            print(f"\nWrote {len(index['tables'])} spots x {len(index['growth_rates'])} growth rates "
+                  f"x {index['shape'][2]:,} level pairs to: {filename}")
+            print("The battle calculator will answer from this table for the rest of the session.")
+        except Exception as e:
+            print(f"\nError writing file: {e}")
+        pause()
+        return
+    if choice == "5":
+        if filename.endswith(".parquet") and not parquet_available():
+            print("\nParquet export needs pyarrow; writing .npz instead.")
+            filename = filename[:-len(".parquet")] + ".npz"
+        elif not filename.endswith((".npz", ".parquet")):
+            filename += ".npz"
+        include_slots = input("Include slot-level table? [y/N]: ").strip().lower() == "y"
+        try:
+            count = export_columnar(results, filename, include_slots)
+            print(f"\nExported {count} rows to: {filename}")
+        except Exception as e:
+            print(f"\nError writing file: {e}")
+        pause()
+        return
+    if choice == "4":
+        try:
+            count = export_sqlite(results, filename, game_label, settings['lucky_egg'],
+                                  traded=settings['traded'])
+            print(f"\nExported {count} encounter tables to: {filename}")
+        except Exception as e:
+            print(f"\nError writing database: {e}")
+        pause()
+        return
+    if choice == "3" and not filename.endswith('.csv'):
+        filename += '.csv'
     
     try:
-        with open(filename, 'w') as f:
-            f.write(output)
+        # csv.writer wants newline='' so quoted newlines are not translated
+        with open(filename, 'w', newline='' if choice == "3" else None) as f:
+            if choice == "3":
+                write_csv(results, f)
+            else:
+                # Usually just viewed with the same settings: reuse the rendering
+                write_lines(get_rendered_lines(iter_report_lines, results, settings['verbose'],
+                                               settings['lucky_egg'], game_label, get_repel_lead(settings),
+                                               settings['lead_ability']), f)
+                if choice == "2":
+                    # Rankings leave out the excluded spots, as on screen
+                    write_lines(get_rendered_lines(iter_efficiency_summary_lines,
+                                                   filter_results(results, settings['blocked_attributes'])), f)
         print(f"\nExported to: {filename}")
     except Exception as e:
         print(f"\nError writing file: {e}")
@@ -1365,99 +6971,317 @@ def export_menu(results: Dict, settings: Dict, game_label: str):
 
 def main_menu():
     """Main interactive menu."""
-    clear_screen()
-    print("=" * 60)
-    print("  POKEMON GEN 3 EXP CALCULATOR")
-    print("  Using proper integer math (floor after each operation)")
-    print("=" * 60)
-    
-    # Select JSON file
-    json_path = select_json_file()
-    
-    try:
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-        print(f"\nLoaded: {json_path}")
-    except FileNotFoundError:
-        print(f"\nError: File not found: {json_path}")
-        pause()
-        return
-    except json.JSONDecodeError:
-        print(f"\nError: Invalid JSON file")
-        pause()
-        return
-    
-    # Select game version
-    game_filter = select_game_version(data)
-    detected_game = detect_game_version(data)
-    game_label = game_filter if game_filter else detected_game
-    
-    # Settings
+    # Settings carry over when switching game files
     settings = {
         'lucky_egg': False,
-        'verbose': False
+        'verbose': False,
+        'traded': False,
+        'lead_level': 0,
+        'repel': False,
+        'lead_ability': "NONE",
+        'battle_table': None,
+        'species_table': None,
+        'blocked_attributes': DEFAULT_BLOCKED_ATTRIBUTES
     }
-    
-    # Process initial data
-    results = process_encounters(data, settings['lucky_egg'], game_filter)
-    
-    # Main loop
+    session = create_session()
+
     while True:
         clear_screen()
-        egg_status = " [Lucky Egg ON]" if settings['lucky_egg'] else ""
         print("=" * 60)
-        print(f"  GEN 3 EXP CALCULATOR - {game_label}{egg_status}")
+        print("  POKEMON EXP CALCULATOR")
+        print("  Using proper integer math (floor after each operation)")
         print("=" * 60)
-        print(f"\n  Loaded: {json_path}")
-        print(f"  Locations: {len(results)}")
         
-        print("\n  --- REPORTS ---")
-        print("  1. View all locations")
-        print("  2. View efficiency rankings")
-        print("  3. Search location")
+        # Select JSON file
+        json_path = select_json_file()
+        
+        try:
+            dataset = load_dataset(session, json_path)
+            print(f"\n{'Switched to' if dataset['cached'] else 'Loaded'}: {json_path}")
+        except FileNotFoundError as e:
+            # The encounter file or one of its species sources
+            print(f"\nError: File not found: {e.filename or json_path}")
+            pause()
+            return
+        except json.JSONDecodeError:
+            print(f"\nError: Invalid JSON file")
+            pause()
+            return
+        except ValueError as e:
+            # No engine for the file's generation
+            print(f"\nError: {e}")
+            pause()
+            return
         
-        print("\n  --- TOOLS ---")
-        print("  4. Battle calculator (battles to level up)")
-        print("  5. Export to file")
+        species_table = dataset["data"].get("species_table")
+        if species_table and not dataset['cached']:
+            print(f"Species table: {len(species_table['imported'])} species from "
+                  f"{len(species_table['sources'])} source(s){' (cached)' if species_table['cached'] else ''}")
+        if dataset["cube"]["unknown_species"] and not dataset['cached']:
+            print(format_unknown_species_report(dataset["cube"]["unknown_species"]))
         
-        print("\n  --- OPTIONS ---")
-        print("  6. Settings (Lucky Egg, verbose)")
-        print("  7. Change game file")
+        # A battles table and species table only answer for the file they came from
+        settings['battle_table'] = None
+        settings['species_table'] = species_table
+        if not dataset_menu(dataset, settings, session):
+            return
+
+
+def dataset_menu(dataset: Dict[str, Any], settings: Dict, session: Dict[str, Any]) -> bool:
+    """
+    Menu loop for one loaded file.
+
+    Returns:
+        True to pick another game file, False to exit.
+    """
+    data, cube, json_path = dataset["data"], dataset["cube"], dataset["path"]
+    
+    # Select game version
+    game_filter = select_game_version(data)
+    game_label = game_filter if game_filter else dataset["detected_game"]
+    if True not in cube["lucky_eggs"]:
+        settings['lucky_egg'] = False
+    
+    results = get_scenario_results(cube, game_filter, settings['lucky_egg'], settings['traded'])
+    
+    # Main loop
+    while True:
+        egg_status = " [Lucky Egg ON]" if settings['lucky_egg'] else ""
+        egg_status += " [Traded]" if settings['traded'] else ""
+        egg_status += f" [Repel Lv{get_repel_lead(settings)}]" if get_repel_lead(settings) else ""
+        if settings['lead_ability'] != "NONE":
+            egg_status += f" [{settings['lead_ability'].replace('_', ' ').title()}]"
+        menu = [
+            "=" * 60,
+            f"  GEN {get_generation_engine(data)['generation']} EXP CALCULATOR - {game_label}{egg_status}",
+            "=" * 60,
+            "",
+            f"  Loaded: {json_path}",
+            f"  Engine: {get_generation_engine(data)['name']}",
+            f"  Locations: {len(results)}",
+            "",
+            "  --- REPORTS ---",
+            "  1. View all locations",
+            "  2. View efficiency rankings",
+            "  3. Search location",
+            "",
+            "  --- TOOLS ---",
+            "  4. Battle calculator (battles to level up)",
+            "  5. Export to file",
+            "  8. RNG frame search (best-EXP frames)",
+            "  9. Grinding route planner (milestones, multi-spot)",
+            "  D. Diff against another version or file",
+            "",
+            "  --- OPTIONS ---",
+            "  6. Settings (Lucky Egg, traded, lead/Repel, verbose)",
+            "  7. Change game file",
+            "",
+            "  0. Exit",
+            "",
+        ]
         
-        print("\n  0. Exit")
+        # Redraws in place: coming back to an unchanged menu repaints nothing
+        choice = prompt_frame(menu, "Select option: ").strip().upper()
         
-        choice = input("\nSelect option: ").strip()
+        # Repel-aware view of the current cell (identity when Repel is off)
+        view = apply_lead(results, settings['lead_level'], settings['repel'], settings['lead_ability'],
+                          settings['lucky_egg'], settings['traded'])
         
         if choice == "1":
-            view_location_report(results, settings, game_label)
+            view_location_report(view, settings, game_label)
         elif choice == "2":
-            view_efficiency_rankings(results)
+            view_efficiency_rankings(results, settings)
         elif choice == "3":
-            search_location(results, settings)
+            search_location(view, settings)
         elif choice == "4":
-            # Reprocess with current lucky egg setting
-            results = process_encounters(data, settings['lucky_egg'], game_filter)
             battle_calculator_menu(results, settings)
         elif choice == "5":
-            export_menu(results, settings, game_label)
+            battle_results = {egg: get_scenario_results(cube, game_filter, egg, settings['traded'])
+                              for egg in cube["lucky_eggs"]}
+            export_menu(view, settings, game_label, battle_results)
         elif choice == "6":
-            old_lucky = settings['lucky_egg']
-            settings = settings_menu(settings)
-            # Reprocess if lucky egg changed
-            if settings['lucky_egg'] != old_lucky:
-                results = process_encounters(data, settings['lucky_egg'], game_filter)
+            settings = settings_menu(settings, True in cube["lucky_eggs"])
+            results = get_scenario_results(cube, game_filter, settings['lucky_egg'], settings['traded'])
         elif choice == "7":
-            # Restart with new file
-            main_menu()
-            return
+            # Back to file selection; loaded files stay cached in the session
+            return True
+        elif choice == "8":
+            rng_search_menu(data, results, settings)
+        elif choice == "9":
+            route_planner_menu(results, settings)
+        elif choice == "D":
+            diff_menu(dataset, session, settings, game_filter, game_label)
         elif choice == "0":
             clear_screen()
-            print("Thanks for using the Gen 3 EXP Calculator!")
-            break
+            print("Thanks for using the EXP Calculator!")
+            return False
 
 
 def main():
     """Entry point."""
+    import argparse
+    import os
+    import sys
+
+    parser = argparse.ArgumentParser(description="Pokemon Gen 3 Expected EXP Calculator")
+    parser.add_argument("--self-check", action="store_true",
+                        help="run the differential correctness harness and exit")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for synthetic tables in --self-check")
+    parser.add_argument("--engine", choices=sorted(CANDIDATE_ENGINES), default="current",
+                        help="candidate engine for --self-check (default: current)")
+    parser.add_argument("--build-battle-table", metavar="OUT",
+                        help="precompute the battles-needed table for --data to OUT (.npy) and exit")
+    parser.add_argument("--data", metavar="JSON", help="wild encounter file for --build-battle-table")
+    parser.add_argument("--game", help="version filter for --build-battle-table (e.g. Ruby)")
+    parser.add_argument("--traded", action="store_true", help="build the battles table for a traded Pokemon")
+    parser.add_argument("--diff", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="print the table-by-table diff of two wild encounter files and exit")
+    parser.add_argument("--diff-game", help="version filter for the AFTER file of --diff (default: --game)")
+    parser.add_argument("--verbose", action="store_true", help="list changed slots in --diff (slot detail in --export)")
+    parser.add_argument("--export", metavar="DIR",
+                        help="write every format for every Lucky Egg / traded scenario of --data to DIR and exit")
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS),
+                        help=f"formats for --export (default: {','.join(EXPORT_FORMATS)})")
+    parser.add_argument("--export-threads", action="store_true", help="one writer thread per file in --export")
+    parser.add_argument("--backend", choices=["auto", *COMPUTE_BACKENDS], default="auto",
+                        help="compute backend (default: auto, NumPy when installed)")
+    parser.add_argument("--sweep", nargs="+", metavar="JSON",
+                        help="process every Lucky Egg / traded scenario of each file as a resumable job and exit")
+    parser.add_argument("--job-dir", metavar="DIR",
+                        help=f"checkpoint folder for --sweep and --build-battle-table (default: {JOB_CHECKPOINT_DIR}/)")
+    parser.add_argument("--workers", type=int, help="processes for --sweep and --build-battle-table (default: all cores)")
+    parser.add_argument("--rank", action="store_true", help="print a custom ranking of --data and exit")
+    parser.add_argument("--where", help="filter expression for --rank, e.g. 'etype == \"grass\" and rate >= 10'")
+    parser.add_argument("--score", help="score expression for --rank (default: efficiency)")
+    parser.add_argument("--top", type=int, default=15, help="spots shown by --rank (0 = all, default: 15)")
+    parser.add_argument("--ascending", action="store_true", help="lowest score first in --rank")
+    parser.add_argument("--lucky-egg", action="store_true", help="rank with a Lucky Egg in --rank")
+    parser.add_argument("--exclude", default=",".join(name for name in LOCATION_ATTRIBUTES
+                                                      if DEFAULT_BLOCKED_ATTRIBUTES & ATTRIBUTE_BITS[name]),
+                        help="comma-separated location attributes --rank and the --export rankings "
+                             "leave out, or 'none' "
+                             f"(one of {', '.join(LOCATION_ATTRIBUTES)}; default: %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        set_backend(args.backend)
+    except ValueError as e:
+        parser.error(str(e))
+
+    def warn_unknown_species(unknown_species, path):
+        # Command-line runs report each file's unknown species once, on stderr
+        if unknown_species:
+            print(f"{path}: {format_unknown_species_report(unknown_species)}", file=sys.stderr)
+
+    names = [name.strip() for name in args.exclude.split(",") if name.strip() not in ("", "none")]
+    try:
+        blocked = attribute_mask(names)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.export:
+        if not args.data:
+            parser.error("--export needs --data")
+        formats = [name.strip() for name in args.formats.split(",") if name.strip()]
+        unknown = [name for name in formats if name not in EXPORT_FORMATS]
+        if unknown:
+            parser.error(f"unknown format(s) for --formats: {', '.join(unknown)}")
+        dataset = load_dataset(create_session(), args.data)
+        warn_unknown_species(dataset["cube"]["unknown_species"], args.data)
+        game_label = args.game or dataset["detected_game"]
+        os.makedirs(args.export, exist_ok=True)
+        for lucky_egg, traded in dataset["cube"]["modifiers"]:
+            prefix = os.path.join(args.export, scenario_export_prefix(game_label, lucky_egg, traded))
+            outputs = {name: f"{prefix}{EXPORT_FORMATS[name]}" for name in formats}
+            export_fanout(get_scenario_results(dataset["cube"], args.game, lucky_egg, traded), outputs,
+                          {"verbose": args.verbose, "lucky_egg": lucky_egg, "game": game_label,
+                           "blocked_attributes": blocked},
+                          args.export_threads)
+            print(f"Wrote {', '.join(outputs.values())}")
+        sys.exit(0)
+
+    if args.rank:
+        if not args.data:
+            parser.error("--rank needs --data")
+        dataset = load_dataset(create_session(), args.data)
+        warn_unknown_species(dataset["cube"]["unknown_species"], args.data)
+        try:
+            results = filter_results(get_scenario_results(dataset["cube"], args.game, args.lucky_egg, args.traded),
+                                     blocked)
+            ranking = run_ranking_query(results, args.where, args.score, args.top, args.ascending)
+        except ValueError as e:
+            parser.error(str(e))
+        for line in iter_ranking_query_lines(ranking, args.where, args.score, args.ascending):
+            print(line)
+        sys.exit(0)
+
+    if args.diff:
+        session = create_session()
+        before_path, after_path = args.diff
+        after_game = args.diff_game or args.game
+        # No scenario cubes: the diff hashes the raw tables first
+        before = load_dataset(session, before_path, build_cube=False)
+        after = load_dataset(session, after_path, build_cube=False)
+        before_unknown, after_unknown = {}, {}
+        try:
+            diff = diff_encounter_data(before["data"], after["data"], args.game, after_game, False, args.traded,
+                                       before_unknown, after_unknown)
+        except ValueError as e:
+            parser.error(f"{e} (--game / --diff-game)")
+        warn_unknown_species(before_unknown, before_path)
+        if after is not before:
+            warn_unknown_species(after_unknown, after_path)
+        for line in iter_diff_lines(diff, f"{before_path} ({args.game or before['detected_game']})",
+                                    f"{after_path} ({after_game or after['detected_game']})", args.verbose):
+            print(line)
+        sys.exit(0)
+
+    job_dir = args.job_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), JOB_CHECKPOINT_DIR)
+
+    if args.sweep:
+        try:
+            swept = sweep_encounters(args.sweep, args.game, None, job_dir, args.workers,
+                                     print_job_progress("process_encounters"))
+        except KeyboardInterrupt:
+            print(f"\nInterrupted - finished chunks are saved in {job_dir}; rerun the same command to resume.")
+            sys.exit(130)
+        for path, entry in swept.items():
+            print(f"\n{path}")
+            for (lucky_egg, traded), results in entry["scenarios"].items():
+                tables = [(data[etype]["efficiency"], data["formatted_name"], etype)
+                          for data in results.values() for etype in ENCOUNTER_TYPES if etype in data]
+                best = max(tables, default=None)
+                best_text = f", best {best[1]} ({best[2].replace('_', ' ')}) eff {best[0]:.1f}" if best else ""
+                print(f"  {scenario_export_prefix('', lucky_egg, traded).strip('_') or 'Base':16s} "
+                      f"{len(results)} locations, {len(tables)} tables{best_text}")
+            if entry["unknown_species"]:
+                print(f"  {format_unknown_species_report(entry['unknown_species'])}")
+        sys.exit(0)
+
+    if args.build_battle_table:
+        if not args.data:
+            parser.error("--build-battle-table needs --data")
+        with open(args.data, "r") as f:
+            data = prepare_encounter_data(json.load(f), args.data)
+        cube = build_scenario_cube(data)
+        warn_unknown_species(cube["unknown_species"], args.data)
+        try:
+            index = build_battle_table({egg: get_scenario_results(cube, args.game, egg, args.traded)
+                                        for egg in cube["lucky_eggs"]},
+                                       args.build_battle_table, args.traded, args.game or detect_game_version(data),
+                                       args.workers, job_dir, print_job_progress("battle_table"))
+        except KeyboardInterrupt:
+            print(f"\nInterrupted - finished chunks are saved in {job_dir}; rerun the same command to resume.")
+            sys.exit(130)
+        print(f"Wrote {index['shape']} battles table to {args.build_battle_table}")
+        sys.exit(0)
+
+    if args.self_check:
+        mismatches, cases = run_differential_check(CANDIDATE_ENGINES[args.engine](), seed=args.seed)
+        print_differential_report(mismatches, cases)
+        sys.exit(1 if mismatches else 0)
+
     main_menu()
 
 